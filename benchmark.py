@@ -0,0 +1,229 @@
+"""Measures extraction throughput on synthetic RealSense frames
+
+Reports frames per second of `xy_auto_align`, `t_align` and the runner end to end, without bags
+or cameras.  With a baseline from an earlier run, exits with an error if any benchmark regressed.
+"""
+import json
+import sys
+import time
+from argparse import ArgumentParser
+from dataclasses import replace
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List
+
+from e4e.align import OUTPUT_FORMATS, OutputOptions, t_align, xy_auto_align
+from e4e.depth import DEPTH_UNITS
+from e4e.frame_source import SyntheticConfig, SyntheticSource
+from e4e.image_codecs import ImageCodec
+from e4e.metadata import METADATA_FORMATS
+from runner import ExtractOptions, extract_deployment
+
+# Size of the placeholder bags copied through the cache by the runner benchmark
+PLACEHOLDER_BAG_BYTES = 1 << 20
+
+
+def throughput(n_frames: int, elapsed_s: float) -> Dict[str, float]:
+    """Builds a benchmark result
+
+    Args:
+        n_frames (int): Number of frames processed
+        elapsed_s (float): Wall time in seconds
+
+    Returns:
+        Dict[str, float]: Frames, elapsed time and frames per second
+    """
+    return {
+        'n_frames': n_frames,
+        'elapsed_s': elapsed_s,
+        'fps': n_frames / elapsed_s if elapsed_s > 0 else float('inf')
+    }
+
+def bench_xy_auto_align(
+        config: SyntheticConfig,
+        options: ExtractOptions,
+        work_dir: Path) -> Dict[str, float]:
+    """Benchmarks extraction of a single synthetic recording
+
+    Args:
+        config (SyntheticConfig): Synthetic recording
+        options (ExtractOptions): Extraction options
+        work_dir (Path): Scratch directory
+
+    Returns:
+        Dict[str, float]: Benchmark result
+    """
+    source = SyntheticSource(config)
+    output_dir = work_dir.joinpath('xy_auto_align')
+    output_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    xy_auto_align(bag_file=Path('synthetic.bag'),
+                  output_dir=output_dir,
+                  output=options.output,
+                  n_workers=options.n_writers,
+                  label_dir=work_dir.joinpath('xy_auto_align_label'),
+                  source=source)
+    return throughput(source.n_frames, time.perf_counter() - start)
+
+def bench_t_align(
+        config: SyntheticConfig,
+        options: ExtractOptions,
+        work_dir: Path) -> Dict[str, float]:
+    """Benchmarks temporal alignment of the stills of a single synthetic recording
+
+    Args:
+        config (SyntheticConfig): Synthetic recording
+        options (ExtractOptions): Extraction options.  Stills are always extracted as files.
+        work_dir (Path): Scratch directory
+
+    Returns:
+        Dict[str, float]: Benchmark result, counting frame pairs
+    """
+    output_dir = work_dir.joinpath('t_align')
+    output_dir.mkdir(parents=True, exist_ok=True)
+    xy_auto_align(bag_file=Path('synthetic.bag'),
+                  output_dir=output_dir,
+                  output=replace(options.output, output_format='files'),
+                  n_workers=options.n_writers,
+                  source=SyntheticSource(config))
+    start = time.perf_counter()
+    t_align(input_dir=output_dir,
+            output_dir=output_dir,
+            label_dir=work_dir.joinpath('t_align_label'),
+            link_strategy=options.output.link_strategy,
+            label_codec=options.output.label_codec)
+    elapsed_s = time.perf_counter() - start
+    return throughput(len(list(output_dir.glob('frame_*'))), elapsed_s)
+
+def bench_runner(
+        config: SyntheticConfig,
+        options: ExtractOptions,
+        work_dir: Path,
+        n_bags: int = 4,
+        n_workers: int = 1) -> Dict[str, float]:
+    """Benchmarks the runner end to end on placeholder bags with synthetic frames
+
+    Args:
+        config (SyntheticConfig): Synthetic recording of each bag
+        options (ExtractOptions): Extraction options
+        work_dir (Path): Scratch directory
+        n_bags (int, optional): Number of bags.  Defaults to 4.
+        n_workers (int, optional): Number of bags extracted concurrently.  Defaults to 1.
+
+    Returns:
+        Dict[str, float]: Benchmark result
+    """
+    # pylint: disable=too-many-arguments
+    deployment = work_dir.joinpath('deployment')
+    deployment.mkdir(parents=True, exist_ok=True)
+    for idx in range(n_bags):
+        with open(deployment.joinpath(f'{idx}.bag'), 'wb') as handle:
+            handle.write(bytes(PLACEHOLDER_BAG_BYTES))
+    start = time.perf_counter()
+    extract_deployment(deployment_root_path=deployment,
+                       target_path=work_dir.joinpath('runner_output'),
+                       progress_path=work_dir.joinpath('progress.jsonl'),
+                       cache_path=work_dir.joinpath('cache'),
+                       options=replace(options, synthetic=config, checkpoint_interval_s=0.),
+                       n_workers=n_workers)
+    return throughput(n_bags * config.n_frames, time.perf_counter() - start)
+
+def find_regressions(
+        results: Dict[str, Dict[str, float]],
+        baseline: Dict[str, Dict[str, float]],
+        tolerance: float) -> List[str]:
+    """Compares the results to a baseline
+
+    Args:
+        results (Dict[str, Dict[str, float]]): Benchmark results by name
+        baseline (Dict[str, Dict[str, float]]): Baseline results by name
+        tolerance (float): Permissible relative throughput loss
+
+    Returns:
+        List[str]: Descriptions of the regressed benchmarks
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        minimum = baseline[name]['fps'] * (1 - tolerance)
+        if result['fps'] < minimum:
+            regressions.append(f"{name}: {result['fps']:.1f} fps, baseline "
+                               f"{baseline[name]['fps']:.1f} fps")
+    return regressions
+
+def main():
+    """Benchmark entry point
+    """
+    parser = ArgumentParser()
+    parser.add_argument('--benchmarks', nargs='+', default=['xy_auto_align', 't_align', 'runner'],
+                        choices=['xy_auto_align', 't_align', 'runner'])
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=30.)
+    parser.add_argument('--duration_s', type=float, default=5.)
+    parser.add_argument('--jitter_s', type=float, default=0.005,
+        help='Maximum timestamp jitter of each stream')
+    parser.add_argument('--drop_rate', type=float, default=0.01,
+        help='Probability of each stream\'s frame being dropped')
+    parser.add_argument('--n_writers', type=int, default=0)
+    parser.add_argument('--output_format', choices=OUTPUT_FORMATS, default='files')
+    parser.add_argument('--depth_units', choices=DEPTH_UNITS, default='meters')
+    parser.add_argument('--metadata_format', choices=METADATA_FORMATS, default='files')
+    parser.add_argument('--color_codec', type=ImageCodec.parse, default=ImageCodec(),
+        help='Codec of the RGB stills, e.g. png:1, webp, jpeg:90 or npy')
+    parser.add_argument('--label_codec', type=ImageCodec.parse, default=None,
+        help='Codec of the RGB stills in the label directory.  Defaults to linking the stills')
+    parser.add_argument('--n_bags', type=int, default=4,
+        help='Number of bags processed by the runner benchmark')
+    parser.add_argument('--n_workers', type=int, default=1,
+        help='Number of bags extracted concurrently by the runner benchmark')
+    parser.add_argument('--work_dir', default=None,
+        help='Scratch directory.  Defaults to a temporary directory')
+    parser.add_argument('--output', default=None, help='Path to write the results to as JSON')
+    parser.add_argument('--baseline', default=None,
+        help='Results of an earlier run to check for regressions against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+        help='Permissible relative throughput loss against the baseline')
+    args = parser.parse_args()
+
+    config = SyntheticConfig(width=args.width,
+                             height=args.height,
+                             fps=args.fps,
+                             duration_s=args.duration_s,
+                             jitter_s=args.jitter_s,
+                             drop_rate=args.drop_rate)
+    options = ExtractOptions(n_writers=args.n_writers,
+                             output=OutputOptions(output_format=args.output_format,
+                                                  depth_units=args.depth_units,
+                                                  metadata_format=args.metadata_format,
+                                                  color_codec=args.color_codec,
+                                                  label_codec=args.label_codec))
+    results: Dict[str, Any] = {}
+    with TemporaryDirectory(dir=args.work_dir) as tmp_dir:
+        work_dir = Path(tmp_dir)
+        if 'xy_auto_align' in args.benchmarks:
+            results['xy_auto_align'] = bench_xy_auto_align(config, options, work_dir)
+        if 't_align' in args.benchmarks:
+            results['t_align'] = bench_t_align(config, options, work_dir)
+        if 'runner' in args.benchmarks:
+            results['runner'] = bench_runner(config, options, work_dir,
+                                             n_bags=args.n_bags,
+                                             n_workers=args.n_workers)
+    for name, result in results.items():
+        print(f"{name}: {result['n_frames']} frames in {result['elapsed_s']:.2f} s, "
+              f"{result['fps']:.1f} frames/s")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as handle:
+            baseline = json.load(handle)
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f'Regression in {regression}')
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
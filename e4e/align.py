@@ -1,21 +1,69 @@
 """Provides spatial and temporal alignment routines for Intel RealSense ROSBAG files
 """
 import datetime as dt
+from dataclasses import dataclass
 from pathlib import Path
-from shutil import copy, move
-from typing import Dict, Tuple, Union, Any
+from shutil import move
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import cv2 as cv
 import numpy as np
 import pyrealsense2 as rs
 from tqdm import tqdm
 
+from e4e.checkpoint import Checkpoint, CheckpointedSink
+from e4e.depth import DEPTH_UNITS, SCALE_FILE_SUFFIX, write_depth_scale
+from e4e.frame_pool import FramePool
+from e4e.frame_source import FrameSource
+from e4e.frame_writer import FrameWriterPool
+from e4e.image_codecs import VIEWABLE_EXTENSIONS, ImageCodec, is_color_still, read_image
+from e4e.links import LINK_STRATEGIES, link_file, resolve_link_strategy
+from e4e.metadata import METADATA_FORMATS, TABLE_SUFFIX, MetadataTableWriter
+from e4e.framestore import FrameStoreWriter
+from e4e.pairing import PairedFrameSink
+from e4e.profiling import NULL_PROFILER, StageProfiler
+from e4e.sinks import FileFrameSink, FrameSink, StreamFrame
+from e4e.temporal import pair_frame_files
+from e4e.timeranges import TimeRangeSet
+
+
+OUTPUT_FORMATS = ('files', 'store', 'paired')
+
+
+@dataclass
+class OutputOptions:
+    """Output layout and encoding of extracted frames
+    """
+    # `files` writes individual stills, `store` appends all frames to `{bag}.h5`, `paired`
+    # temporally aligns frames during extraction and writes them directly into frame folders
+    output_format: str = 'files'
+    # `meters` stores float32 depth, `counts` the native uint16 depth and the depth scale
+    depth_units: str = 'meters'
+    # `files` writes a metadata file per frame, `table` a single `{bag}_Metadata.csv` table
+    metadata_format: str = 'files'
+    # How RGB frames are placed in the label directory, one of `LINK_STRATEGIES`
+    link_strategy: str = 'auto'
+    # Codec of the extracted RGB stills, PNG if None
+    color_codec: Optional[ImageCodec] = None
+    # Codec of the label directory RGB stills, linking the extracted stills if None
+    label_codec: Optional[ImageCodec] = None
+
 
 def xy_auto_align(
         bag_file: Path,
         output_dir: Path,
         n_metadata: int = 5,
-        ignore_errors: bool = False):
+        ignore_errors: bool = False,
+        *,
+        output: Optional[OutputOptions] = None,
+        n_workers: int = 0,
+        use_processes: bool = False,
+        label_dir: Optional[Path] = None,
+        max_permissible_difference_s: float = 0.1,
+        time_ranges: Optional[Union[TimeRangeSet, List[Tuple[dt.timedelta, dt.timedelta]]]] = None,
+        checkpoint_path: Optional[Path] = None,
+        checkpoint_interval_s: float = 60.,
+        profiler: StageProfiler = NULL_PROFILER,
+        source: Optional[FrameSource] = None):
     """Extracts aligned RGB and Depth stills from the specified ROSBAG files
 
     Args:
@@ -23,91 +71,294 @@ def xy_auto_align(
         output_dir (Path): Output directory for still frames and metadata
         n_metadata (int, optional): Number of metadata items to write. Defaults to 5.
         ignore_errors (bool, optional): If set, frame errors will be ignored
+        output (Optional[OutputOptions], optional): Output format, depth units, metadata format,
+            label linking and codecs.  The metadata format does not apply to `store` output, and
+            label linking only to `paired` output.  Defaults to `OutputOptions()`.
+        n_workers (int, optional): Number of frame writer workers.  If 0, frames are encoded and
+            written synchronously.  Defaults to 0.
+        use_processes (bool, optional): If set, frame writers are processes instead of threads.
+            Defaults to False.
+        label_dir (Optional[Path], optional): Directory in which to place a copy of RGB frames for
+            labeling.  Required for `paired` output.  Defaults to None.
+        max_permissible_difference_s (float, optional): Maximum temporal misalignment for `paired`
+            output.  Defaults to 0.1.
+        time_ranges (Optional[Union[TimeRangeSet, List[Tuple[dt.timedelta, dt.timedelta]]]],
+            optional): If set, only frames within these ranges, referenced to the start of the
+            bag, are extracted.  The playback seeks to the start of each range and stops at its
+            end.  Defaults to None.
+        checkpoint_path (Optional[Path], optional): If set, the progress of the extraction is
+            periodically checkpointed to this file.  If the file exists, the extraction resumes
+            from it, skipping frames that were already written.  The file is removed once the bag
+            is complete.  Defaults to None.
+        checkpoint_interval_s (float, optional): Playback time between checkpoints in seconds.
+            Defaults to 60.
+        profiler (StageProfiler, optional): Profiler to record the wall time of each pipeline
+            stage and the bytes written in.  Defaults to `NULL_PROFILER`.
+        source (Optional[FrameSource], optional): Source to read frames from instead of playing
+            back the bag file, e.g. a `SyntheticSource`.  The bag file still names the outputs.
+            The source is stopped when done.  Defaults to None.
+
+    Raises:
+        ValueError: Invalid output options, or checkpoint written for a different output format
     """
-    # pylint: disable=too-many-locals
-    pipeline, playback, duration, depth_scale, align = configure_rs_pipeline(bag_file)
-
-    pos_prev = 0
+    # pylint: disable=too-many-locals,too-many-arguments,too-many-branches,too-many-statements
+    output = output if output is not None else OutputOptions()
+    check_output_options(output, label_dir)
+    resume = None
+    if checkpoint_path is not None:
+        resume = Checkpoint.load(checkpoint_path)
+        if resume is not None and resume.output_format != output.output_format:
+            raise ValueError(f'Checkpoint {checkpoint_path} was written for '
+                             f'{resume.output_format} output')
+    if source is None:
+        source = RealSenseSource(bag_file)
+    duration, depth_scale = source.duration_s, source.depth_scale
+
+    if time_ranges is None:
+        ranges = [(0., duration)]
+    else:
+        if not isinstance(time_ranges, TimeRangeSet):
+            time_ranges = TimeRangeSet(time_ranges)
+        ranges = time_ranges.clip(0., duration).intervals
+    checkpoint_pos_s = 0.
+    if resume is not None:
+        checkpoint_pos_s = resume.position_s
+        ranges = TimeRangeSet(ranges).clip(resume.resume_position_s, duration).intervals
+    seek = time_ranges is not None or resume is not None
+    pool = FramePool()
 
     try:
-        with tqdm(total=duration) as pbar:
-            while True:
-                try:
-                    frames: "rs.composite_frame" = pipeline.wait_for_frames()
-                    pos_curr = playback.get_position() / 1e9
-                    if pos_curr < pos_prev:
-                        break
-
-                    process_frame(bag_file, output_dir, n_metadata, depth_scale, align, frames)
-
-                    pbar.update(pos_curr - pos_prev)
-                    pos_prev = pos_curr
-                except Exception as exc: # pylint: disable=broad-except
-                    if not ignore_errors:
-                        raise exc
-
+        with tqdm(total=sum(end - start for start, end in ranges)) as pbar, FrameWriterPool(
+                n_workers=n_workers,
+                ignore_errors=ignore_errors,
+                use_processes=use_processes,
+                profiler=profiler) as writer, create_sink(
+                bag_file=bag_file,
+                output_dir=output_dir,
+                depth_scale=depth_scale,
+                output=output,
+                metadata_columns=metadata_names(n_metadata)
+                    if output.metadata_format == 'table' else None,
+                label_dir=label_dir,
+                max_permissible_difference_s=max_permissible_difference_s,
+                writer=writer,
+                checkpoint_path=checkpoint_path,
+                resume=resume) as sink:
+            for start_s, end_s in ranges:
+                if not seek:
+                    pos_prev = 0
+                else:
+                    source.seek(start_s)
+                    pos_prev = source.position_s
+                while True:
+                    try:
+                        with profiler.stage('wait_for_frames'):
+                            frames: "rs.composite_frame" = source.wait_for_frames()
+                        pos_curr = source.position_s
+                        if pos_curr < pos_prev or pos_curr > end_s:
+                            break
+
+                        process_frame(n_metadata, depth_scale, source.align, frames, sink,
+                                      depth_units=output.depth_units, profiler=profiler,
+                                      pool=pool)
+                        profiler.add_frames()
+
+                        pbar.update(pos_curr - pos_prev)
+                        pos_prev = pos_curr
+                        if isinstance(sink, CheckpointedSink) and \
+                                pos_curr - checkpoint_pos_s >= checkpoint_interval_s:
+                            with profiler.stage('checkpoint'):
+                                sink.save(pos_curr)
+                            checkpoint_pos_s = pos_curr
+                    except Exception as exc: # pylint: disable=broad-except
+                        if not ignore_errors:
+                            raise exc
+        if checkpoint_path is not None and checkpoint_path.exists():
+            checkpoint_path.unlink()
     finally:
-        pipeline.stop()
+        source.stop()
 
-def process_frame(
+def check_output_options(output: OutputOptions, label_dir: Optional[Path]):
+    """Validates the xy_auto_align output options
+
+    Args:
+        output (OutputOptions): Output options
+        label_dir (Optional[Path]): Label directory
+
+    Raises:
+        ValueError: Invalid option
+    """
+    if output.output_format not in OUTPUT_FORMATS:
+        raise ValueError(f'Unknown output format {output.output_format}')
+    if output.depth_units not in DEPTH_UNITS:
+        raise ValueError(f'Unknown depth units {output.depth_units}')
+    if output.metadata_format not in METADATA_FORMATS:
+        raise ValueError(f'Unknown metadata format {output.metadata_format}')
+    if output.link_strategy not in LINK_STRATEGIES:
+        raise ValueError(f'Unknown link strategy {output.link_strategy}')
+    if output.output_format == 'paired' and label_dir is None:
+        raise ValueError('Paired output requires a label directory')
+    if output.label_codec is not None and not output.label_codec.viewable:
+        raise ValueError(f'Labeling tools cannot open {output.label_codec.name} stills')
+
+def create_sink(
         bag_file: Path,
         output_dir: Path,
+        depth_scale: float,
+        output: OutputOptions,
+        *,
+        metadata_columns: Optional[List[str]] = None,
+        label_dir: Optional[Path] = None,
+        max_permissible_difference_s: float = 0.1,
+        writer: Optional[FrameWriterPool] = None,
+        checkpoint_path: Optional[Path] = None,
+        resume: Optional[Checkpoint] = None) -> FrameSink:
+    """Creates the frame sink for the specified output options
+
+    Args:
+        bag_file (Path): Bag file path
+        output_dir (Path): Output directory
+        depth_scale (float): Depth scale
+        output (OutputOptions): Output options
+        metadata_columns (Optional[List[str]], optional): If set, file output metadata is written
+            to a single table with these columns instead of per-frame files.  Defaults to None.
+        label_dir (Optional[Path], optional): Label directory for `paired` output.  Defaults to
+            None.
+        max_permissible_difference_s (float, optional): Maximum temporal misalignment for `paired`
+            output.  Defaults to 0.1.
+        writer (Optional[FrameWriterPool], optional): Writer pool for file output.  Defaults to
+            None.
+        checkpoint_path (Optional[Path], optional): If set, the sink is wrapped in a
+            `CheckpointedSink` writing to this path.  Defaults to None.
+        resume (Optional[Checkpoint], optional): Checkpoint whose output to continue.  Defaults
+            to None.
+
+    Returns:
+        FrameSink: Frame sink
+    """
+    # pylint: disable=too-many-arguments
+    state: Dict[str, Any] = resume.sink if resume is not None else {}
+    sink: FrameSink
+    output_dir.mkdir(parents=True, exist_ok=True)
+    if output.output_format == 'store':
+        sink = FrameStoreWriter(
+            path=output_dir.joinpath(f'{bag_file.stem}.h5'),
+            attrs={
+                'bag_file': bag_file.name,
+                'depth_scale': depth_scale,
+                'depth_units': output.depth_units
+            },
+            n_frames=state.get('n_frames', None))
+    else:
+        if output.depth_units == 'counts':
+            write_depth_scale(output_dir.joinpath(f'{bag_file.stem}{SCALE_FILE_SUFFIX}'),
+                              depth_scale)
+        metadata_table = None
+        if metadata_columns is not None:
+            metadata_table = MetadataTableWriter(
+                path=output_dir.joinpath(f'{bag_file.stem}{TABLE_SUFFIX}'),
+                columns=metadata_columns,
+                offset=state.get('metadata_offset', None))
+        if output.output_format == 'paired':
+            sink = PairedFrameSink(bag_file=bag_file,
+                                   output_dir=output_dir,
+                                   label_dir=label_dir,
+                                   max_permissible_difference_s=max_permissible_difference_s,
+                                   writer=writer,
+                                   metadata_table=metadata_table,
+                                   link_strategy=output.link_strategy,
+                                   first_frame_idx=state.get('n_pairs', 0),
+                                   color_codec=output.color_codec,
+                                   label_codec=output.label_codec)
+        else:
+            sink = FileFrameSink(bag_file=bag_file,
+                                 output_dir=output_dir,
+                                 writer=writer,
+                                 metadata_table=metadata_table,
+                                 color_codec=output.color_codec)
+    if checkpoint_path is None:
+        return sink
+    return CheckpointedSink(sink=sink,
+                            path=checkpoint_path,
+                            output_format=output.output_format,
+                            resume=resume)
+
+def process_frame(
         n_metadata: int,
         depth_scale: float,
         align: "rs.align",
-        frames: "rs.composite_frame"):
+        frames: "rs.composite_frame",
+        sink: FrameSink,
+        *,
+        depth_units: str = 'meters',
+        profiler: StageProfiler = NULL_PROFILER,
+        pool: Optional[FramePool] = None):
     """Processes a RealSense Compsite Frame
 
     Args:
-        bag_file (Path): Bag file path
-        output_dir (Path): Output directory
         n_metadata (int): Number of metadata items to extract per frame
         depth_scale (float): Depth scale
         align (rs.align): Alignment object
         frames (rs.composite_frame): Frame to process
+        sink (FrameSink): Destination for the extracted frames
+        depth_units (str, optional): Depth units, one of `DEPTH_UNITS`.  Defaults to `meters`.
+        profiler (StageProfiler, optional): Profiler to record stage wall times in.  Defaults to
+            `NULL_PROFILER`.
+        pool (Optional[FramePool], optional): Pool to lease the image buffers of the extracted
+            frames from.  If None, each image is newly allocated.  Defaults to None.
     """
     # pylint: disable=too-many-arguments
-    aligned_frames: "rs.composite_frame" = align.process(frames)
+    with profiler.stage('align'):
+        aligned_frames: "rs.composite_frame" = align.process(frames)
 
-    aligned_depth_frame: "rs.depth_frame" = aligned_frames.get_depth_frame()
-    color_frame: "rs.video_frame" = aligned_frames.get_color_frame()
+        aligned_depth_frame: "rs.depth_frame" = aligned_frames.get_depth_frame()
+        color_frame: "rs.video_frame" = aligned_frames.get_color_frame()
 
     if aligned_depth_frame:
-        process_depth_frame(
-                            bag_file=bag_file,
-                            output_dir=output_dir,
+        depth_frame = process_depth_frame(
                             n_metadata=n_metadata,
                             depth_scale=depth_scale,
-                            aligned_depth_frame=aligned_depth_frame)
+                            aligned_depth_frame=aligned_depth_frame,
+                            depth_units=depth_units,
+                            profiler=profiler,
+                            pool=pool)
+        with profiler.stage('sink'):
+            sink.write_frame(depth_frame)
 
     if color_frame:
-        process_video_frame(
-                            bag_file=bag_file,
-                            output_dir=output_dir,
+        video_frame = process_video_frame(
                             n_metadata=n_metadata,
-                            color_frame=color_frame)
+                            color_frame=color_frame,
+                            profiler=profiler,
+                            pool=pool)
+        with profiler.stage('sink'):
+            sink.write_frame(video_frame)
 
 def process_video_frame(
-        bag_file: Path,
-        output_dir: Path,
         n_metadata: int,
-        color_frame: "rs.video_frame"):
+        color_frame: "rs.video_frame",
+        profiler: StageProfiler = NULL_PROFILER,
+        pool: Optional[FramePool] = None) -> StreamFrame:
     """Process a video frame
 
     Args:
-        bag_file (Path): Bag file path
-        output_dir (Path): Output Directory
         n_metadata (int): Number of metadata items
         color_frame (rs.video_frame): Video Frame
+        profiler (StageProfiler, optional): Profiler to record stage wall times in.  Defaults to
+            `NULL_PROFILER`.
+        pool (Optional[FramePool], optional): Pool to lease the image buffer from.  Defaults to
+            None.
+
+    Returns:
+        StreamFrame: Extracted frame
     """
-    color_image = np.asanyarray(color_frame.get_data())
+    with profiler.stage('color_data'):
+        # RealSense recycles frame buffers, so anything handed to a sink must own its data
+        color_data = np.asanyarray(color_frame.get_data())
+        color_image = pool.copy(color_data) if pool is not None else np.array(color_data)
     color_timestamp_s = color_frame.get_timestamp() / 1e3
     color_frame_number = color_frame.get_frame_number()
     stream_name = color_frame.get_profile().stream_type().name
-    img_name = f"{bag_file.stem}_Color_t{color_timestamp_s:.9f}.png"
-    fname = output_dir.joinpath(img_name)
-    mtd_name = f'{bag_file.stem}_Color_Metadata_t{color_timestamp_s:.9f}.txt'
-    mtd_fname = output_dir.joinpath(mtd_name)
 
     metadata = {
         "Stream": stream_name,
@@ -115,8 +366,27 @@ def process_video_frame(
         'frame_timestamp': color_timestamp_s
     }
 
-    extract_metadata(n_metadata, color_frame, metadata)
-    write_data(color_image, fname, mtd_fname, metadata)
+    with profiler.stage('metadata'):
+        extract_metadata(n_metadata, color_frame, metadata)
+    return StreamFrame(
+        stream='Color',
+        image=color_image,
+        timestamp_s=color_timestamp_s,
+        frame_number=color_frame_number,
+        metadata=metadata,
+        pool=pool
+    )
+
+def metadata_names(n_metadata: int) -> List[str]:
+    """Names of the metadata items extracted by `extract_metadata`
+
+    Args:
+        n_metadata (int): Number of items to extract
+
+    Returns:
+        List[str]: Metadata names
+    """
+    return [rs.frame_metadata_value(i).name for i in range(n_metadata)]
 
 def extract_metadata(n_metadata: int, frame: "rs.frame", metadata: Dict[str, Union[str, int]]):
     """Extracts the metadata from a RealSense frame into the metadata dictionary
@@ -132,30 +402,44 @@ def extract_metadata(n_metadata: int, frame: "rs.frame", metadata: Dict[str, Uni
             metadata[mtd_val.name] = frame.get_frame_metadata(mtd_val)
 
 def process_depth_frame(
-        bag_file: Path,
-        output_dir: Path,
         n_metadata: int,
         depth_scale: float,
-        aligned_depth_frame: "rs.depth_frame"):
+        aligned_depth_frame: "rs.depth_frame",
+        *,
+        depth_units: str = 'meters',
+        profiler: StageProfiler = NULL_PROFILER,
+        pool: Optional[FramePool] = None) -> StreamFrame:
     """Process a depth frame
 
     Args:
-        bag_file (Path): Bag file path
-        output_dir (Path): Output directory
         n_metadata (int): Number of metadata items
         depth_scale (float): Depth scale
         aligned_depth_frame (rs.depth_frame): Depth frame
+        depth_units (str, optional): `meters` to convert to float32 meters, `counts` to keep the
+            native uint16 counts.  Defaults to `meters`.
+        profiler (StageProfiler, optional): Profiler to record stage wall times in.  Defaults to
+            `NULL_PROFILER`.
+        pool (Optional[FramePool], optional): Pool to lease the image buffer from.  Defaults to
+            None.
+
+    Returns:
+        StreamFrame: Extracted frame
     """
-    depth_image_counts: np.ndarray = np.asanyarray(aligned_depth_frame.get_data())
+    # pylint: disable=too-many-arguments
+    with profiler.stage('depth_data'):
+        depth_image_counts: np.ndarray = np.asanyarray(aligned_depth_frame.get_data())
     depth_timestamp_s = aligned_depth_frame.get_timestamp() / 1e3
     depth_frame_number = aligned_depth_frame.get_frame_number()
-    depth_image_m = (depth_image_counts * depth_scale).astype(np.float32)
+    with profiler.stage('depth_scale'):
+        # Meters are scaled straight into the leased buffer, without an intermediate array
+        if depth_units == 'counts':
+            depth_image = pool.copy(depth_image_counts) if pool is not None \
+                else depth_image_counts.copy()
+        else:
+            out = pool.acquire(depth_image_counts.shape, np.float32) if pool is not None else None
+            depth_image = np.multiply(depth_image_counts, np.float32(depth_scale),
+                                      out=out, dtype=np.float32)
     stream_name = aligned_depth_frame.get_profile().stream_type().name
-    depth_img_path = f"{bag_file.stem}_Depth_t{depth_timestamp_s:.9f}.tiff"
-    fname = output_dir.joinpath(depth_img_path)
-    depth_metadata_path = (f'{bag_file.stem}_'
-                            f'Depth_Metadata_t{depth_timestamp_s:.9f}.txt')
-    mtd_fname = output_dir.joinpath(depth_metadata_path)
 
     metadata = {
         "Stream": stream_name,
@@ -163,8 +447,16 @@ def process_depth_frame(
         'frame_timestamp': depth_timestamp_s
     }
 
-    extract_metadata(n_metadata, aligned_depth_frame, metadata)
-    write_data(depth_image_m, fname, mtd_fname, metadata)
+    with profiler.stage('metadata'):
+        extract_metadata(n_metadata, aligned_depth_frame, metadata)
+    return StreamFrame(
+        stream='Depth',
+        image=depth_image,
+        timestamp_s=depth_timestamp_s,
+        frame_number=depth_frame_number,
+        metadata=metadata,
+        pool=pool
+    )
 
 def configure_rs_pipeline(bag_file: Path) -> \
         Tuple["rs.pipeline", "rs.playback", float, float, "rs.align"]:
@@ -195,27 +487,40 @@ def configure_rs_pipeline(bag_file: Path) -> \
     align: "rs.align" = rs.align(align_to)
     return pipeline, playback, duration.total_seconds(), depth_scale, align
 
-def write_data(image_data: np.ndarray, img_fname: Path, mtd_fname: Path, metadata: Dict[str, Any]):
-    """Writes the RealSense metadata to the specified filename
-
-    Args:
-        image_data (np.ndarray): Image Data
-        img_fname (Path): Path to image
-        mtd_fname (Path): Path to metadata
-        metadata (Dict[str, Any]): Metadata
+class RealSenseSource(FrameSource):
+    """Plays back a RealSense ROSBAG file
     """
-    cv.imwrite(img_fname.as_posix(), image_data)
+    def __init__(self, bag_file: Path) -> None:
+        """Starts the playback
+
+        Args:
+            bag_file (Path): ROSBAG path
+        """
+        self.__pipeline, self.__playback, duration, depth_scale, align = \
+            configure_rs_pipeline(bag_file)
+        super().__init__(duration_s=duration, depth_scale=depth_scale, align=align)
 
-    with open(mtd_fname, 'w', encoding='utf-8') as mtd_file:
-        for key, value in metadata.items():
-            mtd_file.write(f'{key}: {value}\n')
+    @property
+    def position_s(self) -> float:
+        return self.__playback.get_position() / 1e9
 
+    def wait_for_frames(self) -> "rs.composite_frame":
+        return self.__pipeline.wait_for_frames()
+
+    def seek(self, position_s: float) -> None:
+        self.__playback.seek(dt.timedelta(seconds=position_s))
+
+    def stop(self) -> None:
+        self.__pipeline.stop()
 
 def t_align(
         input_dir: Path,
         output_dir: Path,
         label_dir: Path,
-        max_permissible_difference_s: float = 0.1):
+        max_permissible_difference_s: float = 0.1,
+        *,
+        link_strategy: str = 'auto',
+        label_codec: Optional[ImageCodec] = None):
     """Generates temporally aligned RGB and depth frames
 
     Args:
@@ -224,59 +529,37 @@ def t_align(
         label_dir (Path): Directory in which to place a copy of RGB frames for labeling
         max_permissible_difference_s (float, optional): Maximum temporal misalignment.
             Defaults to 0.1.
+        link_strategy (str, optional): How RGB frames are placed in the label directory, one of
+            `LINK_STRATEGIES`.  `auto` uses the cheapest strategy the filesystems support.
+            Defaults to `auto`.
+        label_codec (Optional[ImageCodec], optional): Codec of the RGB frames in the label
+            directory.  If None or matching the extracted stills, the stills are linked instead of
+            encoded again, except raw stills, which are encoded as PNG.  Defaults to None.
     """
-    # pylint: disable=too-many-locals
-    bag_file_name = ''
-    color_frame_t: Dict[float, Path] = {}
-    for color_frame in tqdm(input_dir.glob('*_Color_t[0-9.]*')):
-        fname = color_frame.stem
-        timestamp = float(fname[fname.find('_t') + 2:])
-        color_frame_t[timestamp] = color_frame
-        bag_file_name = color_frame.name[:color_frame.name.find('_Color_t')]
-
-    color_times = list(color_frame_t.keys())
-
-    depth_frame_t: Dict[float, Path] = {}
-    for depth_frame in tqdm(input_dir.glob('*_Depth_t[0-9.]*')):
-        fname = depth_frame.stem
-        timestamp = float(fname[fname.find('_t') + 2:])
-        depth_frame_t[timestamp] = depth_frame
-
-    depth_times = list(depth_frame_t.keys())
-
-    rgb_idx = 0
-    depth_idx = 0
-    frame_idx = 0
-    with tqdm(total=len(depth_times)) as pbar:
-        while rgb_idx < len(color_times) and depth_idx < len(depth_times):
-            initial_difference_s = color_times[rgb_idx] - depth_times[depth_idx]
-            if initial_difference_s < -1 * max_permissible_difference_s:
-                rgb_idx += 1
-            elif initial_difference_s > max_permissible_difference_s:
-                depth_idx += 1
-                pbar.update(1)
-            else:
-                depth_time = depth_times[depth_idx]
-                color_time = color_times[rgb_idx]
-
-                depth_files = [
-                    input_dir.joinpath(f'{bag_file_name}_Depth_t{depth_time:.9f}.tiff'),
-                    input_dir.joinpath(f'{bag_file_name}_Depth_Metadata_t{depth_time:.9f}.txt'),
-                ]
-                color_files = [
-                    input_dir.joinpath(f'{bag_file_name}_Color_t{color_time:.9f}.png'),
-                    input_dir.joinpath(f'{bag_file_name}_Color_Metadata_t{color_time:.9f}.txt'),
-                ]
-
-                frame_folder = output_dir.joinpath(f'frame_{frame_idx:06d}')
-                frame_folder.mkdir(exist_ok=True, parents=True)
-                for depth_file in depth_files:
-                    move(depth_file, frame_folder.joinpath(depth_file.name))
-                for color_file in color_files:
-                    if color_file.suffix.endswith('png'):
-                        copy(color_file, label_dir.joinpath(color_file.name))
-                    move(color_file, frame_folder.joinpath(color_file.name))
-                rgb_idx += 1
-                depth_idx += 1
-                frame_idx += 1
-                pbar.update(1)
+    # pylint: disable=too-many-arguments
+    pairs = pair_frame_files(
+        input_dir=input_dir,
+        max_permissible_difference_s=max_permissible_difference_s
+    )
+    label_dir.mkdir(parents=True, exist_ok=True)
+    link_strategy = resolve_link_strategy(link_strategy, output_dir, label_dir)
+    for frame_idx, pair in enumerate(tqdm(pairs)):
+        frame_folder = output_dir.joinpath(f'frame_{frame_idx:06d}')
+        frame_folder.mkdir(exist_ok=True, parents=True)
+        for depth_file in pair.depth_files:
+            move(depth_file, frame_folder.joinpath(depth_file.name))
+        for color_file in pair.color_files:
+            frame_file = frame_folder.joinpath(color_file.name)
+            move(color_file, frame_file)
+            if not is_color_still(color_file):
+                continue
+            codec = label_codec
+            if codec is None or codec.extension == color_file.suffix.lower():
+                if color_file.suffix.lower() in VIEWABLE_EXTENSIONS:
+                    link_file(frame_file, label_dir.joinpath(color_file.name), link_strategy)
+                    continue
+                # Labeling tools cannot open raw stills
+                codec = ImageCodec()
+            image = read_image(frame_file)
+            if image is not None:
+                codec.write(image, label_dir.joinpath(color_file.stem + codec.extension))
@@ -0,0 +1,370 @@
+"""Provides accounting, copying and verification of bag files on the cache storage
+"""
+import errno
+import hashlib
+import os
+import re
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Condition
+from typing import Dict, Optional, Sequence, Tuple
+
+CHECKSUM_BLOCK_SIZE = 1 << 20
+COPY_CHUNK_SIZE = 64 << 20
+OFFSET_SUFFIX = '.offset'
+COPY_METHODS = ('copy_file_range', 'sendfile', 'readwrite')
+# Errors raised by the kernel copy calls when unsupported between the two files
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP,
+                      errno.ENOTSOCK}
+SIZE_UNITS = {'': 1, 'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30, 'T': 1 << 40}
+SIZE_PATTERN = re.compile(r'^\s*([0-9]+(?:\.[0-9]+)?)\s*([KMGT]?)i?B?\s*$', re.IGNORECASE)
+# Key, size and bytes still to be copied of a bag waiting for cache space
+CacheRequest = Tuple[str, int, int]
+
+
+class CacheSpaceError(OSError):
+    """A requested bag does not fit the free space of the cache, and no held bag can make room
+    """
+    def __init__(self, index: int, required: int, free_bytes: int) -> None:
+        """Creates a new cache space error
+
+        Args:
+            index (int): Index of the request that cannot be admitted
+            required (int): Bytes still to be copied of the bag
+            free_bytes (int): Free space on the cache file system
+        """
+        super().__init__(errno.ENOSPC,
+                         f'{required} bytes to copy, {free_bytes} bytes free in the cache')
+        self.index = index
+
+
+class CacheAccount:
+    """Tracks the cache space held by each copied bag until its worker releases it
+
+    A copy is only admitted once the cache file system has room for it, and the bytes held stay
+    within the budget.  The budget is waived when no other bag is held, so bags larger than the
+    budget still make progress, but the free space never is.
+    """
+    def __init__(self,
+            cache_path: Path,
+            limit_bytes: Optional[int] = None,
+            poll_interval_s: float = 5.0) -> None:
+        """Creates a new cache account
+
+        Args:
+            cache_path (Path): Cache directory
+            limit_bytes (Optional[int], optional): Byte budget of the cache.  Defaults to the free
+                space only.
+            poll_interval_s (float, optional): Interval at which free space is re-checked while
+                waiting for room.  Defaults to 5.0.
+        """
+        self.__cache_path = cache_path
+        self.__limit_bytes = limit_bytes
+        self.__poll_interval_s = poll_interval_s
+        self.__held: Dict[str, int] = {}
+        self.__condition = Condition()
+
+    @property
+    def free_bytes(self) -> int:
+        """Free space on the cache file system
+
+        Returns:
+            int: Free bytes
+        """
+        return shutil.disk_usage(self.__cache_path).free
+
+    @property
+    def held(self) -> Dict[str, int]:
+        """Bytes held by each bag
+
+        Returns:
+            Dict[str, int]: Bag size keyed by bag reference name
+        """
+        with self.__condition:
+            return dict(self.__held)
+
+    @property
+    def held_bytes(self) -> int:
+        """Total bytes held by copied bags
+
+        Returns:
+            int: Held bytes
+        """
+        with self.__condition:
+            return sum(self.__held.values())
+
+    def acquire(self,
+            key: str,
+            size: int,
+            required: Optional[int] = None,
+            timeout: Optional[float] = None) -> bool:
+        """Waits for room in the cache and holds it for the specified bag
+
+        Args:
+            key (str): Bag reference name
+            size (int): Bag size in bytes
+            required (Optional[int], optional): Bytes still to be written to the cache, if part of
+                the bag is already cached.  Defaults to `size`.
+            timeout (Optional[float], optional): Maximum time to wait in seconds.  Defaults to
+                waiting indefinitely.
+
+        Raises:
+            CacheSpaceError: The bag does not fit the free space, and no bag is held
+
+        Returns:
+            bool: True if the space is now held, False on timeout
+        """
+        required = size if required is None else required
+        return self.acquire_any([(key, size, required)], timeout=timeout) is not None
+
+    def acquire_any(self,
+            requests: Sequence[CacheRequest],
+            timeout: Optional[float] = None) -> Optional[int]:
+        """Waits for room in the cache for any of the requested bags, and holds it for the first
+        that fits
+
+        Args:
+            requests (Sequence[CacheRequest]): Key, size and bytes still to be copied of each bag,
+                in order of preference
+            timeout (Optional[float], optional): Maximum time to wait in seconds.  Defaults to
+                waiting indefinitely.
+
+        Raises:
+            ValueError: No requests
+            CacheSpaceError: No request fits the free space, and no bag is held whose release
+                could make room.  The error's index is the preferred request.
+
+        Returns:
+            Optional[int]: Index of the admitted request, or None on timeout
+        """
+        if not requests:
+            raise ValueError('No requests')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.__condition:
+            while True:
+                idx = self.__first_fit(requests)
+                if idx is not None:
+                    key, size, _ = requests[idx]
+                    self.__held[key] = size
+                    return idx
+                if not self.__held:
+                    _, _, required = requests[0]
+                    raise CacheSpaceError(0, required, self.free_bytes)
+                # Space may also be freed outside of this account, so keep polling
+                wait_s = self.__poll_interval_s
+                if deadline is not None:
+                    wait_s = min(wait_s, deadline - time.monotonic())
+                    if wait_s <= 0:
+                        return None
+                self.__condition.wait(timeout=wait_s)
+
+    def release(self, key: str) -> None:
+        """Releases the space held by the specified bag
+
+        Args:
+            key (str): Bag reference name
+        """
+        with self.__condition:
+            self.__held.pop(key, None)
+            self.__condition.notify_all()
+
+    def __first_fit(self, requests: Sequence[CacheRequest]) -> Optional[int]:
+        held_bytes = sum(self.__held.values())
+        free_bytes = self.free_bytes
+        for idx, (_, size, required) in enumerate(requests):
+            if self.__held and self.__limit_bytes is not None and \
+                    held_bytes + size > self.__limit_bytes:
+                continue
+            if required <= free_bytes:
+                return idx
+        return None
+
+
+def partial_checksum(path: Path, block_size: int = CHECKSUM_BLOCK_SIZE) -> str:
+    """Computes a fast checksum of the file size and its first, middle and last blocks
+
+    Args:
+        path (Path): File to checksum
+        block_size (int, optional): Block size in bytes.  Defaults to `CHECKSUM_BLOCK_SIZE`.
+
+    Returns:
+        str: Hex digest
+    """
+    size = path.stat().st_size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, 'rb') as handle:
+        for offset in sorted({0, max(size // 2 - block_size // 2, 0), max(size - block_size, 0)}):
+            handle.seek(offset)
+            digest.update(handle.read(block_size))
+    return digest.hexdigest()
+
+def is_cached(src: Path, dst: Path) -> bool:
+    """Checks whether the destination is a complete copy of the source
+
+    Args:
+        src (Path): Source file
+        dst (Path): Cached copy
+
+    Returns:
+        bool: True if the sizes and partial checksums match
+    """
+    if not dst.exists() or dst.stat().st_size != src.stat().st_size:
+        return False
+    if offset_path(dst).exists():
+        # Copy interrupted before its last checkpoint was cleared
+        return False
+    return partial_checksum(src) == partial_checksum(dst)
+
+@dataclass
+class CopyStats:
+    """Result of a bag copy
+    """
+    n_bytes: int
+    resumed_from: int
+    elapsed_s: float
+    method: str
+
+    @property
+    def throughput_mbps(self) -> float:
+        """Copy throughput, excluding resumed bytes
+
+        Returns:
+            float: Throughput in MB/s
+        """
+        if self.elapsed_s <= 0:
+            return float('inf')
+        return (self.n_bytes - self.resumed_from) / 1e6 / self.elapsed_s
+
+
+def offset_path(dst: Path) -> Path:
+    """Path of the sidecar file recording the progress of a copy
+
+    Args:
+        dst (Path): Destination file
+
+    Returns:
+        Path: Offset file path
+    """
+    return dst.with_name(dst.name + OFFSET_SUFFIX)
+
+def resume_offset(src: Path, dst: Path, chunk_size: int = COPY_CHUNK_SIZE) -> int:
+    """Offset from which an interrupted copy can resume
+
+    Args:
+        src (Path): Source file
+        dst (Path): Destination file
+        chunk_size (int, optional): Copy chunk size.  Defaults to `COPY_CHUNK_SIZE`.
+
+    Returns:
+        int: Chunk aligned offset, or 0 if there is no valid checkpoint for this source
+    """
+    sidecar = offset_path(dst)
+    if not sidecar.exists() or not dst.exists():
+        return 0
+    try:
+        fields = sidecar.read_text(encoding='utf-8').split()
+        offset, size, mtime_ns = (int(field) for field in fields)
+    except ValueError:
+        return 0
+    stat = src.stat()
+    if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+        return 0
+    offset = min(offset, dst.stat().st_size)
+    return offset - offset % chunk_size
+
+def copy_bag(
+        src: Path,
+        dst: Path,
+        chunk_size: int = COPY_CHUNK_SIZE,
+        method: str = 'copy_file_range') -> CopyStats:
+    """Copies the file in chunks, resuming an interrupted copy of the same source
+
+    After each chunk, the destination is synced and the offset is recorded in a sidecar file, which
+    is removed once the copy is complete.  If the kernel copy method is not supported between the
+    two files, the next method of `COPY_METHODS` is used.
+
+    Args:
+        src (Path): Source file
+        dst (Path): Destination file
+        chunk_size (int, optional): Copy chunk size.  Defaults to `COPY_CHUNK_SIZE`.
+        method (str, optional): Preferred method, one of `COPY_METHODS`.  Defaults to
+            `copy_file_range`.
+
+    Raises:
+        ValueError: Unknown method
+        OSError: Source truncated during the copy
+
+    Returns:
+        CopyStats: Copy statistics
+    """
+    if method not in COPY_METHODS:
+        raise ValueError(f'Unknown copy method {method}')
+    methods = [name for name in COPY_METHODS[COPY_METHODS.index(method):]
+               if name == 'readwrite' or hasattr(os, name)]
+    stat = src.stat()
+    sidecar = offset_path(dst)
+    offset = resume_offset(src, dst, chunk_size)
+    start = time.monotonic()
+    with open(src, 'rb', buffering=0) as src_handle, \
+            open(dst, 'r+b' if offset else 'wb', buffering=0) as dst_handle:
+        dst_handle.truncate(offset)
+        position = offset
+        while position < stat.st_size:
+            count = min(chunk_size - position % chunk_size, stat.st_size - position)
+            while True:
+                try:
+                    n_copied = _copy_chunk(methods[0], src_handle, dst_handle, position, count)
+                    break
+                except OSError as exc:
+                    if exc.errno not in UNSUPPORTED_ERRNOS or len(methods) == 1:
+                        raise
+                    methods.pop(0)
+            if n_copied == 0:
+                raise OSError(f'{src} ended at {position} of {stat.st_size} bytes')
+            position += n_copied
+            if position % chunk_size == 0 or position == stat.st_size:
+                os.fsync(dst_handle.fileno())
+                _write_offset(sidecar, position, stat.st_size, stat.st_mtime_ns)
+    sidecar.unlink(missing_ok=True)
+    return CopyStats(
+        n_bytes=stat.st_size,
+        resumed_from=offset,
+        elapsed_s=time.monotonic() - start,
+        method=methods[0]
+    )
+
+def _copy_chunk(method: str, src_handle, dst_handle, position: int, count: int) -> int:
+    if method == 'copy_file_range':
+        return os.copy_file_range(src_handle.fileno(), dst_handle.fileno(), count,
+                                  position, position)
+    if method == 'sendfile':
+        dst_handle.seek(position)
+        return os.sendfile(dst_handle.fileno(), src_handle.fileno(), position, count)
+    src_handle.seek(position)
+    dst_handle.seek(position)
+    return dst_handle.write(src_handle.read(count))
+
+def _write_offset(sidecar: Path, offset: int, size: int, mtime_ns: int):
+    tmp_path = sidecar.with_name(sidecar.name + '.tmp')
+    tmp_path.write_text(f'{offset} {size} {mtime_ns}\n', encoding='utf-8')
+    os.replace(tmp_path, sidecar)
+
+def parse_size(size: str) -> int:
+    """Parses a byte count with an optional binary unit suffix, e.g. `500G`
+
+    Args:
+        size (str): Byte count
+
+    Raises:
+        ValueError: Invalid byte count
+
+    Returns:
+        int: Number of bytes
+    """
+    match = SIZE_PATTERN.match(size)
+    if match is None:
+        raise ValueError(f'Invalid size {size}')
+    value, unit = match.groups()
+    return int(float(value) * SIZE_UNITS[unit.upper()])
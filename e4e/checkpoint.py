@@ -0,0 +1,176 @@
+"""Provides frame-level checkpoints so that a failed extraction can resume mid-bag
+
+A checkpoint records how far the extraction of a bag has durably progressed:
+```
+{
+    "format_version": 1,
+    "output_format": "files",
+    "position_s": 123.4,
+    "timestamps": {"Color": 1650000123.456, "Depth": 1650000123.449},
+    "sink": {...}
+}
+```
+`position_s` is the playback position referenced to the start of the bag, `timestamps` is the
+latest frame of each stream that the sink has written, and `sink` is the state the sink needs to
+continue its output, see `FrameSink.checkpoint`.
+"""
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from e4e.sinks import FrameSink, StreamFrame
+
+FORMAT_VERSION = 1
+CHECKPOINT_SUFFIX = '_Checkpoint.json'
+# Frames still buffered by a sink, e.g. awaiting a match, were read before the checkpoint position
+RESUME_REWIND_S = 1.0
+
+
+@dataclass
+class Checkpoint:
+    """Extraction progress of a single bag
+    """
+    output_format: str
+    position_s: float = 0.
+    timestamps: Dict[str, float] = field(default_factory=dict)
+    sink: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def resume_position_s(self) -> float:
+        """Playback position to seek to when resuming
+
+        Returns:
+            float: Position in seconds, referenced to the start of the bag
+        """
+        return max(self.position_s - RESUME_REWIND_S, 0.)
+
+    def save(self, path: Path) -> None:
+        """Atomically replaces the checkpoint file
+
+        Args:
+            path (Path): Checkpoint path
+        """
+        record = {
+            'format_version': FORMAT_VERSION,
+            'output_format': self.output_format,
+            'position_s': self.position_s,
+            'timestamps': self.timestamps,
+            'sink': self.sink
+        }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(record, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional['Checkpoint']:
+        """Loads a checkpoint
+
+        Args:
+            path (Path): Checkpoint path
+
+        Raises:
+            RuntimeError: Unsupported checkpoint version
+
+        Returns:
+            Optional[Checkpoint]: Checkpoint, or None if there is none
+        """
+        if not path.exists():
+            return None
+        with open(path, 'r', encoding='utf-8') as handle:
+            record = json.load(handle)
+        version = record.get('format_version', None)
+        if version != FORMAT_VERSION:
+            raise RuntimeError(f'Unsupported checkpoint version {version}')
+        return cls(output_format=record['output_format'],
+                   position_s=float(record['position_s']),
+                   timestamps={stream: float(timestamp)
+                               for stream, timestamp in record['timestamps'].items()},
+                   sink=record['sink'])
+
+
+def checkpoint_file(output_dir: Path, bag_file: Path) -> Path:
+    """Path of the checkpoint of the specified bag
+
+    Args:
+        output_dir (Path): Output directory of the bag
+        bag_file (Path): Bag file path
+
+    Returns:
+        Path: `{bag}_Checkpoint.json` in the output directory
+    """
+    return output_dir.joinpath(f'{bag_file.stem}{CHECKPOINT_SUFFIX}')
+
+
+class CheckpointedSink(FrameSink):
+    """Checkpoints the progress of a frame sink
+
+    When resuming, frames at or before the latest written timestamp of their stream are skipped, so
+    the playback can be rewound past the checkpoint position without writing frames twice.
+    """
+    def __init__(self,
+            sink: FrameSink,
+            path: Path,
+            output_format: str,
+            resume: Optional[Checkpoint] = None) -> None:
+        """Creates a new checkpointed sink
+
+        Args:
+            sink (FrameSink): Sink to checkpoint.  If resuming, it must have been created from the
+                checkpoint's sink state.
+            path (Path): Checkpoint path
+            output_format (str): Output format of the sink
+            resume (Optional[Checkpoint], optional): Checkpoint to resume from.  Defaults to None.
+        """
+        self.__sink = sink
+        self.__path = path
+        self.__output_format = output_format
+        self.__written: Dict[str, float] = dict(resume.timestamps) if resume else {}
+        self.__timestamps = dict(self.__written)
+        self.n_skipped = 0
+
+    def write_frame(self, frame: StreamFrame) -> None:
+        if frame.timestamp_s <= self.__written.get(frame.stream, float('-inf')):
+            self.n_skipped += 1
+            frame.release()
+            return
+        self.__sink.write_frame(frame)
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Flushes the sink and returns its state
+
+        Returns:
+            Dict[str, Any]: State of the wrapped sink.  `timestamps` also holds the resumed
+                timestamps of streams without newer frames.
+        """
+        state = self.__sink.checkpoint()
+        for stream, timestamp in state.pop('timestamps', {}).items():
+            self.__timestamps[stream] = max(timestamp,
+                                            self.__timestamps.get(stream, float('-inf')))
+        state['timestamps'] = dict(self.__timestamps)
+        return state
+
+    def save(self, position_s: float) -> Checkpoint:
+        """Flushes the sink and writes a checkpoint
+
+        Args:
+            position_s (float): Playback position of the latest frame handed to the sink
+
+        Returns:
+            Checkpoint: Written checkpoint
+        """
+        state = self.checkpoint()
+        checkpoint = Checkpoint(output_format=self.__output_format,
+                                position_s=position_s,
+                                timestamps=state.pop('timestamps'),
+                                sink=state)
+        checkpoint.save(self.__path)
+        return checkpoint
+
+    def close(self) -> None:
+        self.__sink.close()
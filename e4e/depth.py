@@ -0,0 +1,167 @@
+"""Provides depth image storage and loading helpers
+
+Depth can be stored either as float32 meters, or as the native uint16 sensor counts with the
+depth scale recorded once per bag in a `{bag}_Depth_Scale.txt` file next to the stills.
+"""
+import re
+from pathlib import Path
+from typing import Optional
+
+import cv2 as cv
+import numpy as np
+
+DEPTH_UNITS = ('meters', 'counts')
+SCALE_FILE_SUFFIX = '_Depth_Scale.txt'
+# `{bag}_{stream}_t{timestamp}` still names, as written by `e4e.sinks.image_name`
+STILL_NAME_PATTERN = re.compile(r'(?P<bag>.+)_[^_]+_t\d+\.\d+')
+
+
+class DepthImage:
+    """Depth image with deferred conversion to meters
+    """
+    def __init__(self, data: np.ndarray, depth_scale: Optional[float] = None) -> None:
+        """Creates a new depth image
+
+        Args:
+            data (np.ndarray): Depth data, either integer counts or floating point meters
+            depth_scale (Optional[float], optional): Meters per count.  Required for integer data.
+                Defaults to None.
+
+        Raises:
+            ValueError: Integer data without a depth scale
+        """
+        if np.issubdtype(data.dtype, np.integer) and depth_scale is None:
+            raise ValueError('Depth scale required for depth counts')
+        self.__data = data
+        self.__depth_scale = depth_scale
+
+    @property
+    def is_counts(self) -> bool:
+        """Whether the underlying data is in sensor counts
+
+        Returns:
+            bool: True if stored as counts, False if stored as meters
+        """
+        return np.issubdtype(self.__data.dtype, np.integer)
+
+    @property
+    def data(self) -> np.ndarray:
+        """Underlying depth data, as stored
+
+        Returns:
+            np.ndarray: Depth data
+        """
+        return self.__data
+
+    @property
+    def depth_scale(self) -> Optional[float]:
+        """Meters per count
+
+        Returns:
+            Optional[float]: Depth scale, or None if stored as meters
+        """
+        return self.__depth_scale
+
+    @property
+    def shape(self):
+        """Image shape
+
+        Returns:
+            Tuple[int, ...]: Image shape
+        """
+        return self.__data.shape
+
+    def meters(self) -> np.ndarray:
+        """Depth in meters
+
+        Stored meters are returned without copying.
+
+        Returns:
+            np.ndarray: float32 depth in meters
+        """
+        if not self.is_counts:
+            return self.__data
+        return self.__data * np.float32(self.__depth_scale)
+
+
+def write_depth_scale(path: Path, depth_scale: float):
+    """Writes the depth scale file
+
+    Args:
+        path (Path): Depth scale file path
+        depth_scale (float): Meters per count
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(f'depth_scale: {depth_scale!r}\n')
+
+def read_depth_scale(path: Path) -> float:
+    """Reads the depth scale file
+
+    Args:
+        path (Path): Depth scale file path
+
+    Raises:
+        RuntimeError: No depth scale in file
+
+    Returns:
+        float: Meters per count
+    """
+    with open(path, 'r', encoding='utf-8') as handle:
+        for line in handle:
+            key, _, value = line.partition(':')
+            if key.strip() == 'depth_scale':
+                return float(value)
+    raise RuntimeError(f'No depth scale in {path}')
+
+def find_depth_scale(image_path: Path) -> Path:
+    """Finds the depth scale file of the bag the specified depth still was extracted from
+
+    The depth scale file is written next to the stills, which temporal alignment moves one level
+    down into frame folders, so both the image's directory and its parent are searched for
+    `{bag}_Depth_Scale.txt`.
+
+    Args:
+        image_path (Path): Depth still path, named by `e4e.sinks.image_name`
+
+    Raises:
+        RuntimeError: Bag not identifiable from the still name, or no or more than one depth
+            scale file of the bag
+
+    Returns:
+        Path: Depth scale file
+    """
+    match = STILL_NAME_PATTERN.match(image_path.name)
+    if match is None:
+        raise RuntimeError(f'Unable to identify the bag of {image_path}')
+    scale_name = f'{match.group("bag")}{SCALE_FILE_SUFFIX}'
+    candidates = [directory.joinpath(scale_name)
+                  for directory in (image_path.parent, image_path.parent.parent)
+                  if directory.joinpath(scale_name).is_file()]
+    if not candidates:
+        raise RuntimeError(f'No depth scale {scale_name} found for {image_path}')
+    if len(candidates) > 1:
+        raise RuntimeError(f'Ambiguous depth scale for {image_path}: '
+                           f'{", ".join(path.as_posix() for path in candidates)}')
+    return candidates[0]
+
+def load_depth(path: Path, depth_scale: Optional[float] = None) -> DepthImage:
+    """Loads a depth still
+
+    Args:
+        path (Path): Depth still path
+        depth_scale (Optional[float], optional): Meters per count.  If None and the still is in
+            counts, the depth scale file is located with `find_depth_scale`.  Defaults to None.
+
+    Raises:
+        RuntimeError: Unreadable image, or counts without exactly one depth scale file of its bag
+
+    Returns:
+        DepthImage: Depth image
+    """
+    data = cv.imread(path.as_posix(), cv.IMREAD_UNCHANGED)
+    if data is None:
+        raise RuntimeError(f'Unable to read {path}')
+    if np.issubdtype(data.dtype, np.integer) and depth_scale is None:
+        depth_scale = read_depth_scale(find_depth_scale(path))
+    return DepthImage(data, depth_scale)
@@ -0,0 +1,47 @@
+'''Class name registry
+
+Class name files are parsed once and cached by path.  A cached file is parsed again if its
+modification time or size changes.
+'''
+from os import PathLike
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Tuple, Union
+
+# Modification time and size of a class name file
+FileStamp = Tuple[int, int]
+
+_CLASS_NAMES: Dict[Path, Tuple[FileStamp, Dict[int, str]]] = {}
+_CLASS_NAMES_LOCK = Lock()
+
+
+def read_class_names(class_file_name: Union[str, PathLike]) -> Dict[int, str]:
+    """Reads the class names, one per line
+
+    Args:
+        class_file_name (Union[str, PathLike]): Class name file
+
+    Returns:
+        Dict[int, str]: Class name of each class index
+    """
+    path = Path(class_file_name).resolve()
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _CLASS_NAMES_LOCK:
+        cached = _CLASS_NAMES.get(path)
+    if cached is not None and cached[0] == stamp:
+        return dict(cached[1])
+
+    names = {}
+    with open(path, 'r', encoding='utf-8') as data:
+        for class_idx, name in enumerate(data):
+            names[class_idx] = name.strip('\n')
+    with _CLASS_NAMES_LOCK:
+        _CLASS_NAMES[path] = (stamp, names)
+    return dict(names)
+
+def clear_class_names() -> None:
+    """Discards all cached class names
+    """
+    with _CLASS_NAMES_LOCK:
+        _CLASS_NAMES.clear()
@@ -6,11 +6,11 @@ import cv2
 import pytesseract
 
 from e4e.detection_code.core.config import cfg
-from e4e.detection_code.core.utils import read_class_names
+from e4e.detection_code.class_names import read_class_names
 
 
 # function to count objects, can return total classes or count per class
-def count_objects(data, by_class = False, allowed_classes = list(read_class_names(cfg.YOLO.CLASSES).values())) -> Dict[str, int]:
+def count_objects(data, by_class = False, allowed_classes = None) -> Dict[str, int]:
     _, _, classes, num_objects = data
 
     #create dictionary to hold count of objects
@@ -19,6 +19,8 @@ def count_objects(data, by_class = False, allowed_classes = list(read_class_name
     # if by_class = True then count objects per class
     if by_class:
         class_names = read_class_names(cfg.YOLO.CLASSES)
+        if allowed_classes is None:
+            allowed_classes = list(class_names.values())
 
         # loop through total number of objects found
         for i in range(num_objects):
@@ -9,6 +9,7 @@ import numpy as np
 import pytesseract
 import tensorflow as tf
 
+from e4e.detection_code.class_names import read_class_names
 from e4e.detection_code.core.config import cfg
 
 # If you don't have tesseract executable in your PATH, include the following:
@@ -156,13 +157,6 @@ def load_weights(model, weights_file, model_name='yolov4', is_tiny=False):
     wf.close()
 
 
-def read_class_names(class_file_name):
-    names = {}
-    with open(class_file_name, 'r') as data:
-        for ID, name in enumerate(data):
-            names[ID] = name.strip('\n')
-    return names
-
 def load_config(FLAGS):
     if FLAGS.tiny:
         STRIDES = np.array(cfg.YOLO.STRIDES_TINY)
@@ -217,8 +211,10 @@ def format_boxes(bboxes, image_height, image_width):
         box[0], box[1], box[2], box[3] = xmin, ymin, xmax, ymax
     return bboxes
 
-def draw_bbox(image, bboxes, info = False, counted_classes = None, show_label=True, allowed_classes=list(read_class_names(cfg.YOLO.CLASSES).values()), read_plate = False):
+def draw_bbox(image, bboxes, info = False, counted_classes = None, show_label=True, allowed_classes=None, read_plate = False):
     classes = read_class_names(cfg.YOLO.CLASSES)
+    if allowed_classes is None:
+        allowed_classes = list(classes.values())
     num_classes = len(classes)
     image_h, image_w, _ = image.shape
     hsv_tuples = [(1.0 * x / num_classes, 1., 1.) for x in range(num_classes)]
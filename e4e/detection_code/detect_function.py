@@ -1,50 +1,192 @@
 '''Fish Detection Code
 '''
+from itertools import islice
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Iterator, List, Optional, Tuple
 
 import cv2
 import numpy as np
 import tensorflow as tf
-from tensorflow.python.saved_model import tag_constants # pylint: disable=no-name-in-module
 from tqdm import tqdm
 
+from e4e.detection_code.class_names import read_class_names
 from e4e.detection_code.core import utils
 from e4e.detection_code.core.config import cfg
 from e4e.detection_code.core.functions import count_objects
+from e4e.detection_code.model import INPUT_SIZE, YoloModel, load_model
+from e4e.detection_code.result_cache import (CONFIDENCE_OFFSET, CachedDetections,
+                                             DetectionCache, content_digest, stack_outputs)
+from e4e.prefetch import prefetch
 
 
-def detect(iou: float, score: float, images: List[Path]) -> List[Path]:
+# The exported yolov4-416 signature filters boxes inside the graph, flattening the boxes of all
+# images of a batch together, so its outputs are only valid one image at a time
+DEFAULT_BATCH_SIZE = 1
+DEFAULT_N_LOADERS = 4
+FISH_CLASS = 'Fish'
+# `presence` thresholds the fish confidences, `boxes` runs non max suppression and counts boxes
+DETECT_MODES = ('presence', 'boxes')
+
+# Boxes in pixels, scores, classes and number of valid detections, as used by `count_objects`
+Detections = List[Any]
+# Image path and original height and width
+ImageInfo = Tuple[Path, int, int]
+# Image digest, cached outputs, and preprocessed image with its original height and width
+LoadedImage = Tuple[Optional[str], Optional[CachedDetections],
+                    Optional[Tuple[np.ndarray, int, int]]]
+
+def detect(
+        iou: float,
+        score: float,
+        images: List[Path],
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_loaders: int = DEFAULT_N_LOADERS,
+        prefetch_depth: Optional[int] = None,
+        model: Optional[YoloModel] = None,
+        mode: str = 'presence',
+        cache: Optional[DetectionCache] = None) -> List[Path]:
     """Detects the fish images
 
+    In `presence` mode, an image has fish if the fish confidence of any box exceeds the score
+    threshold.  Non max suppression never discards the most confident box, so this finds the same
+    images as `boxes` mode, which runs non max suppression and counts the fish boxes, with a single
+    reduction per batch.
+
     Args:
-        iou (float): IoU threshold
+        iou (float): IoU threshold.  Only used in `boxes` mode
         score (float): Score threshold
         images (List[Path]): List of images to process
+        batch_size (int, optional): Number of images per inference call.  Defaults to
+            `DEFAULT_BATCH_SIZE`.
+        n_loaders (int, optional): Number of image loader threads.  0 loads images between
+            inference calls.  Defaults to `DEFAULT_N_LOADERS`.
+        prefetch_depth (Optional[int], optional): Maximum number of images loaded ahead of
+            inference.  Defaults to two batches or two images per loader, whichever is more.
+        model (Optional[YoloModel], optional): Detection model.  Defaults to the model at
+            `DEFAULT_MODEL_PATH`, loaded once per process.
+        mode (str, optional): One of `DETECT_MODES`.  Defaults to `presence`.
+        cache (Optional[DetectionCache], optional): Cache of model outputs.  Only images that are
+            not cached are inferred.  Defaults to None.
+
+    Raises:
+        ValueError: Unknown mode, or score threshold below the cache's minimum confidence
 
     Returns:
         List[Path]: List of images that have fish
     """
-    # pylint: disable=too-many-locals
-    #taking in input from given weights and input folders
+    # pylint: disable=too-many-arguments
+    if mode not in DETECT_MODES:
+        raise ValueError(f'Unknown detection mode {mode}')
+    if cache is not None and score < cache.min_confidence:
+        raise ValueError(f'Score threshold {score} is below the minimum cached confidence '
+                         f'{cache.min_confidence}')
+    if mode == 'presence':
+        scores = fish_scores(images=images,
+                             batch_size=batch_size,
+                             n_loaders=n_loaders,
+                             prefetch_depth=prefetch_depth,
+                             model=model,
+                             cache=cache)
+        return [input_file for input_file, fish_score in zip(images, scores)
+                if fish_score > score]
+
     list_fishes: List[Path] = []
+    input_classes = list(read_class_names(cfg.YOLO.CLASSES).values())
+    for input_file, pred_bbox in detect_objects(iou=iou,
+                                                score=score,
+                                                images=images,
+                                                batch_size=batch_size,
+                                                n_loaders=n_loaders,
+                                                prefetch_depth=prefetch_depth,
+                                                model=model,
+                                                cache=cache):
+        counted_things = count_objects(pred_bbox, by_class=True, allowed_classes=input_classes)
+        if FISH_CLASS in counted_things and counted_things[FISH_CLASS] != 0:
+            list_fishes.append(input_file)
+    return list_fishes
+
+def fish_scores(
+        images: List[Path],
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_loaders: int = DEFAULT_N_LOADERS,
+        prefetch_depth: Optional[int] = None,
+        model: Optional[YoloModel] = None,
+        cache: Optional[DetectionCache] = None) -> np.ndarray:
+    """Computes the highest fish confidence of each image, without non max suppression
 
-    model = tf.saved_model.load("./yolov4-416", tags=[tag_constants.SERVING])
-    infer = model.signatures['serving_default']
-    input_classes = list(utils.read_class_names(cfg.YOLO.CLASSES).values())
+    Args:
+        images (List[Path]): List of images to process
+        batch_size (int, optional): Number of images per inference call.  Defaults to
+            `DEFAULT_BATCH_SIZE`.
+        n_loaders (int, optional): Number of image loader threads.  Defaults to
+            `DEFAULT_N_LOADERS`.
+        prefetch_depth (Optional[int], optional): Maximum number of images loaded ahead of
+            inference.  Defaults to two batches or two images per loader, whichever is more.
+        model (Optional[YoloModel], optional): Detection model.  Defaults to the shared model.
+        cache (Optional[DetectionCache], optional): Cache of model outputs.  Defaults to None.
+
+    Returns:
+        np.ndarray: Fish confidence of each image, 0 if the model has no fish class
+    """
+    # pylint: disable=too-many-arguments
+    scores = np.zeros(len(images), dtype=np.float32)
+    class_names = list(read_class_names(cfg.YOLO.CLASSES).values())
+    if FISH_CLASS not in class_names:
+        return scores
+    fish_idx = CONFIDENCE_OFFSET + class_names.index(FISH_CLASS)
+    n_scored = 0
+    for batch, pred in infer_batches(images=images,
+                                     batch_size=batch_size,
+                                     n_loaders=n_loaders,
+                                     prefetch_depth=prefetch_depth,
+                                     model=model,
+                                     cache=cache):
+        batch_scores = tf.reduce_max(pred[:, :, fish_idx], axis=1).numpy()
+        scores[n_scored:n_scored + len(batch)] = batch_scores
+        n_scored += len(batch)
+    return scores
 
-    for input_file in tqdm(images):
-        # The current weights are designed for 416 x 416 images, so preprocssing, recoloring and
-        # One-hot encoding
-        tf_input, original_h, original_w = extract_data(input_file)
+def detect_objects(
+        iou: float,
+        score: float,
+        images: List[Path],
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_loaders: int = DEFAULT_N_LOADERS,
+        prefetch_depth: Optional[int] = None,
+        model: Optional[YoloModel] = None,
+        cache: Optional[DetectionCache] = None) -> Iterator[Tuple[Path, Detections]]:
+    """Detects the objects in each image
 
-        inference_result = list(infer(tf_input).values())
+    Runs a single non max suppression over each batch.
 
-        # `infer` outputs a result per image.  Because we only input a single image, we will only
-        # ever have one result.  Adding assertion to validate this assumption
-        assert len(inference_result) == 1
-        boxes = inference_result[-1][:, :, 0:4]
-        pred_conf = inference_result[-1][:, :, 4:]
+    Args:
+        iou (float): IoU threshold
+        score (float): Score threshold
+        images (List[Path]): List of images to process
+        batch_size (int, optional): Number of images per inference call.  Defaults to
+            `DEFAULT_BATCH_SIZE`.
+        n_loaders (int, optional): Number of image loader threads.  Defaults to
+            `DEFAULT_N_LOADERS`.
+        prefetch_depth (Optional[int], optional): Maximum number of images loaded ahead of
+            inference.  Defaults to two batches or two images per loader, whichever is more.
+        model (Optional[YoloModel], optional): Detection model.  Defaults to the shared model.
+        cache (Optional[DetectionCache], optional): Cache of model outputs.  Defaults to None.
+
+    Yields:
+        Iterator[Tuple[Path, Detections]]: Each image and its detections, in image order
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    for batch, pred in infer_batches(images=images,
+                                     batch_size=batch_size,
+                                     n_loaders=n_loaders,
+                                     prefetch_depth=prefetch_depth,
+                                     model=model,
+                                     cache=cache):
+        boxes = pred[:, :, 0:CONFIDENCE_OFFSET]
+        pred_conf = pred[:, :, CONFIDENCE_OFFSET:]
 
         # run non max suppression on detections
         boxes, scores, classes, valid_detections = tf.image.combined_non_max_suppression(
@@ -56,28 +198,136 @@ def detect(iou: float, score: float, images: List[Path]) -> List[Path]:
             iou_threshold=iou,
             score_threshold=score
         )
+        boxes, scores = boxes.numpy(), scores.numpy()
+        classes, valid_detections = classes.numpy(), valid_detections.numpy()
 
-        bboxes = utils.format_boxes(boxes.numpy()[0], original_h, original_w)
-        pred_bbox = [bboxes, scores.numpy()[0], classes.numpy()[0], valid_detections.numpy()[0]]
+        for idx, (input_file, original_h, original_w) in enumerate(batch):
+            bboxes = utils.format_boxes(boxes[idx], original_h, original_w)
+            yield input_file, [bboxes, scores[idx], classes[idx], valid_detections[idx]]
 
-        counted_things = count_objects(pred_bbox, by_class=True, allowed_classes=input_classes)
-        if 'Fish' in counted_things and counted_things['Fish'] != 0:
-            list_fishes.append(input_file)
+def infer_batches(
+        images: List[Path],
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_loaders: int = DEFAULT_N_LOADERS,
+        prefetch_depth: Optional[int] = None,
+        model: Optional[YoloModel] = None,
+        cache: Optional[DetectionCache] = None) -> Iterator[Tuple[List[ImageInfo], Any]]:
+    """Runs inference on the images in batches
 
-    return list_fishes
+    The next images are read and preprocessed by loader threads while the current batch is
+    inferred.  With a cache, the loader threads look up each image by content, and only images
+    that are not cached are decoded and inferred.
+
+    Args:
+        images (List[Path]): List of images to process
+        batch_size (int, optional): Number of images per inference call.  Defaults to
+            `DEFAULT_BATCH_SIZE`.
+        n_loaders (int, optional): Number of image loader threads.  0 loads images between
+            inference calls.  Defaults to `DEFAULT_N_LOADERS`.
+        prefetch_depth (Optional[int], optional): Maximum number of images loaded ahead of
+            inference.  Defaults to two batches or two images per loader, whichever is more.
+        model (Optional[YoloModel], optional): Detection model.  Defaults to the model at
+            `DEFAULT_MODEL_PATH`, loaded once per process.
+        cache (Optional[DetectionCache], optional): Cache of outputs of the model.  Defaults to
+            None.
+
+    Raises:
+        ValueError: Invalid batch size, or batch size above 1 with a model that filters boxes in
+            its graph
+
+    Yields:
+        Iterator[Tuple[List[ImageInfo], Any]]: Path and original size of each image of the
+            batch, and the model outputs for the batch.  With a cache, the outputs are the
+            cached candidate boxes of each image, padded to the same number of boxes.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    if model is not None:
+        check_batch_size(model, batch_size)
 
-def extract_data(input_file: Path) -> Tuple[tf.Tensor, int, int]:
-    """Extracts data from the input file for tensorflow inference
+    def load(input_file: Path) -> LoadedImage:
+        data = np.fromfile(input_file.as_posix(), dtype=np.uint8)
+        if cache is None:
+            return None, None, decode_image(data, input_file)
+        digest = content_digest(data.tobytes())
+        cached = cache.get(digest)
+        if cached is not None:
+            return digest, cached, None
+        return digest, None, decode_image(data, input_file)
+
+    # The current weights are designed for 416 x 416 images, so preprocssing, recoloring and
+    # One-hot encoding
+    loaded = prefetch(load, images,
+                      n_workers=n_loaders,
+                      depth=prefetch_depth if prefetch_depth is not None else
+                          2 * max(batch_size, n_loaders))
+    with tqdm(total=len(images)) as pbar:
+        for batch_start in range(0, len(images), batch_size):
+            batch_files = images[batch_start:batch_start + batch_size]
+            batch = list(islice(loaded, len(batch_files)))
+            misses = [idx for idx, (_, cached, _) in enumerate(batch) if cached is None]
+            pred = None
+            if misses:
+                if model is None:
+                    # Loaded on first use, so fully cached runs never load the model
+                    model = load_model()
+                    check_batch_size(model, batch_size)
+                pred = model.infer(np.stack([batch[idx][2][0] for idx in misses]))
+            if cache is None:
+                infos = [(input_file, original_h, original_w) for input_file,
+                         (_, _, (_, original_h, original_w)) in zip(batch_files, batch)]
+                yield infos, pred
+                pbar.update(len(batch_files))
+                continue
+
+            results: List[Optional[CachedDetections]] = [cached for _, cached, _ in batch]
+            if pred is not None:
+                pred = pred.numpy()
+                for pred_idx, idx in enumerate(misses):
+                    digest, _, (_, original_h, original_w) = batch[idx]
+                    results[idx] = cache.put(digest, original_h, original_w, pred[pred_idx])
+                cache.commit()
+            infos = [(input_file, result.height, result.width)
+                     for input_file, result in zip(batch_files, results)]
+            yield infos, stack_outputs([result.outputs for result in results])
+            pbar.update(len(batch_files))
+
+def check_batch_size(model: YoloModel, batch_size: int) -> None:
+    """Checks that the model keeps the outputs of each image of a batch apart
 
     Args:
-        input_file (Path): Input data file
+        model (YoloModel): Detection model
+        batch_size (int): Number of images per inference call
+
+    Raises:
+        ValueError: Batch size above 1 with a model that filters boxes in its graph
+    """
+    if batch_size > 1 and model.filters_in_graph:
+        raise ValueError(f'{model.path} filters boxes in its graph, which mixes the boxes of '
+                         'the images of a batch.  Use a batch size of 1, or a model exported '
+                         'without filtering')
+
+def decode_image(data: np.ndarray, input_file: Path) -> Tuple[np.ndarray, int, int]:
+    """Decodes and preprocesses an image for inference
+
+    Args:
+        data (np.ndarray): Encoded image file contents
+        input_file (Path): Input image file, for error messages
+
+    Raises:
+        RuntimeError: Image could not be decoded
 
     Returns:
-        Tuple[tf.Tensor, int, int]: Tensorflow inputs
+        Tuple[np.ndarray, int, int]: RGB image resized to the network input and scaled to [0, 1],
+            and the original height and width
     """
-    original_image = cv2.imread(input_file.as_posix())
+    original_image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+    if original_image is None:
+        raise RuntimeError(f'Unable to read {input_file}')
     rgb_img = cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB)
 
-    tf_input = tf.constant(np.asarray([cv2.resize(rgb_img, (416, 416)) / 255.], dtype=np.float32))
+    image = cv2.resize(rgb_img, (INPUT_SIZE, INPUT_SIZE)).astype(np.float32) / np.float32(255.)
     original_h, original_w, _ = original_image.shape
-    return tf_input, original_h, original_w
+    return image, original_h, original_w
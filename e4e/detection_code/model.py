@@ -0,0 +1,113 @@
+'''Fish detection model handle
+
+Loading the YOLO saved model takes far longer than inferring a short label directory, so models
+are loaded once per process by `load_model` and shared by every detection run.
+'''
+import hashlib
+from pathlib import Path
+from threading import Lock
+from typing import Dict
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.saved_model import tag_constants # pylint: disable=no-name-in-module
+
+DEFAULT_MODEL_PATH = Path('yolov4-416')
+# Files that identify a saved model.  The variables index holds a checksum of every variable
+IDENTITY_FILES = ('saved_model.pb', 'variables/variables.index')
+# Input size the current weights are designed for
+INPUT_SIZE = 416
+
+
+class YoloModel:
+    """Loaded YOLO saved model and its serving signature
+    """
+    # Handle around a single serving signature
+    # pylint: disable=too-few-public-methods
+    def __init__(self, path: Path, warmup: bool = True) -> None:
+        """Loads the model
+
+        Args:
+            path (Path): Saved model directory
+            warmup (bool, optional): If set, runs one inference so that the first batch does not
+                pay for tracing and allocation.  Defaults to True.
+        """
+        self.path = path
+        self.identity = model_identity(path)
+        # The signature does not keep its model alive
+        self.__model = tf.saved_model.load(path.as_posix(), tags=[tag_constants.SERVING])
+        self.__infer = self.__model.signatures['serving_default']
+        # Signatures that filter boxes by score inside the graph, like the yolov4-416 export,
+        # return a variable number of boxes, flattened across the images of a batch
+        output_spec, = self.__infer.structured_outputs.values()
+        self.filters_in_graph = output_spec.shape[1] is None
+        if warmup:
+            self.infer(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 3), dtype=np.float32))
+
+    def infer(self, batch: np.ndarray) -> tf.Tensor:
+        """Runs inference on a batch of preprocessed images
+
+        Args:
+            batch (np.ndarray): float32 RGB images of `INPUT_SIZE` x `INPUT_SIZE`, scaled to
+                [0, 1], stacked along the first axis
+
+        Returns:
+            tf.Tensor: Boxes and class confidences of each image, with the four box coordinates
+                followed by one confidence per class along the last axis
+        """
+        inference_result = list(self.__infer(tf.constant(batch)).values())
+
+        # `infer` has a single output, holding the boxes and class confidences of every image in
+        # the batch.  Adding assertion to validate this assumption
+        assert len(inference_result) == 1
+        return inference_result[-1]
+
+
+_MODELS: Dict[str, YoloModel] = {}
+_MODELS_LOCK = Lock()
+
+def load_model(path: Path = DEFAULT_MODEL_PATH) -> YoloModel:
+    """Returns the model at the specified path, loading it on first use in this process
+
+    Models are shared by identity, so the model is loaded again if its weights change.
+
+    Args:
+        path (Path, optional): Saved model directory.  Defaults to `DEFAULT_MODEL_PATH`.
+
+    Returns:
+        YoloModel: Shared model
+    """
+    path = path.resolve()
+    identity = model_identity(path)
+    with _MODELS_LOCK:
+        if identity not in _MODELS:
+            _MODELS[identity] = YoloModel(path)
+        return _MODELS[identity]
+
+def model_identity(path: Path) -> str:
+    """Identifies a saved model by its graph and variable checksums
+
+    Args:
+        path (Path): Saved model directory
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name in IDENTITY_FILES:
+        file_path = path.joinpath(name)
+        if file_path.is_file():
+            digest.update(name.encode())
+            digest.update(file_path.read_bytes())
+    return digest.hexdigest()
+
+def is_model_available(path: Path = DEFAULT_MODEL_PATH) -> bool:
+    """Checks whether a saved model exists at the specified path, without loading it
+
+    Args:
+        path (Path, optional): Saved model directory.  Defaults to `DEFAULT_MODEL_PATH`.
+
+    Returns:
+        bool: True if the saved model exists
+    """
+    return path.joinpath('saved_model.pb').is_file()
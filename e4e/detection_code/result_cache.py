@@ -0,0 +1,185 @@
+'''Persistent cache of raw detection model outputs
+
+Outputs are cached per image, keyed by a hash of the image file contents and the identity of the
+model, in a local SQLite database.  Rerunning detection with other thresholds or on directories
+with a few new images then only infers the new images, and re-applies thresholds and non max
+suppression to the cached outputs.
+
+Only candidate boxes with a class confidence of at least the cache's minimum confidence are
+stored, which keeps each image to a few kilobytes.  Score thresholds below the minimum confidence
+cannot be applied to cached outputs.
+'''
+import hashlib
+import io
+import sqlite3
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional
+
+import numpy as np
+
+DEFAULT_MIN_CONFIDENCE = 0.05
+# Offset of the class confidences in the model output, after the box coordinates
+CONFIDENCE_OFFSET = 4
+
+
+@dataclass
+class CachedDetections:
+    """Candidate boxes of a single image
+    """
+    height: int
+    width: int
+    # Box coordinates followed by the class confidences of each candidate box
+    outputs: np.ndarray
+
+
+class DetectionCache:
+    """SQLite cache of candidate boxes per image and model
+
+    Thread safe, so images can be looked up from loader threads.
+    """
+    def __init__(self,
+            path: Path,
+            model_id: str,
+            min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> None:
+        """Opens or creates a detection cache
+
+        Args:
+            path (Path): Database path
+            model_id (str): Identity of the model whose outputs are cached, e.g.
+                `YoloModel.identity`
+            min_confidence (float, optional): Minimum class confidence of the stored candidate
+                boxes.  Defaults to `DEFAULT_MIN_CONFIDENCE`.
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.__model_id = model_id
+        self.min_confidence = min_confidence
+        self.__lock = Lock()
+        self.__connection = sqlite3.connect(path.as_posix(), check_same_thread=False)
+        self.__connection.execute('PRAGMA journal_mode=WAL')
+        self.__connection.execute(
+            'CREATE TABLE IF NOT EXISTS detections ('
+            'model TEXT NOT NULL, '
+            'digest TEXT NOT NULL, '
+            'min_confidence REAL NOT NULL, '
+            'height INTEGER NOT NULL, '
+            'width INTEGER NOT NULL, '
+            'outputs BLOB NOT NULL, '
+            'PRIMARY KEY (model, digest))')
+        self.__connection.commit()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def get(self, digest: str) -> Optional[CachedDetections]:
+        """Looks up the candidate boxes of an image
+
+        Args:
+            digest (str): Image digest from `content_digest`
+
+        Returns:
+            Optional[CachedDetections]: Candidate boxes, or None if not cached with at most this
+                cache's minimum confidence
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                'SELECT height, width, outputs FROM detections '
+                'WHERE model = ? AND digest = ? AND min_confidence <= ?',
+                (self.__model_id, digest, self.min_confidence)).fetchone()
+            if row is None:
+                self.n_misses += 1
+                return None
+            self.n_hits += 1
+        height, width, blob = row
+        outputs = np.load(io.BytesIO(zlib.decompress(blob)), allow_pickle=False)
+        return CachedDetections(height=height, width=width, outputs=outputs)
+
+    def put(self, digest: str, height: int, width: int, outputs: np.ndarray) -> CachedDetections:
+        """Stores the model outputs of an image
+
+        Args:
+            digest (str): Image digest from `content_digest`
+            height (int): Original image height
+            width (int): Original image width
+            outputs (np.ndarray): Model outputs of the image, one row per box
+
+        Returns:
+            CachedDetections: Stored candidate boxes
+        """
+        candidates = select_candidates(outputs, self.min_confidence)
+        buffer = io.BytesIO()
+        np.save(buffer, candidates, allow_pickle=False)
+        with self.__lock:
+            self.__connection.execute(
+                'INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?)',
+                (self.__model_id, digest, self.min_confidence, height, width,
+                 zlib.compress(buffer.getvalue())))
+        return CachedDetections(height=height, width=width, outputs=candidates)
+
+    def commit(self) -> None:
+        """Commits the stored outputs
+        """
+        with self.__lock:
+            self.__connection.commit()
+
+    def close(self) -> None:
+        """Commits and closes the cache
+        """
+        with self.__lock:
+            self.__connection.commit()
+            self.__connection.close()
+
+    def __enter__(self) -> 'DetectionCache':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def content_digest(data: bytes) -> str:
+    """Hashes the contents of an image file
+
+    Args:
+        data (bytes): File contents
+
+    Returns:
+        str: Hex digest
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def select_candidates(outputs: np.ndarray, min_confidence: float) -> np.ndarray:
+    """Selects the boxes with any class confidence of at least the minimum
+
+    Score thresholds at or above the minimum discard every other box before non max suppression,
+    so the candidates give the same detections as the full outputs.
+
+    Args:
+        outputs (np.ndarray): Model outputs of an image, one row per box
+        min_confidence (float): Minimum class confidence
+
+    Returns:
+        np.ndarray: float32 candidate rows
+    """
+    outputs = np.asarray(outputs, dtype=np.float32)
+    keep = outputs[:, CONFIDENCE_OFFSET:].max(axis=1, initial=0.) >= min_confidence
+    return outputs[keep]
+
+def stack_outputs(outputs: List[np.ndarray]) -> np.ndarray:
+    """Stacks per-image candidate boxes into a batch, padding with empty boxes
+
+    Padding boxes have zero confidence, so no positive score threshold keeps them.
+
+    Args:
+        outputs (List[np.ndarray]): Candidate rows of each image
+
+    Returns:
+        np.ndarray: Batch of shape (images, boxes, coordinates and confidences), with at least one
+            box per image
+    """
+    n_boxes = max([1] + [len(rows) for rows in outputs])
+    n_columns = outputs[0].shape[1]
+    batch = np.zeros((len(outputs), n_boxes, n_columns), dtype=np.float32)
+    for idx, rows in enumerate(outputs):
+        batch[idx, :len(rows)] = rows
+    return batch
@@ -1,30 +1,85 @@
 """Fish Finding utility
 """
-from argparse import ArgumentParser
+import shutil
+from argparse import ArgumentParser, Namespace
 from getpass import getpass
 from pathlib import Path
-from typing import List
+from tempfile import TemporaryDirectory
+from typing import List, Optional
 
-import tensorflow as tf
 from smb_unzip.smb_unzip import smb_unzip
 
-from e4e.detection_code.detect_function import detect
+from e4e.detection_code.detect_function import (DEFAULT_BATCH_SIZE, DEFAULT_N_LOADERS,
+                                                DETECT_MODES, detect)
+from e4e.detection_code.model import (DEFAULT_MODEL_PATH, YoloModel, is_model_available,
+                                      load_model)
+from e4e.detection_code.result_cache import DetectionCache
+from e4e.image_codecs import VIEWABLE_EXTENSIONS
 
 
-def find_fish(folder: Path) -> List[Path]:
+def find_fish(
+        folder: Path,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_loaders: int = DEFAULT_N_LOADERS,
+        model: Optional[YoloModel] = None,
+        mode: str = 'presence',
+        cache: Optional[DetectionCache] = None) -> List[Path]:
     """Returns a list of images that most likely have fish in them
 
     Args:
         folder (Path): Directory to find fish in
+        batch_size (int, optional): Number of images per inference call.  Defaults to
+            `DEFAULT_BATCH_SIZE`.
+        n_loaders (int, optional): Number of image loader threads.  Defaults to
+            `DEFAULT_N_LOADERS`.
+        model (Optional[YoloModel], optional): Detection model.  Defaults to the model at
+            `DEFAULT_MODEL_PATH`, loaded once per process.
+        mode (str, optional): Detection mode, one of `DETECT_MODES`.  Defaults to `presence`.
+        cache (Optional[DetectionCache], optional): Cache of the model outputs.  Only images that
+            are not cached are inferred.  Defaults to None.
 
     Returns:
-        List[Path]: List of png files most likely containing fish
+        List[Path]: List of image files most likely containing fish
     """
-    all_images = list(folder.glob('*.png'))
+    # pylint: disable=too-many-arguments
+    all_images = sorted(path for path in folder.iterdir()
+                        if path.suffix.lower() in VIEWABLE_EXTENSIONS)
     return detect(
         images=all_images,
         iou=0.3,
-        score=0.45)
+        score=0.45,
+        batch_size=batch_size,
+        n_loaders=n_loaders,
+        model=model,
+        mode=mode,
+        cache=cache)
+
+def add_inference_arguments(parser: ArgumentParser) -> None:
+    """Adds the model and inference throughput options shared by the fishfinder tools
+
+    Args:
+        parser (ArgumentParser): Parser to add the options to
+    """
+    parser.add_argument('--model_path', type=Path, default=DEFAULT_MODEL_PATH,
+        help='YOLO saved model directory.  Downloaded from the NAS if missing')
+    parser.add_argument('--batch_size', type=int, default=DEFAULT_BATCH_SIZE,
+        help='Number of images per inference call.  Values above 1 are rejected for models that '
+            'filter boxes in their graph')
+    parser.add_argument('--n_loaders', type=int, default=DEFAULT_N_LOADERS,
+        help='Number of threads reading images ahead of inference.  0 reads images in between')
+
+def check_inference_arguments(parser: ArgumentParser, args: Namespace) -> None:
+    """Validates the options added by `add_inference_arguments`, exiting with a usage error
+
+    Args:
+        parser (ArgumentParser): Parser the options were added to
+        args (Namespace): Parsed arguments
+    """
+    if args.batch_size < 1:
+        parser.error('--batch_size must be positive')
+    if args.n_loaders < 0:
+        parser.error('--n_loaders must be non-negative')
 
 def fishfinder_main():
     """Top Level function for fishfinder
@@ -35,41 +90,77 @@ def fishfinder_main():
     parser = ArgumentParser()
     parser.add_argument('input_path')
     parser.add_argument('output_file')
+    add_inference_arguments(parser)
+    parser.add_argument('--mode', choices=DETECT_MODES, default='presence',
+        help='presence thresholds the fish confidences, boxes runs non max suppression and '
+            'counts the fish boxes')
+    parser.add_argument('--cache_path', type=Path, default=None,
+        help='Database of model outputs per image, so reruns only infer new images')
 
     args = parser.parse_args()
+    check_inference_arguments(parser, args)
     input_path = Path(args.input_path)
     output_file = Path(args.output_file)
     if not input_path.is_dir():
         raise RuntimeError()
 
-    fishfinder_loadweights()
+    fishfinder_loadweights(model_path=args.model_path)
 
-    fish_images = find_fish(folder=input_path)
+    model = load_model(args.model_path)
+    cache = None
+    if args.cache_path is not None:
+        cache = DetectionCache(args.cache_path, model.identity)
+    try:
+        fish_images = find_fish(folder=input_path,
+                                batch_size=args.batch_size,
+                                n_loaders=args.n_loaders,
+                                model=model,
+                                mode=args.mode,
+                                cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
 
     with open(output_file, 'w', encoding='ascii') as handle:
         for img in fish_images:
             handle.write(f'{img.relative_to(input_path).as_posix()}\n')
 
 def fishfinder_loadweights(
-        model_path: Path = Path('yolov4-416'),
+        model_path: Path = DEFAULT_MODEL_PATH,
         network_path: str = 'smb://e4e-nas.ucsd.edu/fishsense/yolov4-416.zip'):
-    """Loads the weights from the NAS into the specified path
+    """Loads the weights from the NAS into the specified path, unless already present
+
+    The archive is extracted next to the model path, and its saved model is moved to the model
+    path whatever the archive names it.
 
     Args:
-        path (Path, optional): model weights path. Defaults to Path('yolov4-416').
+        path (Path, optional): model weights path. Defaults to `DEFAULT_MODEL_PATH`.
+
+    Raises:
+        FileExistsError: Model path exists without a saved model
+        RuntimeError: Archive holds no saved model
     """
-    try:
-        tf.saved_model.load(model_path.as_posix())
+    if is_model_available(model_path):
         return
-    except OSError:
-        username = input("E4E NAS Username: ")
-        password = getpass()
+    if model_path.exists():
+        raise FileExistsError(f'{model_path} exists but holds no saved model')
+    username = input("E4E NAS Username: ")
+    password = getpass()
+    model_path.parent.mkdir(parents=True, exist_ok=True)
+    with TemporaryDirectory(dir=model_path.parent) as tmp_dir:
+        # Extracted one level down, so a saved model at the archive root can be moved as well
+        extract_path = Path(tmp_dir).joinpath('archive')
+        extract_path.mkdir()
         smb_unzip(
             network_path=network_path,
-            output_path=model_path.parent,
+            output_path=extract_path,
             username=username,
             password=password
         )
+        saved_model = next(extract_path.glob('**/saved_model.pb'), None)
+        if saved_model is None:
+            raise RuntimeError(f'{network_path} holds no saved model')
+        shutil.move(saved_model.parent.as_posix(), model_path.as_posix())
 
 if __name__ == '__main__':
     fishfinder_main()
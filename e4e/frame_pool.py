@@ -0,0 +1,90 @@
+"""Provides reusable image buffers for extracted frames
+
+RealSense recycles its frame buffers once a frame is released, so every extracted still must be
+copied out before it is handed to a sink.  Rather than allocating a new array per frame, stills are
+copied into buffers leased from a `FramePool`, which sinks return once the still is written.  At
+30 fps of 1280x720 color and depth, this removes several hundred megabytes per second of
+allocation churn.
+"""
+from collections import defaultdict
+from threading import Lock
+from typing import DefaultDict, List, Tuple
+
+import numpy as np
+
+BufferKey = Tuple[Tuple[int, ...], str]
+
+
+class FramePool:
+    """Thread safe pool of image buffers, keyed by shape and dtype
+
+    Buffers are allocated on demand, so leasing never blocks.  A buffer must not be used once it is
+    released, as it is handed to the next frame of the same shape and dtype.  Buffers that are
+    never released are simply garbage collected.
+    """
+    def __init__(self, max_free: int = 32) -> None:
+        """Creates a new frame pool
+
+        Args:
+            max_free (int, optional): Maximum number of free buffers kept per shape and dtype.
+                Further released buffers are discarded.  Defaults to 32.
+        """
+        self.__max_free = max_free
+        self.__free: DefaultDict[BufferKey, List[np.ndarray]] = defaultdict(list)
+        self.__lock = Lock()
+        self.n_allocated = 0
+        self.n_reused = 0
+
+    def acquire(self, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+        """Leases a buffer
+
+        Args:
+            shape (Tuple[int, ...]): Buffer shape
+            dtype (np.dtype): Buffer dtype
+
+        Returns:
+            np.ndarray: Uninitialized buffer
+        """
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self.__lock:
+            free = self.__free[key]
+            if free:
+                self.n_reused += 1
+                return free.pop()
+            self.n_allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def copy(self, data: np.ndarray) -> np.ndarray:
+        """Copies the data into a leased buffer
+
+        Args:
+            data (np.ndarray): Data to copy, e.g. a view of a RealSense frame buffer
+
+        Returns:
+            np.ndarray: Leased buffer holding the data
+        """
+        buffer = self.acquire(data.shape, data.dtype)
+        np.copyto(buffer, data)
+        return buffer
+
+    def release(self, buffer: np.ndarray) -> None:
+        """Returns a leased buffer to the pool
+
+        Args:
+            buffer (np.ndarray): Buffer from `acquire` or `copy`
+        """
+        key = (buffer.shape, buffer.dtype.str)
+        with self.__lock:
+            free = self.__free[key]
+            if len(free) < self.__max_free:
+                free.append(buffer)
+
+    @property
+    def n_free(self) -> int:
+        """Number of free buffers held
+
+        Returns:
+            int: Number of free buffers
+        """
+        with self.__lock:
+            return sum(len(free) for free in self.__free.values())
@@ -0,0 +1,314 @@
+"""Provides sources of composite RealSense frames for extraction
+
+`e4e.align.RealSenseSource` plays back a ROSBAG file.  `SyntheticSource` generates frames with the
+same interface, so the extraction pipeline can be tested and benchmarked without bags or cameras.
+"""
+import math
+import random
+from dataclasses import dataclass
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+
+# Synthetic timestamps start at a plausible device time, in seconds
+SYNTHETIC_EPOCH_S = 1.65e9
+
+
+class FrameSource:
+    """Base class for sources of composite frames
+
+    Frames are read in playback order.  Like RealSense playback, the source restarts from the
+    beginning once it reaches the end, so a decreasing position marks the end of the recording.
+    """
+    def __init__(self, duration_s: float, depth_scale: float, align: Any) -> None:
+        """Creates a new frame source
+
+        Args:
+            duration_s (float): Duration of the recording in seconds
+            depth_scale (float): Depth scale in meters per count
+            align (Any): Object whose `process` method aligns depth to color frames
+        """
+        self.duration_s = duration_s
+        self.depth_scale = depth_scale
+        self.align = align
+
+    @property
+    def position_s(self) -> float:
+        """Playback position of the latest frame
+
+        Returns:
+            float: Position in seconds, referenced to the start of the recording
+        """
+        raise NotImplementedError
+
+    def wait_for_frames(self) -> Any:
+        """Reads the next composite frame
+
+        Returns:
+            Any: Composite frame
+        """
+        raise NotImplementedError
+
+    def seek(self, position_s: float) -> None:
+        """Moves the playback to the specified position
+
+        Args:
+            position_s (float): Position in seconds, referenced to the start of the recording
+        """
+        raise NotImplementedError
+
+    def stop(self) -> None:
+        """Stops the playback
+        """
+
+
+@dataclass
+class SyntheticConfig:
+    """Parameters of a synthetic recording
+    """
+    # One field per benchmark option
+    # pylint: disable=too-many-instance-attributes
+    width: int = 1280
+    height: int = 720
+    fps: float = 30.
+    duration_s: float = 10.
+    jitter_s: float = 0.
+    drop_rate: float = 0.
+    depth_scale: float = 1e-3
+    n_patterns: int = 8
+    seed: int = 0
+
+    @property
+    def n_frames(self) -> int:
+        """Number of composite frames in the recording
+
+        Returns:
+            int: Number of frames
+        """
+        return max(int(self.duration_s * self.fps), 1)
+
+
+class SyntheticFrame:
+    """Synthetic still mimicking `rs.video_frame` and `rs.depth_frame`
+
+    Synthetic frames support no RealSense metadata.
+    """
+    def __init__(self,
+            stream: str,
+            data: np.ndarray,
+            timestamp_s: float,
+            frame_number: int) -> None:
+        """Creates a new synthetic frame
+
+        Args:
+            stream (str): Stream name as reported by RealSense, `color` or `depth`
+            data (np.ndarray): Image
+            timestamp_s (float): Timestamp in seconds
+            frame_number (int): Frame number
+        """
+        self.__profile = SyntheticProfile(stream)
+        self.__data = data
+        self.__timestamp_s = timestamp_s
+        self.__frame_number = frame_number
+
+    def get_data(self) -> np.ndarray:
+        """Image data
+
+        Returns:
+            np.ndarray: Image
+        """
+        return self.__data
+
+    def get_timestamp(self) -> float:
+        """Timestamp, in milliseconds like RealSense
+
+        Returns:
+            float: Timestamp in milliseconds
+        """
+        return self.__timestamp_s * 1e3
+
+    def get_frame_number(self) -> int:
+        """Frame number
+
+        Returns:
+            int: Frame number
+        """
+        return self.__frame_number
+
+    def get_profile(self) -> 'SyntheticProfile':
+        """Stream profile
+
+        Returns:
+            SyntheticProfile: Stream profile
+        """
+        return self.__profile
+
+    def supports_frame_metadata(self, _: Any) -> bool:
+        """Checks for metadata support
+
+        Returns:
+            bool: Always False
+        """
+        return False
+
+
+class SyntheticProfile:
+    """Stream profile of a synthetic frame, mimicking `rs.stream_profile` and `rs.stream`
+    """
+    # Only mimics the part of the RealSense interface used by extraction
+    # pylint: disable=too-few-public-methods
+    def __init__(self, name: str) -> None:
+        """Creates a new stream profile
+
+        Args:
+            name (str): Stream name as reported by RealSense
+        """
+        self.name = name
+
+    def stream_type(self) -> 'SyntheticProfile':
+        """Stream type
+
+        Returns:
+            SyntheticProfile: This profile, whose `name` is the stream name
+        """
+        return self
+
+
+class SyntheticFrameset:
+    """Synthetic composite frame, mimicking `rs.composite_frame`
+    """
+    def __init__(self, color: Optional[SyntheticFrame], depth: Optional[SyntheticFrame]) -> None:
+        """Creates a new composite frame
+
+        Args:
+            color (Optional[SyntheticFrame]): Color frame, or None if dropped
+            depth (Optional[SyntheticFrame]): Depth frame, or None if dropped
+        """
+        self.__color = color
+        self.__depth = depth
+
+    def get_color_frame(self) -> Optional[SyntheticFrame]:
+        """Color frame
+
+        Returns:
+            Optional[SyntheticFrame]: Color frame, or None if dropped
+        """
+        return self.__color
+
+    def get_depth_frame(self) -> Optional[SyntheticFrame]:
+        """Depth frame
+
+        Returns:
+            Optional[SyntheticFrame]: Depth frame, or None if dropped
+        """
+        return self.__depth
+
+
+class IdentityAlign:
+    """Stands in for `rs.align` where frames are generated already aligned
+    """
+    # Only mimics the part of the RealSense interface used by extraction
+    # pylint: disable=too-few-public-methods
+    @staticmethod
+    def process(frames: Any) -> Any:
+        """Returns the frames unchanged
+
+        Args:
+            frames (Any): Composite frame
+
+        Returns:
+            Any: The same composite frame
+        """
+        return frames
+
+
+class SyntheticSource(FrameSource):
+    """Generates aligned color and depth frames at a fixed rate
+
+    Images are drawn from a small pool of precomputed patterns, so generating frames costs next to
+    nothing compared to extraction.  Each stream's timestamps are jittered independently, and each
+    stream's frames are dropped independently at the configured rate.
+    """
+    def __init__(self, config: Optional[SyntheticConfig] = None) -> None:
+        """Creates a new synthetic source
+
+        Args:
+            config (Optional[SyntheticConfig], optional): Recording parameters.  Defaults to
+                `SyntheticConfig()`.
+        """
+        config = config if config is not None else SyntheticConfig()
+        if config.fps <= 0:
+            raise ValueError('fps must be positive')
+        self.__config = config
+        self.__n_frames = config.n_frames
+        super().__init__(duration_s=self.__n_frames / config.fps,
+                         depth_scale=config.depth_scale,
+                         align=IdentityAlign())
+        self.__random = random.Random(config.seed)
+        self.__color_patterns, self.__depth_patterns = make_patterns(config)
+        self.__next_idx = 0
+        self.__position_s = 0.
+
+    @property
+    def n_frames(self) -> int:
+        """Number of composite frames in the recording
+
+        Returns:
+            int: Number of frames
+        """
+        return self.__n_frames
+
+    @property
+    def position_s(self) -> float:
+        return self.__position_s
+
+    def wait_for_frames(self) -> SyntheticFrameset:
+        if self.__next_idx >= self.__n_frames:
+            self.__next_idx = 0
+        idx = self.__next_idx
+        self.__next_idx += 1
+        self.__position_s = idx / self.__config.fps
+        pattern = idx % len(self.__color_patterns)
+        return SyntheticFrameset(
+            color=self.__frame('color', self.__color_patterns[pattern], idx),
+            depth=self.__frame('depth', self.__depth_patterns[pattern], idx))
+
+    def seek(self, position_s: float) -> None:
+        self.__next_idx = min(max(math.ceil(position_s * self.__config.fps), 0), self.__n_frames)
+        self.__position_s = position_s
+
+    def __frame(self, stream: str, data: np.ndarray, idx: int) -> Optional[SyntheticFrame]:
+        if self.__random.random() < self.__config.drop_rate:
+            return None
+        jitter_s = self.__random.uniform(-self.__config.jitter_s, self.__config.jitter_s)
+        return SyntheticFrame(stream=stream,
+                              data=data,
+                              timestamp_s=SYNTHETIC_EPOCH_S + self.__position_s + jitter_s,
+                              frame_number=idx)
+
+
+def make_patterns(config: SyntheticConfig) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """Creates the color and depth images of a synthetic recording
+
+    Images are smooth gradients with mild noise, which compress roughly like underwater footage.
+
+    Args:
+        config (SyntheticConfig): Recording parameters
+
+    Returns:
+        Tuple[List[np.ndarray], List[np.ndarray]]: uint8 color images and uint16 depth images
+    """
+    rng = np.random.default_rng(config.seed)
+    rows = np.linspace(0, 1, config.height, dtype=np.float32)[:, np.newaxis]
+    cols = np.linspace(0, 1, config.width, dtype=np.float32)[np.newaxis, :]
+    color_patterns: List[np.ndarray] = []
+    depth_patterns: List[np.ndarray] = []
+    for idx in range(max(config.n_patterns, 1)):
+        phase = idx / max(config.n_patterns, 1)
+        gradient = (rows + cols + phase) % 1
+        noise = rng.integers(0, 16, (config.height, config.width, 3), dtype=np.uint8)
+        color = (gradient[..., np.newaxis] * np.array([64, 160, 128], dtype=np.float32))
+        color_patterns.append(color.astype(np.uint8) + noise)
+        depth = 500 + 2500 * gradient + rng.integers(0, 32, gradient.shape)
+        depth_patterns.append(depth.astype(np.uint16))
+    return color_patterns, depth_patterns
@@ -0,0 +1,177 @@
+"""Provides a bounded worker pool for frame encoding and writing
+"""
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Optional
+
+from e4e.profiling import NULL_PROFILER, StageProfiler, profiled_call, written_bytes
+
+
+class FrameWriterPool:
+    """Bounded pool of frame writers
+
+    Work is submitted in frame order and completed futures are reaped in the same order, so the
+    first error raised is always the error of the earliest failing frame.  Once `max_pending`
+    writes are in flight, `submit` blocks on the oldest write, which applies backpressure to the
+    frame reader.
+
+    With `n_workers` set to 0, all work is executed synchronously in the calling thread.
+    """
+    def __init__(self,
+            n_workers: int = 0,
+            max_pending: Optional[int] = None,
+            ignore_errors: bool = False,
+            use_processes: bool = False,
+            profiler: StageProfiler = NULL_PROFILER) -> None:
+        """Creates a new frame writer pool
+
+        Args:
+            n_workers (int, optional): Number of workers.  0 writes synchronously.  Defaults to 0.
+            max_pending (Optional[int], optional): Maximum number of in-flight writes.  Defaults to
+                twice the number of workers.
+            ignore_errors (bool, optional): If set, write errors will be ignored.  Defaults to
+                False.
+            use_processes (bool, optional): If set, uses a process pool instead of a thread pool.
+                Defaults to False.
+            profiler (StageProfiler, optional): Profiler to record the wall time and bytes written
+                of each write in, under the name of the write function.  Defaults to
+                `NULL_PROFILER`.
+        """
+        if n_workers < 0:
+            raise ValueError('n_workers must be non-negative')
+        self.__n_workers = n_workers
+        self.__max_pending = max_pending if max_pending is not None else 2 * n_workers
+        if self.__n_workers > 0 and self.__max_pending < 1:
+            raise ValueError('max_pending must be positive')
+        self.__ignore_errors = ignore_errors
+        self.__profiler = profiler
+        self.__executor: Optional[Executor] = None
+        if n_workers > 0:
+            if use_processes:
+                self.__executor = ProcessPoolExecutor(max_workers=n_workers)
+            else:
+                self.__executor = ThreadPoolExecutor(max_workers=n_workers,
+                                                     thread_name_prefix='frame_writer')
+        self.__pending: Deque[Future] = deque()
+        self.errors: List[BaseException] = []
+
+    @property
+    def n_pending(self) -> int:
+        """Number of writes still in flight
+
+        Returns:
+            int: Number of in-flight writes
+        """
+        return len(self.__pending)
+
+    def submit(self,
+            func: Callable[..., Any],
+            *args,
+            on_done: Optional[Callable[[], None]] = None,
+            **kwargs) -> None:
+        """Submits a write to the pool
+
+        Args:
+            func (Callable[..., Any]): Write function.  Must be picklable if using processes.
+            on_done (Optional[Callable[[], None]], optional): Called once the write completed,
+                failed or was cancelled, e.g. to release the frame buffers it reads.  Defaults to
+                None.
+
+        Raises:
+            Exception: The exception of the earliest failed write if errors are not ignored
+        """
+        if self.__profiler.enabled:
+            self.__submit_profiled(func, *args, on_done=on_done, **kwargs)
+            return
+        if self.__executor is None:
+            try:
+                func(*args, **kwargs)
+            except Exception as exc: # pylint: disable=broad-except
+                self.__handle_error(exc)
+            finally:
+                if on_done is not None:
+                    on_done()
+            return
+
+        while len(self.__pending) >= self.__max_pending:
+            self.__reap_oldest()
+        future = self.__executor.submit(func, *args, **kwargs)
+        if on_done is not None:
+            future.add_done_callback(lambda _: on_done())
+        self.__pending.append(future)
+
+    def drain(self) -> None:
+        """Waits for all in-flight writes to complete
+
+        Raises:
+            Exception: The exception of the earliest failed write if errors are not ignored
+        """
+        while self.__pending:
+            self.__reap_oldest()
+
+    def close(self, wait: bool = True) -> None:
+        """Shuts down the pool
+
+        Args:
+            wait (bool, optional): If set, completes in-flight writes first.  Defaults to True.
+        """
+        try:
+            if wait:
+                self.drain()
+        finally:
+            for future in self.__pending:
+                future.cancel()
+            self.__pending.clear()
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=True)
+                self.__executor = None
+
+    def __submit_profiled(
+            self,
+            func: Callable[..., Any],
+            *args,
+            on_done: Optional[Callable[[], None]] = None,
+            **kwargs):
+        name = getattr(func, '__name__', 'write')
+        if self.__executor is None:
+            try:
+                elapsed_s, result = profiled_call(func, *args, **kwargs)
+            except Exception as exc: # pylint: disable=broad-except
+                self.__handle_error(exc)
+                return
+            finally:
+                if on_done is not None:
+                    on_done()
+            self.__profiler.record(name, elapsed_s, written_bytes(result))
+            return
+
+        def record(future: Future):
+            if on_done is not None:
+                on_done()
+            if not future.cancelled() and future.exception() is None:
+                elapsed_s, result = future.result()
+                self.__profiler.record(name, elapsed_s, written_bytes(result))
+
+        while len(self.__pending) >= self.__max_pending:
+            self.__reap_oldest()
+        future = self.__executor.submit(profiled_call, func, *args, **kwargs)
+        future.add_done_callback(record)
+        self.__pending.append(future)
+
+    def __reap_oldest(self):
+        future = self.__pending.popleft()
+        exc = future.exception()
+        if exc is not None:
+            self.__handle_error(exc)
+
+    def __handle_error(self, exc: BaseException):
+        self.errors.append(exc)
+        if not self.__ignore_errors:
+            raise exc
+
+    def __enter__(self) -> 'FrameWriterPool':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # If the reader already failed, don't mask its exception with a write error
+        self.close(wait=exc_type is None)
@@ -0,0 +1,327 @@
+"""Provides a chunked, compressed per-bag frame store
+
+Each bag is stored as a single HDF5 file with one group per stream:
+```
+/Color/image          (N, H, W, 3) uint8, one chunk per frame
+/Color/timestamp      (N,) float64, seconds
+/Color/frame_number   (N,) int64
+/Color/metadata/<key> (N,) one column per metadata item
+/Depth/...
+```
+Frames are buffered in memory and appended in batches, and each frame is its own compressed
+chunk, so any frame can be read back without decompressing its neighbours.
+"""
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import h5py
+import numpy as np
+
+from e4e.depth import DepthImage
+from e4e.sinks import FrameSink, StreamFrame
+
+FORMAT_VERSION = 1
+
+
+class FrameStoreWriter(FrameSink):
+    """Appends frames to a per-bag frame store
+    """
+    def __init__(self,
+            path: Path,
+            batch_size: int = 32,
+            compression: Optional[str] = 'lzf',
+            *,
+            compression_opts: Optional[int] = None,
+            attrs: Optional[Dict[str, Any]] = None,
+            n_frames: Optional[Dict[str, int]] = None) -> None:
+        """Creates a new frame store, replacing any existing store at that path unless continuing it
+
+        Args:
+            path (Path): Frame store path
+            batch_size (int, optional): Number of frames to buffer per stream before appending.
+                Defaults to 32.
+            compression (Optional[str], optional): HDF5 compression filter.  Defaults to 'lzf'.
+            compression_opts (Optional[int], optional): Compression filter options, e.g. the gzip
+                level.  Defaults to None.
+            attrs (Optional[Dict[str, Any]], optional): Store level attributes.  Defaults to None.
+            n_frames (Optional[Dict[str, int]], optional): If set, continues the existing store,
+                keeping this number of frames of each stream and discarding the rest.  Defaults to
+                None.
+
+        Raises:
+            RuntimeError: Unsupported version of the store to continue
+        """
+        # pylint: disable=too-many-arguments
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        if n_frames is None:
+            self.__file = h5py.File(path, 'w')
+        else:
+            self.__file = h5py.File(path, 'a')
+            version = self.__file.attrs.get('format_version', None)
+            if version != FORMAT_VERSION:
+                self.__file.close()
+                raise RuntimeError(f'Unsupported frame store version {version}')
+            truncate_store(self.__file, n_frames)
+        self.__file.attrs['format_version'] = FORMAT_VERSION
+        for key, value in (attrs or {}).items():
+            self.__file.attrs[key] = value
+        self.__batch_size = batch_size
+        self.__compression = compression
+        self.__compression_opts = compression_opts
+        self.__buffers: Dict[str, List[StreamFrame]] = {}
+        self.__timestamps: Dict[str, float] = {}
+
+    def write_frame(self, frame: StreamFrame) -> None:
+        latest = self.__timestamps.get(frame.stream, frame.timestamp_s)
+        self.__timestamps[frame.stream] = max(frame.timestamp_s, latest)
+        buffer = self.__buffers.setdefault(frame.stream, [])
+        buffer.append(frame)
+        if len(buffer) >= self.__batch_size:
+            self.__flush_stream(frame.stream)
+
+    def flush(self) -> None:
+        """Appends all buffered frames to the store
+        """
+        for stream in list(self.__buffers):
+            self.__flush_stream(stream)
+        self.__file.flush()
+
+    def checkpoint(self) -> Dict[str, Any]:
+        self.flush()
+        return {
+            'timestamps': dict(self.__timestamps),
+            'n_frames': {stream: group['image'].shape[0] for stream, group in self.__file.items()}
+        }
+
+    def close(self) -> None:
+        if not self.__file:
+            return
+        try:
+            self.flush()
+        finally:
+            self.__file.close()
+
+    def __flush_stream(self, stream: str):
+        frames = self.__buffers.pop(stream, [])
+        if not frames:
+            return
+        group = self.__file.require_group(stream)
+        if 'image' not in group:
+            self.__create_stream(group, frames[0])
+        start = group['image'].shape[0]
+        end = start + len(frames)
+
+        images = np.stack([frame.image for frame in frames])
+        for frame in frames:
+            frame.release()
+        self.__append(group['image'], images, end)
+        self.__append(group['timestamp'],
+                      np.array([frame.timestamp_s for frame in frames], dtype=np.float64), end)
+        self.__append(group['frame_number'],
+                      np.array([frame.frame_number for frame in frames], dtype=np.int64), end)
+
+        columns = group['metadata']
+        keys = {key for frame in frames for key in frame.metadata}
+        for key in keys:
+            if key not in columns:
+                create_column(columns, key, frames[0].metadata.get(key, 0), start)
+        for key, column in columns.items():
+            values = [frame.metadata.get(key, column.fillvalue) for frame in frames]
+            self.__append(column, np.array(values, dtype=column.dtype), end)
+
+    def __create_stream(self, group: h5py.Group, frame: StreamFrame):
+        shape = frame.image.shape
+        group.create_dataset('image',
+                             shape=(0, *shape),
+                             maxshape=(None, *shape),
+                             chunks=(1, *shape),
+                             dtype=frame.image.dtype,
+                             compression=self.__compression,
+                             compression_opts=self.__compression_opts)
+        group.create_dataset('timestamp', shape=(0,), maxshape=(None,), dtype=np.float64)
+        group.create_dataset('frame_number', shape=(0,), maxshape=(None,), dtype=np.int64)
+        group.create_group('metadata')
+
+    @staticmethod
+    def __append(dataset: h5py.Dataset, data: np.ndarray, end: int):
+        start = dataset.shape[0]
+        dataset.resize(end, axis=0)
+        dataset[start:end] = data
+
+
+def truncate_store(store: h5py.File, n_frames: Dict[str, int]):
+    """Discards the frames of each stream beyond the specified count
+
+    Args:
+        store (h5py.File): Frame store
+        n_frames (Dict[str, int]): Number of frames to keep per stream.  Streams that are not listed
+            are removed.
+    """
+    for stream in list(store.keys()):
+        if stream not in n_frames:
+            del store[stream]
+            continue
+        group = store[stream]
+        datasets = [group['image'], group['timestamp'], group['frame_number'],
+                    *group['metadata'].values()]
+        for dataset in datasets:
+            dataset.resize(min(dataset.shape[0], n_frames[stream]), axis=0)
+
+def create_column(group: h5py.Group, key: str, example: Any, length: int) -> h5py.Dataset:
+    """Creates an extensible metadata column, backfilled to the specified length
+
+    Args:
+        group (h5py.Group): Metadata group
+        key (str): Column name
+        example (Any): Example value, used to select the column type
+        length (int): Number of rows already in the store
+
+    Returns:
+        h5py.Dataset: Column
+    """
+    if isinstance(example, str):
+        dtype = h5py.string_dtype()
+        fillvalue = ''
+    elif isinstance(example, (float, np.floating)):
+        dtype = np.float64
+        fillvalue = np.nan
+    else:
+        dtype = np.int64
+        fillvalue = -1
+    return group.create_dataset(key,
+                                shape=(length,),
+                                maxshape=(None,),
+                                dtype=dtype,
+                                fillvalue=fillvalue)
+
+
+class FrameStoreReader:
+    """Random access reader for a per-bag frame store
+    """
+    def __init__(self, path: Path) -> None:
+        """Opens a frame store for reading
+
+        Args:
+            path (Path): Frame store path
+
+        Raises:
+            RuntimeError: Unsupported frame store version
+        """
+        self.__file = h5py.File(path, 'r')
+        version = self.__file.attrs.get('format_version', None)
+        if version != FORMAT_VERSION:
+            self.__file.close()
+            raise RuntimeError(f'Unsupported frame store version {version}')
+
+    @property
+    def streams(self) -> List[str]:
+        """Streams present in this store
+
+        Returns:
+            List[str]: Stream names
+        """
+        return list(self.__file.keys())
+
+    @property
+    def attrs(self) -> Dict[str, Any]:
+        """Store level attributes
+
+        Returns:
+            Dict[str, Any]: Attributes
+        """
+        return dict(self.__file.attrs)
+
+    def n_frames(self, stream: str) -> int:
+        """Number of frames in the specified stream
+
+        Args:
+            stream (str): Stream name
+
+        Returns:
+            int: Number of frames
+        """
+        return self.__file[stream]['image'].shape[0]
+
+    def timestamps(self, stream: str) -> np.ndarray:
+        """Timestamps of all frames in the specified stream, in storage order
+
+        Args:
+            stream (str): Stream name
+
+        Returns:
+            np.ndarray: Timestamps in seconds
+        """
+        return self.__file[stream]['timestamp'][:]
+
+    def image(self, stream: str, idx: int) -> np.ndarray:
+        """Reads a single image
+
+        Args:
+            stream (str): Stream name
+            idx (int): Frame index
+
+        Returns:
+            np.ndarray: Image
+        """
+        return self.__file[stream]['image'][idx]
+
+    def depth_image(self, idx: int) -> DepthImage:
+        """Reads a single depth image
+
+        Args:
+            idx (int): Depth frame index
+
+        Returns:
+            DepthImage: Depth image, scaled by the store's depth scale if stored as counts
+        """
+        data = self.__file['Depth']['image'][idx]
+        if self.__file.attrs.get('depth_units', 'meters') == 'counts':
+            return DepthImage(data, float(self.__file.attrs['depth_scale']))
+        return DepthImage(data)
+
+    def metadata(self, stream: str, idx: int) -> Dict[str, Any]:
+        """Reads the metadata of a single frame
+
+        Args:
+            stream (str): Stream name
+            idx (int): Frame index
+
+        Returns:
+            Dict[str, Any]: Metadata
+        """
+        metadata: Dict[str, Any] = {}
+        for key, column in self.__file[stream]['metadata'].items():
+            value = column[idx]
+            metadata[key] = value.decode('utf-8') if isinstance(value, bytes) else value.item()
+        return metadata
+
+    def frame(self, stream: str, idx: int) -> StreamFrame:
+        """Reads a single frame
+
+        Args:
+            stream (str): Stream name
+            idx (int): Frame index
+
+        Returns:
+            StreamFrame: Frame
+        """
+        group = self.__file[stream]
+        return StreamFrame(
+            stream=stream,
+            image=group['image'][idx],
+            timestamp_s=float(group['timestamp'][idx]),
+            frame_number=int(group['frame_number'][idx]),
+            metadata=self.metadata(stream, idx)
+        )
+
+    def close(self) -> None:
+        """Closes the store
+        """
+        self.__file.close()
+
+    def __enter__(self) -> 'FrameStoreReader':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,159 @@
+"""Provides the image codecs for extracted RGB stills
+
+Codecs are specified as `name` or `name:level`:
+
+| Codec | Extension | Level |
+|---|---|---|
+| `png` | `.png` | zlib compression, 0 (fastest) to 9.  Defaults to OpenCV's default |
+| `webp` | `.webp` | Lossless without a level, otherwise lossy quality from 1 to 100 |
+| `jpeg` | `.jpg` | Quality from 0 to 100.  Defaults to 95 |
+| `npy` | `.npy` | Raw NumPy array, no level |
+
+Raw stills are the cheapest to write but cannot be opened by labeling tools.  Lossless WebP is
+the smallest lossless option but is several times slower to encode than PNG.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import cv2 as cv
+import numpy as np
+
+CODECS = ('png', 'webp', 'jpeg', 'npy')
+CODEC_EXTENSIONS: Dict[str, str] = {
+    'png': '.png',
+    'webp': '.webp',
+    'jpeg': '.jpg',
+    'npy': '.npy',
+}
+# Extensions of RGB stills, in any codec
+COLOR_EXTENSIONS: Tuple[str, ...] = tuple(CODEC_EXTENSIONS.values())
+# Extensions of stills that image viewers and labeling tools can open
+VIEWABLE_EXTENSIONS: Tuple[str, ...] = ('.png', '.webp', '.jpg')
+LEVEL_RANGES: Dict[str, Tuple[int, int]] = {
+    'png': (0, 9),
+    'webp': (1, 100),
+    'jpeg': (0, 100),
+}
+# OpenCV encodes WebP losslessly for qualities above 100
+WEBP_LOSSLESS_QUALITY = 101
+
+
+@dataclass(frozen=True)
+class ImageCodec:
+    """Image codec and compression level
+    """
+    name: str = 'png'
+    level: Optional[int] = None
+
+    def __post_init__(self):
+        if self.name not in CODECS:
+            raise ValueError(f'Unknown image codec {self.name}')
+        if self.level is None:
+            return
+        if self.name not in LEVEL_RANGES:
+            raise ValueError(f'The {self.name} codec takes no level')
+        low, high = LEVEL_RANGES[self.name]
+        if not low <= self.level <= high:
+            raise ValueError(f'The {self.name} level must be between {low} and {high}')
+
+    @classmethod
+    def parse(cls, spec: str) -> 'ImageCodec':
+        """Parses a `name` or `name:level` codec specification
+
+        Args:
+            spec (str): Codec specification, e.g. `png:1` or `jpeg:90`
+
+        Raises:
+            ValueError: Invalid specification
+
+        Returns:
+            ImageCodec: Codec
+        """
+        name, _, level = spec.strip().lower().partition(':')
+        if name == 'jpg':
+            name = 'jpeg'
+        try:
+            return cls(name=name, level=int(level) if level else None)
+        except ValueError as exc:
+            raise ValueError(f'Invalid image codec {spec}: {exc}') from exc
+
+    @property
+    def extension(self) -> str:
+        """File extension of stills in this codec
+
+        Returns:
+            str: Extension, including the dot
+        """
+        return CODEC_EXTENSIONS[self.name]
+
+    @property
+    def viewable(self) -> bool:
+        """Whether image viewers and labeling tools can open stills in this codec
+
+        Returns:
+            bool: True if viewable
+        """
+        return self.extension in VIEWABLE_EXTENSIONS
+
+    def params(self) -> List[int]:
+        """OpenCV `imwrite` parameters
+
+        Returns:
+            List[int]: Flattened parameter pairs
+        """
+        if self.name == 'png' and self.level is not None:
+            return [cv.IMWRITE_PNG_COMPRESSION, self.level]
+        if self.name == 'webp':
+            return [cv.IMWRITE_WEBP_QUALITY,
+                    self.level if self.level is not None else WEBP_LOSSLESS_QUALITY]
+        if self.name == 'jpeg' and self.level is not None:
+            return [cv.IMWRITE_JPEG_QUALITY, self.level]
+        return []
+
+    def write(self, image: np.ndarray, path: Path) -> int:
+        """Encodes and writes the image
+
+        Args:
+            image (np.ndarray): Image
+            path (Path): Path, with this codec's extension
+
+        Returns:
+            int: Bytes written
+        """
+        if self.name == 'npy':
+            with open(path, 'wb') as handle:
+                np.save(handle, image)
+        elif not cv.imwrite(path.as_posix(), image, self.params()):
+            return 0
+        return path.stat().st_size
+
+
+def is_color_still(path: Path) -> bool:
+    """Checks whether the file is an RGB still in any codec
+
+    Args:
+        path (Path): File path
+
+    Returns:
+        bool: True if the extension is one of `COLOR_EXTENSIONS`
+    """
+    return path.suffix.lower() in COLOR_EXTENSIONS
+
+def read_image(path: Path, flags: int = cv.IMREAD_COLOR) -> Optional[np.ndarray]:
+    """Reads a still in any codec
+
+    Args:
+        path (Path): Still path
+        flags (int, optional): OpenCV `imread` flags, ignored for `.npy` stills.  Defaults to
+            `cv.IMREAD_COLOR`.
+
+    Returns:
+        Optional[np.ndarray]: Image, or None if unreadable
+    """
+    if path.suffix.lower() == '.npy':
+        try:
+            return np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
+    return cv.imread(path.as_posix(), flags)
@@ -0,0 +1,115 @@
+"""Provides space-saving copies of stills into label directories
+"""
+import os
+from pathlib import Path
+from shutil import copyfile
+from tempfile import NamedTemporaryFile
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+LINK_STRATEGIES = ('auto', 'hardlink', 'reflink', 'symlink', 'copy')
+# Strategies tried by `auto`, in order of preference.  Symlinks are never chosen automatically, as
+# they break when the label directory is moved independently of the frame folders.
+AUTO_STRATEGIES = ('hardlink', 'reflink', 'copy')
+# linux/fs.h FICLONE
+FICLONE = 0x40049409
+
+
+def reflink(src: Path, dst: Path):
+    """Creates a copy-on-write clone of the source file
+
+    Args:
+        src (Path): Source file
+        dst (Path): Destination file
+
+    Raises:
+        OSError: Reflinks not supported by the platform or filesystem
+    """
+    if fcntl is None:
+        raise OSError('Reflinks are not supported on this platform')
+    with open(src, 'rb') as src_handle, open(dst, 'wb') as dst_handle:
+        try:
+            fcntl.ioctl(dst_handle.fileno(), FICLONE, src_handle.fileno())
+        except OSError:
+            dst_handle.close()
+            os.remove(dst)
+            raise
+
+def link_file(src: Path, dst: Path, strategy: str = 'copy'):
+    """Places the source file at the destination using the specified strategy
+
+    Existing destinations are replaced rather than written through, so a destination left linked
+    to the source by an earlier run is never copied onto itself.
+
+    Args:
+        src (Path): Source file
+        dst (Path): Destination file
+        strategy (str, optional): One of `hardlink`, `reflink`, `symlink` or `copy`.  Defaults
+            to `copy`.
+
+    Raises:
+        ValueError: Unknown strategy
+    """
+    if strategy not in LINK_STRATEGIES or strategy == 'auto':
+        raise ValueError(f'Unknown link strategy {strategy}')
+    if dst.is_symlink() or dst.exists():
+        dst.unlink()
+    if strategy == 'hardlink':
+        os.link(src, dst)
+    elif strategy == 'reflink':
+        reflink(src, dst)
+    elif strategy == 'symlink':
+        dst.symlink_to(os.path.relpath(src.resolve(), dst.parent.resolve()))
+    else:
+        copyfile(src, dst)
+
+def detect_link_strategy(src_dir: Path, dst_dir: Path) -> str:
+    """Detects the cheapest strategy supported between the two directories
+
+    Args:
+        src_dir (Path): Directory containing the source files
+        dst_dir (Path): Directory in which links will be placed
+
+    Returns:
+        str: First supported strategy of `AUTO_STRATEGIES`
+    """
+    src_dir.mkdir(parents=True, exist_ok=True)
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    with NamedTemporaryFile(dir=src_dir, prefix='.link_probe_') as probe:
+        probe.write(b'probe')
+        probe.flush()
+        src = Path(probe.name)
+        dst = dst_dir.joinpath(src.name)
+        for strategy in AUTO_STRATEGIES:
+            try:
+                link_file(src, dst, strategy)
+            except OSError:
+                continue
+            finally:
+                if dst.exists() or dst.is_symlink():
+                    dst.unlink()
+            return strategy
+    return 'copy'
+
+def resolve_link_strategy(strategy: str, src_dir: Path, dst_dir: Path) -> str:
+    """Resolves `auto` to a concrete strategy
+
+    Args:
+        strategy (str): One of `LINK_STRATEGIES`
+        src_dir (Path): Directory containing the source files
+        dst_dir (Path): Directory in which links will be placed
+
+    Raises:
+        ValueError: Unknown strategy
+
+    Returns:
+        str: Concrete strategy
+    """
+    if strategy not in LINK_STRATEGIES:
+        raise ValueError(f'Unknown link strategy {strategy}')
+    if strategy == 'auto':
+        return detect_link_strategy(src_dir, dst_dir)
+    return strategy
@@ -0,0 +1,212 @@
+"""Provides a consolidated per-bag frame metadata table
+
+All color and depth frame metadata for a bag is kept in a single CSV file, one row per frame:
+```
+Stream,frame_number,frame_timestamp,<metadata columns...>
+color,1234,1650000000.123456789,...
+```
+`Stream` is the stream name as reported by RealSense, `frame_timestamp` is in seconds, and all
+other columns are integers, with -1 denoting metadata that the frame does not support.
+"""
+import csv
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+METADATA_FORMATS = ('files', 'table')
+TABLE_SUFFIX = '_Metadata.csv'
+KEY_COLUMNS = ('Stream', 'frame_number', 'frame_timestamp')
+MISSING_VALUE = -1
+
+
+class MetadataTableWriter:
+    """Accumulates frame metadata in memory and appends it to the table in batches
+    """
+    def __init__(self,
+            path: Path,
+            columns: Sequence[str],
+            batch_size: int = 256,
+            offset: Optional[int] = None) -> None:
+        """Creates a new metadata table, replacing any existing table at that path unless continuing
+        it
+
+        Args:
+            path (Path): Table path
+            columns (Sequence[str]): Metadata columns, in addition to `KEY_COLUMNS`
+            batch_size (int, optional): Number of rows to buffer before appending.  Defaults to
+                256.
+            offset (Optional[int], optional): If set, continues the existing table written with the
+                same columns, discarding everything after this `offset`.  Defaults to None.
+        """
+        self.__columns = list(KEY_COLUMNS) + [col for col in columns if col not in KEY_COLUMNS]
+        self.__batch_size = batch_size
+        self.__rows: List[List[Any]] = []
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if offset is None:
+            self.__handle = open(path, 'w', encoding='utf-8', newline='') # pylint: disable=consider-using-with
+            self.__writer = csv.writer(self.__handle)
+            self.__writer.writerow(self.__columns)
+        else:
+            self.__handle = open(path, 'r+', encoding='utf-8', newline='') # pylint: disable=consider-using-with
+            self.__handle.truncate(offset)
+            self.__handle.seek(offset)
+            self.__writer = csv.writer(self.__handle)
+
+    @property
+    def offset(self) -> int:
+        """End of the rows flushed so far
+
+        Returns:
+            int: Byte offset in the table
+        """
+        return self.__handle.tell()
+
+    def append(self, metadata: Dict[str, Any]) -> None:
+        """Appends a row
+
+        Args:
+            metadata (Dict[str, Any]): Frame metadata.  Must contain `KEY_COLUMNS`.
+        """
+        row: List[Any] = [metadata['Stream'],
+                          metadata['frame_number'],
+                          f"{metadata['frame_timestamp']:.9f}"]
+        row.extend(metadata.get(col, MISSING_VALUE) for col in self.__columns[len(KEY_COLUMNS):])
+        self.__rows.append(row)
+        if len(self.__rows) >= self.__batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Appends all buffered rows to the table
+        """
+        self.__writer.writerows(self.__rows)
+        self.__rows.clear()
+        self.__handle.flush()
+
+    def close(self) -> None:
+        """Flushes and closes the table
+        """
+        if self.__handle.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.__handle.close()
+
+    def __enter__(self) -> 'MetadataTableWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class MetadataTable:
+    """In-memory, column oriented metadata table
+    """
+    def __init__(self, columns: Dict[str, np.ndarray]) -> None:
+        """Creates a new metadata table
+
+        Args:
+            columns (Dict[str, np.ndarray]): Column arrays, all of the same length
+        """
+        self.__columns = columns
+
+    @classmethod
+    def load(cls, path: Path) -> 'MetadataTable':
+        """Loads a metadata table written by `MetadataTableWriter`
+
+        Args:
+            path (Path): Table path
+
+        Returns:
+            MetadataTable: Metadata table
+        """
+        with open(path, 'r', encoding='utf-8', newline='') as handle:
+            reader = csv.reader(handle)
+            header = next(reader)
+            values = list(zip(*reader))
+        if not values:
+            values = [()] * len(header)
+        columns: Dict[str, np.ndarray] = {}
+        for name, column in zip(header, values):
+            if name == 'Stream':
+                columns[name] = np.array(column, dtype=str)
+            elif name == 'frame_timestamp':
+                columns[name] = np.array(column, dtype=np.float64)
+            else:
+                columns[name] = np.array(column, dtype=np.int64)
+        return cls(columns)
+
+    @property
+    def columns(self) -> List[str]:
+        """Column names
+
+        Returns:
+            List[str]: Column names
+        """
+        return list(self.__columns)
+
+    def __len__(self) -> int:
+        return len(self.__columns['frame_timestamp'])
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.__columns[column]
+
+    def row(self, idx: int) -> Dict[str, Any]:
+        """Returns a single row
+
+        Args:
+            idx (int): Row index
+
+        Returns:
+            Dict[str, Any]: Row values, omitting unsupported metadata
+        """
+        return {name: column[idx].item() for name, column in self.__columns.items()
+                if name in KEY_COLUMNS or column[idx] != MISSING_VALUE}
+
+    def select(self, mask: np.ndarray) -> 'MetadataTable':
+        """Selects the rows for which the mask is set
+
+        Args:
+            mask (np.ndarray): Boolean row mask or row indices
+
+        Returns:
+            MetadataTable: Selected rows
+        """
+        return MetadataTable({name: column[mask] for name, column in self.__columns.items()})
+
+    def stream(self, stream: str) -> 'MetadataTable':
+        """Selects the rows of a single stream, sorted by timestamp
+
+        Args:
+            stream (str): Stream name as reported by RealSense
+
+        Returns:
+            MetadataTable: Stream rows
+        """
+        indices = np.flatnonzero(self.__columns['Stream'] == stream)
+        order = np.argsort(self.__columns['frame_timestamp'][indices], kind='stable')
+        return self.select(indices[order])
+
+    def nearest(self, timestamp: float, tolerance: Optional[float] = None) -> Optional[int]:
+        """Finds the row nearest to the specified timestamp
+
+        The table must be sorted by timestamp, e.g. the output of `stream`.
+
+        Args:
+            timestamp (float): Timestamp in seconds
+            tolerance (Optional[float], optional): Maximum permissible difference in seconds.
+                Defaults to None.
+
+        Returns:
+            Optional[int]: Row index, or None if no row is within tolerance
+        """
+        times = self.__columns['frame_timestamp']
+        if len(times) == 0:
+            return None
+        idx = int(np.searchsorted(times, timestamp))
+        candidates = [i for i in (idx - 1, idx) if 0 <= i < len(times)]
+        best = min(candidates, key=lambda i: abs(times[i] - timestamp))
+        if tolerance is not None and abs(times[best] - timestamp) > tolerance:
+            return None
+        return best
@@ -0,0 +1,299 @@
+"""Provides streaming temporal alignment of extracted RGB and depth frames
+
+Frames are paired by timestamp as they are extracted, and only matched frames are written,
+directly into their `frame_XXXXXX` folder and the label directory.
+"""
+from bisect import bisect
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from e4e.frame_writer import FrameWriterPool
+from e4e.image_codecs import ImageCodec
+from e4e.links import link_file, resolve_link_strategy
+from e4e.metadata import MetadataTableWriter
+from e4e.sinks import (FrameSink, StreamFrame, image_name, metadata_name, write_image,
+                       write_metadata)
+
+FramePair = Tuple[StreamFrame, StreamFrame]
+
+
+class StreamMatcher:
+    """Online color/depth frame matcher
+
+    Frames of each stream are held in a small reorder buffer sorted by timestamp.  The oldest depth
+    frame is paired with the oldest color frame once both are within tolerance and neither has a
+    buffered successor closer to the other.  Frames that can no longer be matched are discarded
+    and released.
+    """
+    STREAMS = ('Color', 'Depth')
+
+    def __init__(self, max_permissible_difference_s: float = 0.1, max_pending: int = 8) -> None:
+        """Creates a new stream matcher
+
+        Args:
+            max_permissible_difference_s (float, optional): Maximum temporal misalignment.
+                Defaults to 0.1.
+            max_pending (int, optional): Maximum number of buffered frames per stream before
+                matching decisions are forced.  Defaults to 8.
+        """
+        self.__tolerance = max_permissible_difference_s
+        self.__max_pending = max(max_pending, 2)
+        self.__times: Dict[str, List[float]] = {stream: [] for stream in self.STREAMS}
+        self.__frames: Dict[str, List[StreamFrame]] = {stream: [] for stream in self.STREAMS}
+        self.__horizon: Dict[str, float] = {stream: float('-inf') for stream in self.STREAMS}
+        self.n_dropped = 0
+
+    @property
+    def horizons(self) -> Dict[str, float]:
+        """Timestamp of the latest resolved frame of each stream
+
+        Returns:
+            Dict[str, float]: Timestamps in seconds, for streams with resolved frames
+        """
+        return {stream: horizon for stream, horizon in self.__horizon.items()
+                if horizon != float('-inf')}
+
+    def push(self, frame: StreamFrame) -> List[FramePair]:
+        """Adds a frame
+
+        Args:
+            frame (StreamFrame): Color or depth frame
+
+        Returns:
+            List[FramePair]: Newly matched color and depth frames
+        """
+        times = self.__times[frame.stream]
+        if frame.timestamp_s <= self.__horizon[frame.stream]:
+            # Arrived after a later frame of the same stream was already resolved
+            self.n_dropped += 1
+            frame.release()
+            return []
+        idx = bisect(times, frame.timestamp_s)
+        times.insert(idx, frame.timestamp_s)
+        self.__frames[frame.stream].insert(idx, frame)
+        return self.__match(final=False)
+
+    def flush(self) -> List[FramePair]:
+        """Resolves all buffered frames
+
+        Returns:
+            List[FramePair]: Remaining matched color and depth frames
+        """
+        pairs = self.__match(final=True)
+        for stream in self.STREAMS:
+            while self.__times[stream]:
+                self.__drop(stream)
+        return pairs
+
+    def __pop(self, stream: str) -> StreamFrame:
+        self.__horizon[stream] = self.__times[stream].pop(0)
+        return self.__frames[stream].pop(0)
+
+    def __drop(self, stream: str):
+        self.__pop(stream).release()
+        self.n_dropped += 1
+
+    def __match(self, final: bool) -> List[FramePair]:
+        color, depth = self.__times['Color'], self.__times['Depth']
+        pairs: List[FramePair] = []
+        while color and depth:
+            forced = final or len(color) > self.__max_pending or len(depth) > self.__max_pending
+            difference = abs(color[0] - depth[0])
+            if color[0] < depth[0] - self.__tolerance:
+                self.__drop('Color')
+            elif depth[0] < color[0] - self.__tolerance:
+                self.__drop('Depth')
+            elif len(color) > 1 and abs(color[1] - depth[0]) < difference:
+                self.__drop('Color')
+            elif len(depth) > 1 and abs(depth[1] - color[0]) < difference:
+                self.__drop('Depth')
+            elif (len(color) > 1 and len(depth) > 1) or forced:
+                pairs.append((self.__pop('Color'), self.__pop('Depth')))
+            else:
+                # A closer successor may still arrive
+                break
+        for stream in self.STREAMS:
+            while len(self.__times[stream]) > self.__max_pending:
+                self.__drop(stream)
+        return pairs
+
+
+class PairedFrameSink(FrameSink):
+    """Writes temporally matched frames directly into frame folders
+
+    Each matched pair is written to `output_dir/frame_XXXXXX`, and the color still is also placed in
+    the label directory.  Unmatched frames are never written.
+    """
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self,
+            bag_file: Path,
+            output_dir: Path,
+            label_dir: Path,
+            *,
+            max_permissible_difference_s: float = 0.1,
+            writer: Optional[FrameWriterPool] = None,
+            metadata_table: Optional[MetadataTableWriter] = None,
+            link_strategy: str = 'auto',
+            first_frame_idx: int = 0,
+            color_codec: Optional[ImageCodec] = None,
+            label_codec: Optional[ImageCodec] = None) -> None:
+        """Creates a new paired frame sink
+
+        Args:
+            bag_file (Path): Bag file path, used to name the output files
+            output_dir (Path): Directory in which to place aligned RGB and depth frames
+            label_dir (Path): Directory in which to place a copy of RGB frames for labeling
+            max_permissible_difference_s (float, optional): Maximum temporal misalignment.
+                Defaults to 0.1.
+            writer (Optional[FrameWriterPool], optional): Writer pool to hand frames to.  If None,
+                frames are written synchronously.  Defaults to None.
+            metadata_table (Optional[MetadataTableWriter], optional): Metadata table.  If None,
+                metadata is written to per-frame files.  Defaults to None.
+            link_strategy (str, optional): How color stills are placed in the label directory, one
+                of `LINK_STRATEGIES`.  Defaults to `auto`.
+            first_frame_idx (int, optional): Index of the first frame folder to write, when
+                continuing earlier output.  Defaults to 0.
+            color_codec (Optional[ImageCodec], optional): Codec of the color stills in the frame
+                folders.  Defaults to PNG.
+            label_codec (Optional[ImageCodec], optional): Codec of the color stills in the label
+                directory.  If None, the frame folder still is linked.  Defaults to None.
+        """
+        # pylint: disable=too-many-arguments
+        self.__bag_stem = bag_file.stem
+        self.__output_dir = output_dir
+        self.__label_dir = label_dir
+        self.__writer = writer
+        self.__metadata_table = metadata_table
+        self.__matcher = StreamMatcher(max_permissible_difference_s=max_permissible_difference_s)
+        self.__frame_idx = first_frame_idx
+        self.__label_dir.mkdir(parents=True, exist_ok=True)
+        self.__link_strategy = resolve_link_strategy(link_strategy, output_dir, label_dir)
+        self.__color_codec = color_codec if color_codec is not None else ImageCodec()
+        self.__label_codec = label_codec
+
+    @property
+    def n_pairs(self) -> int:
+        """Number of matched pairs written so far
+
+        Returns:
+            int: Number of frame folders
+        """
+        return self.__frame_idx
+
+    @property
+    def n_dropped(self) -> int:
+        """Number of unmatched frames discarded so far
+
+        Returns:
+            int: Number of discarded frames
+        """
+        return self.__matcher.n_dropped
+
+    def write_frame(self, frame: StreamFrame) -> None:
+        for pair in self.__matcher.push(frame):
+            self.__write_pair(*pair)
+
+    def checkpoint(self) -> Dict[str, Any]:
+        # Frames still awaiting a match are not written, so they are read again on resume
+        if self.__writer is not None:
+            self.__writer.drain()
+        state: Dict[str, Any] = {
+            'timestamps': self.__matcher.horizons,
+            'n_pairs': self.__frame_idx
+        }
+        if self.__metadata_table is not None:
+            self.__metadata_table.flush()
+            state['metadata_offset'] = self.__metadata_table.offset
+        return state
+
+    def close(self) -> None:
+        try:
+            for pair in self.__matcher.flush():
+                self.__write_pair(*pair)
+        finally:
+            if self.__metadata_table is not None:
+                self.__metadata_table.close()
+
+    def __write_pair(self, color: StreamFrame, depth: StreamFrame):
+        frame_folder = self.__output_dir.joinpath(f'frame_{self.__frame_idx:06d}')
+        self.__frame_idx += 1
+        write_metadata_files = self.__metadata_table is None
+        if not write_metadata_files:
+            self.__metadata_table.append(depth.metadata)
+            self.__metadata_table.append(color.metadata)
+        args = (frame_folder, self.__label_dir, self.__bag_stem, color, depth)
+        kwargs = {
+            'write_metadata_files': write_metadata_files,
+            'link_strategy': self.__link_strategy,
+            'color_codec': self.__color_codec,
+            'label_codec': self.__label_codec
+        }
+        def release():
+            color.release()
+            depth.release()
+
+        if self.__writer is None:
+            try:
+                write_pair(*args, **kwargs)
+            finally:
+                release()
+        else:
+            self.__writer.submit(write_pair, *args, on_done=release, **kwargs)
+
+
+def write_pair(
+        frame_folder: Path,
+        label_dir: Path,
+        bag_stem: str,
+        color: StreamFrame,
+        depth: StreamFrame,
+        *,
+        write_metadata_files: bool = True,
+        link_strategy: str = 'copy',
+        color_codec: Optional[ImageCodec] = None,
+        label_codec: Optional[ImageCodec] = None) -> int:
+    """Writes a matched pair of frames into its frame folder and the label directory
+
+    Args:
+        frame_folder (Path): Frame folder
+        label_dir (Path): Label directory
+        bag_stem (str): Bag file name without extension
+        color (StreamFrame): Color frame
+        depth (StreamFrame): Depth frame
+        write_metadata_files (bool, optional): If set, writes per-frame metadata files.  Defaults
+            to True.
+        link_strategy (str, optional): How the color still is placed in the label directory.
+            Must not be `auto`.  Defaults to `copy`.
+        color_codec (Optional[ImageCodec], optional): Codec of the color still in the frame
+            folder.  Defaults to PNG.
+        label_codec (Optional[ImageCodec], optional): Codec of the color still in the label
+            directory.  If None or the same as the color codec, the frame folder still is linked
+            instead of encoded again, except raw stills, which are encoded as PNG.  Defaults to
+            None.
+
+    Returns:
+        int: Bytes written to the frame folder
+    """
+    # pylint: disable=too-many-arguments
+    color_codec = color_codec if color_codec is not None else ImageCodec()
+    frame_folder.mkdir(parents=True, exist_ok=True)
+    n_bytes = write_image(depth.image, frame_folder.joinpath(image_name(bag_stem, depth)))
+
+    color_name = image_name(bag_stem, color, color_codec)
+    color_path = frame_folder.joinpath(color_name)
+    n_bytes += write_image(color.image, color_path, color_codec)
+    if label_codec is None and not color_codec.viewable:
+        # Labeling tools cannot open raw stills
+        label_codec = ImageCodec()
+    if label_codec is None or label_codec == color_codec:
+        link_file(color_path, label_dir.joinpath(color_name), link_strategy)
+    else:
+        label_codec.write(color.image,
+                          label_dir.joinpath(image_name(bag_stem, color, label_codec)))
+
+    if write_metadata_files:
+        n_bytes += write_metadata(frame_folder.joinpath(metadata_name(bag_stem, depth)),
+                                  depth.metadata)
+        n_bytes += write_metadata(frame_folder.joinpath(metadata_name(bag_stem, color)),
+                                  color.metadata)
+    return n_bytes
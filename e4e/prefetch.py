@@ -0,0 +1,61 @@
+"""Provides an ordered, bounded prefetching map
+
+Used to decode and preprocess the next inputs in worker threads while the current ones are
+consumed, e.g. reading images while the detection model runs inference.  OpenCV and NumPy release
+the GIL, so threads decode in parallel.
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Deque, Iterable, Iterator, Optional, TypeVar
+
+Item = TypeVar('Item')
+Result = TypeVar('Result')
+
+
+def prefetch(
+        func: Callable[[Item], Result],
+        items: Iterable[Item],
+        n_workers: int = 4,
+        depth: Optional[int] = None) -> Iterator[Result]:
+    """Maps the function over the items in a thread pool, yielding results in item order
+
+    At most `depth` items are in flight or waiting to be consumed, so memory stays bounded however
+    far the workers get ahead of the consumer.  If a call fails, its exception is raised when its
+    result is reached, and the remaining calls are cancelled.
+
+    Args:
+        func (Callable[[Item], Result]): Function to map
+        items (Iterable[Item]): Items, consumed lazily
+        n_workers (int, optional): Number of worker threads.  0 calls the function in the consuming
+            thread.  Defaults to 4.
+        depth (Optional[int], optional): Maximum number of prefetched items.  Defaults to twice the
+            number of workers.
+
+    Yields:
+        Iterator[Result]: Results, in item order
+    """
+    if n_workers < 0:
+        raise ValueError('n_workers must be non-negative')
+    if n_workers == 0:
+        yield from map(func, items)
+        return
+    depth = depth if depth is not None else 2 * n_workers
+    if depth < 1:
+        raise ValueError('depth must be positive')
+
+    iterator = iter(items)
+    pending: Deque[Future] = deque()
+    with ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix='prefetch') as executor:
+        try:
+            for item in islice(iterator, depth):
+                pending.append(executor.submit(func, item))
+            while pending:
+                result = pending.popleft().result()
+                for item in islice(iterator, 1):
+                    pending.append(executor.submit(func, item))
+                yield result
+        finally:
+            # Consumer stopped early or a call failed
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,215 @@
+"""Provides opt-in per-stage profiling of the extraction pipeline
+
+Each stage records its wall time in a log-spaced histogram, together with the bytes it wrote.
+The summary is a JSON serializable mapping:
+```
+{
+    "n_frames": 1800,
+    "elapsed_s": 93.2,
+    "stages": {
+        "wait_for_frames": {"count": 1800, "total_s": 20.1, "mean_s": 0.011, "p50_s": ...,
+                            "p90_s": ..., "p99_s": ..., "max_s": ..., "n_bytes": 0,
+                            "per_frame_s": 0.011, "histogram": [[bound_s, count], ...]},
+        ...
+    }
+}
+```
+"""
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from threading import Lock
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Tuple
+
+# Upper bounds of the histogram buckets, 1 us to ~17 s in powers of two
+HISTOGRAM_BOUNDS_S = [1e-6 * 2 ** i for i in range(25)]
+PERCENTILES = (50, 90, 99)
+
+
+class StageStats:
+    """Wall time histogram and bytes written of a single stage
+    """
+    def __init__(self) -> None:
+        self.count = 0
+        self.total_s = 0.
+        self.max_s = 0.
+        self.n_bytes = 0
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_S) + 1)
+
+    def add(self, elapsed_s: float, n_bytes: int = 0) -> None:
+        """Adds a single measurement
+
+        Args:
+            elapsed_s (float): Wall time in seconds
+            n_bytes (int, optional): Bytes written.  Defaults to 0.
+        """
+        self.count += 1
+        self.total_s += elapsed_s
+        self.max_s = max(self.max_s, elapsed_s)
+        self.n_bytes += n_bytes
+        self.counts[bisect_left(HISTOGRAM_BOUNDS_S, elapsed_s)] += 1
+
+    def percentile(self, percent: float) -> float:
+        """Estimates a percentile from the histogram
+
+        Args:
+            percent (float): Percentile, 0 to 100
+
+        Returns:
+            float: Upper bound of the bucket containing the percentile, in seconds
+        """
+        if self.count == 0:
+            return 0.
+        rank = percent / 100 * self.count
+        cumulative = 0
+        for idx, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                if idx < len(HISTOGRAM_BOUNDS_S):
+                    return min(HISTOGRAM_BOUNDS_S[idx], self.max_s)
+                break
+        return self.max_s
+
+    def summary(self, n_frames: int = 0) -> Dict[str, Any]:
+        """Summarizes the stage
+
+        Args:
+            n_frames (int, optional): Number of frames processed, to report per frame costs.
+                Defaults to 0.
+
+        Returns:
+            Dict[str, Any]: Stage summary
+        """
+        summary: Dict[str, Any] = {
+            'count': self.count,
+            'total_s': self.total_s,
+            'mean_s': self.total_s / self.count if self.count else 0.,
+            'max_s': self.max_s,
+            'n_bytes': self.n_bytes
+        }
+        for percent in PERCENTILES:
+            summary[f'p{percent}_s'] = self.percentile(percent)
+        if n_frames:
+            summary['per_frame_s'] = self.total_s / n_frames
+            summary['bytes_per_frame'] = self.n_bytes / n_frames
+        bounds = HISTOGRAM_BOUNDS_S + [float('inf')]
+        summary['histogram'] = [[bound, count] for bound, count in zip(bounds, self.counts)
+                                if count]
+        return summary
+
+
+class StageProfiler:
+    """Thread-safe collection of per-stage wall times and bytes written
+
+    A disabled profiler records nothing and its stages cost a single attribute check.
+    """
+    def __init__(self, enabled: bool = True) -> None:
+        """Creates a new profiler
+
+        Args:
+            enabled (bool, optional): If not set, nothing is recorded.  Defaults to True.
+        """
+        self.enabled = enabled
+        self.n_frames = 0
+        self.__stages: Dict[str, StageStats] = {}
+        self.__lock = Lock()
+        self.__start = time.perf_counter()
+
+    def stage(self, name: str) -> ContextManager[None]:
+        """Times the enclosed block
+
+        Args:
+            name (str): Stage name
+
+        Returns:
+            ContextManager[None]: Context manager timing the block
+        """
+        if not self.enabled:
+            return nullcontext()
+        return self.__timed(name)
+
+    def record(self, name: str, elapsed_s: float, n_bytes: int = 0) -> None:
+        """Records a measurement taken elsewhere, e.g. in a writer process
+
+        Args:
+            name (str): Stage name
+            elapsed_s (float): Wall time in seconds
+            n_bytes (int, optional): Bytes written.  Defaults to 0.
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.__stages.setdefault(name, StageStats()).add(elapsed_s, n_bytes)
+
+    def add_frames(self, n_frames: int = 1) -> None:
+        """Counts processed frames
+
+        Args:
+            n_frames (int, optional): Number of frames.  Defaults to 1.
+        """
+        if self.enabled:
+            self.n_frames += n_frames
+
+    def summary(self) -> Dict[str, Any]:
+        """Summarizes all stages
+
+        Returns:
+            Dict[str, Any]: JSON serializable summary
+        """
+        with self.__lock:
+            return {
+                'n_frames': self.n_frames,
+                'elapsed_s': time.perf_counter() - self.__start,
+                'stages': {name: stats.summary(self.n_frames)
+                           for name, stats in self.__stages.items()}
+            }
+
+    @contextmanager
+    def __timed(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+
+NULL_PROFILER = StageProfiler(enabled=False)
+
+
+def profiled_call(func: Callable[..., Any], *args, **kwargs) -> Tuple[float, Any]:
+    """Times a call wherever it is executed, e.g. in a writer process
+
+    Args:
+        func (Callable[..., Any]): Function to time.  Must be picklable to run in a process.
+
+    Returns:
+        Tuple[float, Any]: Elapsed time in seconds and the result of the call
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def written_bytes(result: Any) -> int:
+    """Bytes written according to the result of a write function
+
+    Args:
+        result (Any): Result of the write function
+
+    Returns:
+        int: Bytes written, or 0 if the function does not report them
+    """
+    return result if isinstance(result, int) and not isinstance(result, bool) else 0
+
+
+def stage_names(summary: Dict[str, Any]) -> List[str]:
+    """Stage names of a summary, in decreasing order of total time
+
+    Args:
+        summary (Dict[str, Any]): Profiler summary
+
+    Returns:
+        List[str]: Stage names
+    """
+    stages = summary['stages']
+    return sorted(stages, key=lambda name: stages[name]['total_s'], reverse=True)
@@ -0,0 +1,169 @@
+"""Provides a crash-safe, append-only journal of job progress
+"""
+import json
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional
+
+import yaml
+
+RESULT_EVENT = 'result'
+COPY_EVENT = 'copy'
+
+
+@dataclass
+class JobProgress:
+    """Progress of a single job, folded from its journal records
+    """
+    status: Optional[bool] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    elapsed_s: Optional[float] = None
+
+
+class ProgressJournal:
+    """Append-only job progress journal
+
+    Each record is a single JSON line, appended with one write to an `O_APPEND` descriptor and
+    synced before returning.  A crash can therefore only truncate the last record, which is skipped
+    when the journal is loaded.  Progress files written by earlier versions as a single YAML
+    mapping are converted to a journal when opened.
+    """
+    def __init__(self, path: Path) -> None:
+        """Opens the journal, creating it if necessary
+
+        Args:
+            path (Path): Journal path
+        """
+        self.__path = path
+        self.__lock = Lock()
+        self.jobs: Dict[str, JobProgress] = {}
+        self.n_skipped = 0
+        if path.exists():
+            self.__load()
+        self.__fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if path.stat().st_size > 0:
+            with open(path, 'rb') as handle:
+                handle.seek(-1, os.SEEK_END)
+                if handle.read(1) != b'\n':
+                    # Terminate a torn record so the next record starts on its own line
+                    os.write(self.__fd, b'\n')
+
+    def should_run(self, job: str, max_attempts: int = 1) -> bool:
+        """Checks whether the job still needs to be run
+
+        Args:
+            job (str): Job reference name
+            max_attempts (int, optional): Number of attempts after which failed jobs are no longer
+                retried.  Defaults to 1.
+
+        Returns:
+            bool: True if the job has neither succeeded nor used up its attempts
+        """
+        progress = self.jobs.get(job)
+        if progress is None or progress.status is None:
+            return True
+        return not progress.status and progress.attempts < max_attempts
+
+    def record(self, job: str, event: str, **fields: Any) -> Dict[str, Any]:
+        """Appends a record
+
+        Args:
+            job (str): Job reference name
+            event (str): Record type, e.g. `RESULT_EVENT` or `COPY_EVENT`
+
+        Returns:
+            Dict[str, Any]: Written record
+        """
+        with self.__lock:
+            record = {'job': job, 'event': event, 'time': time.time(), **fields}
+            if event == RESULT_EVENT:
+                record['attempt'] = self.jobs.get(job, JobProgress()).attempts + 1
+            data = (json.dumps(record) + '\n').encode('utf-8')
+            while data:
+                data = data[os.write(self.__fd, data):]
+            os.fsync(self.__fd)
+            self.__apply(record)
+            return record
+
+    def record_result(self,
+            job: str,
+            status: bool,
+            error: Optional[str] = None,
+            **fields: Any) -> Dict[str, Any]:
+        """Appends the result of an attempt of the job
+
+        Args:
+            job (str): Job reference name
+            status (bool): True on success
+            error (Optional[str], optional): Error details.  Defaults to None.
+
+        Returns:
+            Dict[str, Any]: Written record
+        """
+        if error is not None:
+            fields['error'] = error
+        return self.record(job, RESULT_EVENT, status=status, **fields)
+
+    def close(self) -> None:
+        """Closes the journal
+        """
+        if self.__fd is not None:
+            os.close(self.__fd)
+            self.__fd = None
+
+    def __enter__(self) -> 'ProgressJournal':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __apply(self, record: Dict[str, Any]):
+        if record.get('event') != RESULT_EVENT:
+            return
+        progress = self.jobs.setdefault(record['job'], JobProgress())
+        progress.status = bool(record['status'])
+        progress.attempts = record.get('attempt', progress.attempts + 1)
+        progress.error = record.get('error')
+        progress.elapsed_s = record.get('elapsed_s')
+
+    def __load(self):
+        with open(self.__path, 'r', encoding='utf-8') as handle:
+            first = handle.read(1)
+        if first not in ('', '{'):
+            self.__convert_legacy()
+            return
+        for record in self.__read_records():
+            self.__apply(record)
+
+    def __read_records(self) -> Iterator[Dict[str, Any]]:
+        with open(self.__path, 'r', encoding='utf-8') as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn by a crash mid-write
+                    self.n_skipped += 1
+                    continue
+                yield record
+
+    def __convert_legacy(self):
+        with open(self.__path, 'r', encoding='utf-8') as handle:
+            recorded = yaml.safe_load(handle) or {}
+        records = []
+        for job, result in recorded.items():
+            record = {'job': job, 'event': RESULT_EVENT, 'attempt': 1, **result}
+            records.append(record)
+            self.__apply(record)
+        tmp_path = self.__path.with_name(self.__path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            for record in records:
+                handle.write(json.dumps(record) + '\n')
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, self.__path)
@@ -0,0 +1,254 @@
+"""Provides destinations for frames extracted from RealSense ROSBAG files
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import cv2 as cv
+import numpy as np
+
+from e4e.frame_pool import FramePool
+from e4e.frame_writer import FrameWriterPool
+from e4e.image_codecs import ImageCodec
+from e4e.metadata import MetadataTableWriter
+
+EXTENSIONS = {
+    'Color': '.png',
+    'Depth': '.tiff',
+}
+
+@dataclass
+class StreamFrame:
+    """Single extracted still from one RealSense stream
+
+    The image must own its data, as RealSense recycles frame buffers once the frame is released.
+    If the image is leased from a frame pool, the sink calls `release` once the image is written
+    or discarded.
+    """
+    stream: str
+    image: np.ndarray
+    timestamp_s: float
+    frame_number: int
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    pool: Optional[FramePool] = field(default=None, repr=False, compare=False)
+
+    def release(self) -> None:
+        """Returns the image to its frame pool, if any.  The image must not be used afterwards
+        """
+        if self.pool is not None:
+            self.pool.release(self.image)
+            self.pool = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Copies sent to writer processes own their image
+        state = dict(self.__dict__)
+        state['pool'] = None
+        return state
+
+
+class FrameSink:
+    """Base class for frame destinations
+    """
+    def write_frame(self, frame: StreamFrame) -> None:
+        """Writes a single frame
+
+        Args:
+            frame (StreamFrame): Frame to write
+        """
+        raise NotImplementedError
+
+    def checkpoint(self) -> Dict[str, Any]:
+        """Completes all writes so far and returns the state needed to continue the output
+
+        Returns:
+            Dict[str, Any]: JSON serializable state.  `timestamps` maps each stream to the
+                timestamp of its latest written frame.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Flushes and closes the sink
+        """
+
+    def __enter__(self) -> 'FrameSink':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FileFrameSink(FrameSink):
+    """Writes each frame as an image file and a metadata text file
+
+    Files are named by `image_name` and `metadata_name`.  If a metadata table is provided,
+    metadata is appended to the table instead of per-frame files.
+    """
+    def __init__(self,
+            bag_file: Path,
+            output_dir: Path,
+            writer: Optional[FrameWriterPool] = None,
+            metadata_table: Optional[MetadataTableWriter] = None,
+            color_codec: Optional[ImageCodec] = None) -> None:
+        """Creates a new file sink
+
+        Args:
+            bag_file (Path): Bag file path, used to name the output files
+            output_dir (Path): Output directory
+            writer (Optional[FrameWriterPool], optional): Writer pool to hand frames to.  If None,
+                frames are written synchronously.  Defaults to None.
+            metadata_table (Optional[MetadataTableWriter], optional): Metadata table.  If None,
+                metadata is written to per-frame files.  Defaults to None.
+            color_codec (Optional[ImageCodec], optional): Codec of the color stills.  Defaults to
+                PNG.
+        """
+        # pylint: disable=too-many-arguments
+        self.__bag_file = bag_file
+        self.__output_dir = output_dir
+        self.__writer = writer
+        self.__metadata_table = metadata_table
+        self.__color_codec = color_codec if color_codec is not None else ImageCodec()
+        self.__timestamps: Dict[str, float] = {}
+
+    def image_path(self, frame: StreamFrame) -> Path:
+        """Path of the image file for the specified frame
+
+        Args:
+            frame (StreamFrame): Frame
+
+        Returns:
+            Path: Image path
+        """
+        return self.__output_dir.joinpath(image_name(self.__bag_file.stem, frame,
+                                                     self.__codec(frame)))
+
+    def metadata_path(self, frame: StreamFrame) -> Path:
+        """Path of the metadata file for the specified frame
+
+        Args:
+            frame (StreamFrame): Frame
+
+        Returns:
+            Path: Metadata path
+        """
+        return self.__output_dir.joinpath(metadata_name(self.__bag_file.stem, frame))
+
+    def write_frame(self, frame: StreamFrame) -> None:
+        latest = self.__timestamps.get(frame.stream, frame.timestamp_s)
+        self.__timestamps[frame.stream] = max(frame.timestamp_s, latest)
+        if self.__metadata_table is None:
+            func = write_data
+            args = (frame.image, self.image_path(frame), self.metadata_path(frame),
+                    frame.metadata, self.__codec(frame))
+        else:
+            self.__metadata_table.append(frame.metadata)
+            func = write_image
+            args = (frame.image, self.image_path(frame), self.__codec(frame))
+        if self.__writer is None:
+            try:
+                func(*args)
+            finally:
+                frame.release()
+        else:
+            self.__writer.submit(func, *args, on_done=frame.release)
+
+    def checkpoint(self) -> Dict[str, Any]:
+        if self.__writer is not None:
+            self.__writer.drain()
+        state: Dict[str, Any] = {'timestamps': dict(self.__timestamps)}
+        if self.__metadata_table is not None:
+            self.__metadata_table.flush()
+            state['metadata_offset'] = self.__metadata_table.offset
+        return state
+
+    def close(self) -> None:
+        if self.__metadata_table is not None:
+            self.__metadata_table.close()
+
+    def __codec(self, frame: StreamFrame) -> Optional[ImageCodec]:
+        return self.__color_codec if frame.stream == 'Color' else None
+
+
+def image_name(bag_stem: str, frame: StreamFrame, codec: Optional[ImageCodec] = None) -> str:
+    """Name of the image file for the specified frame
+
+    Args:
+        bag_stem (str): Bag file name without extension
+        frame (StreamFrame): Frame
+        codec (Optional[ImageCodec], optional): Codec of the image.  Defaults to the stream's
+            entry in `EXTENSIONS`.
+
+    Returns:
+        str: `{bag}_{stream}_t{timestamp}` image file name
+    """
+    extension = codec.extension if codec is not None else EXTENSIONS[frame.stream]
+    return f'{bag_stem}_{frame.stream}_t{frame.timestamp_s:.9f}{extension}'
+
+def metadata_name(bag_stem: str, frame: StreamFrame) -> str:
+    """Name of the metadata file for the specified frame
+
+    Args:
+        bag_stem (str): Bag file name without extension
+        frame (StreamFrame): Frame
+
+    Returns:
+        str: `{bag}_{stream}_Metadata_t{timestamp}` metadata file name
+    """
+    return f'{bag_stem}_{frame.stream}_Metadata_t{frame.timestamp_s:.9f}.txt'
+
+def write_image(
+        image_data: np.ndarray,
+        img_fname: Path,
+        codec: Optional[ImageCodec] = None) -> int:
+    """Writes the image to the specified filename
+
+    Args:
+        image_data (np.ndarray): Image Data
+        img_fname (Path): Path to image
+        codec (Optional[ImageCodec], optional): Codec to encode with.  Defaults to OpenCV's
+            defaults for the file extension.
+
+    Returns:
+        int: Bytes written
+    """
+    if codec is not None:
+        return codec.write(image_data, img_fname)
+    if not cv.imwrite(img_fname.as_posix(), image_data):
+        return 0
+    return img_fname.stat().st_size
+
+def write_data(
+        image_data: np.ndarray,
+        img_fname: Path,
+        mtd_fname: Path,
+        metadata: Dict[str, Any],
+        codec: Optional[ImageCodec] = None) -> int:
+    """Writes the RealSense metadata to the specified filename
+
+    Args:
+        image_data (np.ndarray): Image Data
+        img_fname (Path): Path to image
+        mtd_fname (Path): Path to metadata
+        metadata (Dict[str, Any]): Metadata
+        codec (Optional[ImageCodec], optional): Codec to encode the image with.  Defaults to
+            OpenCV's defaults for the file extension.
+
+    Returns:
+        int: Bytes written
+    """
+    return write_image(image_data, img_fname, codec) + write_metadata(mtd_fname, metadata)
+
+def write_metadata(mtd_fname: Path, metadata: Dict[str, Any]) -> int:
+    """Writes the RealSense metadata to the specified filename
+
+    Args:
+        mtd_fname (Path): Path to metadata
+        metadata (Dict[str, Any]): Metadata
+
+    Returns:
+        int: Bytes written
+    """
+    n_bytes = 0
+    with open(mtd_fname, 'w', encoding='utf-8') as mtd_file:
+        for key, value in metadata.items():
+            n_bytes += mtd_file.write(f'{key}: {value}\n')
+    return n_bytes
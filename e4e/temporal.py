@@ -0,0 +1,124 @@
+"""Provides temporal matching of extracted RGB and depth stills
+"""
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+FRAME_FILE_PATTERN = re.compile(r'_(Color|Depth)(?:_Metadata)?_t([0-9]+(?:\.[0-9]+)?)\.[^.]+$')
+
+
+@dataclass
+class StreamFiles:
+    """Extracted files of a single stream, sorted by timestamp
+    """
+    timestamps: np.ndarray
+    files: List[List[Path]]
+
+
+@dataclass
+class FramePair:
+    """Temporally matched color and depth files
+    """
+    color_timestamp: float
+    depth_timestamp: float
+    color_files: List[Path]
+    depth_files: List[Path]
+
+
+def scan_frame_files(input_dir: Path) -> Dict[str, StreamFiles]:
+    """Scans the directory once for extracted stills and metadata files
+
+    Files are grouped by stream and by the timestamp in their name, so a still and its metadata
+    file are kept together without reconstructing either name.
+
+    Args:
+        input_dir (Path): Directory containing RGB and depth stills
+
+    Returns:
+        Dict[str, StreamFiles]: `Color` and `Depth` stream files
+    """
+    groups: Dict[str, Dict[str, List[Path]]] = {'Color': {}, 'Depth': {}}
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            match = FRAME_FILE_PATTERN.search(entry.name)
+            if match is None or not entry.is_file():
+                continue
+            stream, timestamp = match.groups()
+            groups[stream].setdefault(timestamp, []).append(Path(entry.path))
+
+    streams: Dict[str, StreamFiles] = {}
+    for stream, files in groups.items():
+        keys = list(files)
+        timestamps = np.array(keys, dtype=np.float64)
+        order = np.argsort(timestamps, kind='stable')
+        streams[stream] = StreamFiles(
+            timestamps=timestamps[order],
+            files=[sorted(files[keys[idx]]) for idx in order]
+        )
+    return streams
+
+def match_timestamps(
+        color_times: np.ndarray,
+        depth_times: np.ndarray,
+        max_permissible_difference_s: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs each depth timestamp with its nearest color timestamp
+
+    Each color timestamp is used at most once, by the nearest depth timestamp.
+
+    Args:
+        color_times (np.ndarray): Sorted color timestamps
+        depth_times (np.ndarray): Sorted depth timestamps
+        max_permissible_difference_s (float): Maximum temporal misalignment
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Color and depth indices of each pair, in time order
+    """
+    if len(color_times) == 0 or len(depth_times) == 0:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    right = np.searchsorted(color_times, depth_times)
+    left = np.clip(right - 1, 0, len(color_times) - 1)
+    right = np.clip(right, 0, len(color_times) - 1)
+    left_diff = np.abs(color_times[left] - depth_times)
+    right_diff = np.abs(color_times[right] - depth_times)
+    nearest = np.where(right_diff < left_diff, right, left)
+    diff = np.minimum(left_diff, right_diff)
+
+    depth_idx = np.flatnonzero(diff <= max_permissible_difference_s)
+    color_idx = nearest[depth_idx]
+
+    # Resolve depth frames competing for the same color frame in favor of the closest
+    order = np.lexsort((diff[depth_idx], color_idx))
+    _, first = np.unique(color_idx[order], return_index=True)
+    keep = np.sort(order[first])
+    return color_idx[keep], depth_idx[keep]
+
+def pair_frame_files(
+        input_dir: Path,
+        max_permissible_difference_s: float = 0.1) -> List[FramePair]:
+    """Pairs the extracted color and depth stills in the specified directory
+
+    Args:
+        input_dir (Path): Directory containing RGB and depth stills
+        max_permissible_difference_s (float, optional): Maximum temporal misalignment.
+            Defaults to 0.1.
+
+    Returns:
+        List[FramePair]: Matched frames, in time order
+    """
+    streams = scan_frame_files(input_dir)
+    color, depth = streams['Color'], streams['Depth']
+    color_idx, depth_idx = match_timestamps(
+        color_times=color.timestamps,
+        depth_times=depth.timestamps,
+        max_permissible_difference_s=max_permissible_difference_s
+    )
+    return [FramePair(
+                color_timestamp=float(color.timestamps[c_idx]),
+                depth_timestamp=float(depth.timestamps[d_idx]),
+                color_files=color.files[c_idx],
+                depth_files=depth.files[d_idx])
+            for c_idx, d_idx in zip(color_idx, depth_idx)]
@@ -1,8 +1,21 @@
 """ Provides timerange support
 """
 import datetime as dt
+import re
+from bisect import bisect_left
 from pathlib import Path
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+TIMERANGE_SUFFIX = '.times.txt'
+CLOCK_PATTERN = re.compile(r'^(?:(\d+):)?(\d{1,2}):(\d{1,2}(?:\.\d*)?)$')
+DURATION_PATTERN = re.compile(
+    r'^P(?:(\d+(?:\.\d+)?)D)?'
+    r'(?:T(?:(\d+(?:\.\d+)?)H)?(?:(\d+(?:\.\d+)?)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+SECONDS_PATTERN = re.compile(r'^\d+(?:\.\d*)?$')
+RANGE_SEPARATORS = ('/', '-')
+
 
 def read_timeranges(fname: Path) -> List[Tuple[dt.timedelta, dt.timedelta]]:
     """Reads a list of time ranges from file
@@ -14,9 +27,10 @@ def read_timeranges(fname: Path) -> List[Tuple[dt.timedelta, dt.timedelta]]:
     For example, the following denotes 2 time ranges.
     ```
     01:23:45.678-12:34:56.789
-    23:45:67.890-34:56:78.901
+    23:45:57.890-34:56:58.901
     ```
 
+    See `parse_timeranges` for the other accepted timestamp formats.
 
     Args:
         fname (Path): File Path
@@ -24,33 +38,229 @@ def read_timeranges(fname: Path) -> List[Tuple[dt.timedelta, dt.timedelta]]:
     Returns:
         List[Tuple[timedelta, timedelta]]: List of time ranges
     """
-    origin = dt.datetime(1900, 1, 1)
-    time_ranges: List[Tuple[dt.timedelta, dt.timedelta]] = []
     with open(fname, 'r', encoding='utf-8') as handle:
-        for line in handle:
-            if line == '':
-                continue
-            parts = line.strip().split('-')
-            if len(parts) != 2:
-                raise RuntimeError("Missing parts")
-            start = dt.datetime.strptime(parts[0] + '000', '%H:%M:%S.%f') - origin
-            end = dt.datetime.strptime(parts[1] + '000', '%H:%M:%S.%f') - origin
-            time_ranges.append((start, end))
+        return [(dt.timedelta(seconds=start), dt.timedelta(seconds=end))
+                for start, end in parse_timeranges(handle, source=str(fname))]
+
+def load_timeranges(fname: Path) -> 'TimeRangeSet':
+    """Reads a time ranges file directly into a compiled time range set
+
+    Args:
+        fname (Path): File Path
+
+    Returns:
+        TimeRangeSet: Time ranges
+    """
+    with open(fname, 'r', encoding='utf-8') as handle:
+        return TimeRangeSet(parse_timeranges(handle, source=str(fname)))
+
+def load_deployment_timeranges(deployment_root: Path) -> Dict[Path, 'TimeRangeSet']:
+    """Loads the time ranges of every bag under a deployment
+
+    Args:
+        deployment_root (Path): Deployment root directory
+
+    Returns:
+        Dict[Path, TimeRangeSet]: Time ranges keyed by the resolved bag file path, e.g.
+            `160.bag` for `160.bag.times.txt`
+    """
+    time_ranges: Dict[Path, TimeRangeSet] = {}
+    for fname in sorted(deployment_root.glob(f'**/*{TIMERANGE_SUFFIX}')):
+        bag_file = fname.with_name(fname.name[:-len(TIMERANGE_SUFFIX)])
+        time_ranges[bag_file.resolve()] = load_timeranges(fname)
     return time_ranges
 
+def parse_timeranges(
+        lines: Iterable[str],
+        source: str = '<string>') -> Iterator[Tuple[float, float]]:
+    """Parses time ranges, one per line
+
+    Each range is a start and end timestamp separated by `-` or `/`.  Timestamps may be
+    `hh:mm:ss[.sss]`, `mm:ss[.sss]`, ISO 8601 durations such as `PT1H2M3.5S`, or plain seconds.
+    Blank lines and lines starting with `#` are ignored.
+
+    Args:
+        lines (Iterable[str]): Lines to parse
+        source (str, optional): Source name for error messages.  Defaults to '<string>'.
+
+    Raises:
+        RuntimeError: Malformed line, reported with its line number
+
+    Yields:
+        Iterator[Tuple[float, float]]: (start, end) ranges in seconds
+    """
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = split_timerange(line)
+        if parts is None:
+            raise RuntimeError(f'{source}:{line_number}: Expected two timestamps in "{line}"')
+        try:
+            start, end = parse_timestamp(parts[0]), parse_timestamp(parts[1])
+        except ValueError as exc:
+            raise RuntimeError(f'{source}:{line_number}: {exc}') from exc
+        if end < start:
+            raise RuntimeError(f'{source}:{line_number}: Range ends before it starts')
+        yield start, end
+
+def split_timerange(line: str) -> Optional[Tuple[str, str]]:
+    """Splits a time range into its start and end timestamps
+
+    Args:
+        line (str): Stripped time range
+
+    Returns:
+        Optional[Tuple[str, str]]: Start and end, or None if the line is not a range
+    """
+    for separator in RANGE_SEPARATORS:
+        parts = line.split(separator)
+        if len(parts) == 2:
+            return parts[0].strip(), parts[1].strip()
+    return None
+
+def parse_timestamp(timestamp: str) -> float:
+    """Parses a single timestamp
+
+    Args:
+        timestamp (str): `hh:mm:ss[.sss]`, `mm:ss[.sss]`, ISO 8601 duration or seconds
+
+    Raises:
+        ValueError: Malformed timestamp
+
+    Returns:
+        float: Seconds
+    """
+    match = CLOCK_PATTERN.match(timestamp)
+    if match is not None:
+        hours, minutes, seconds = match.groups()
+        if int(minutes) >= 60 or float(seconds) >= 60:
+            raise ValueError(f'Timestamp out of range "{timestamp}"')
+        return int(hours or 0) * 3600 + int(minutes) * 60 + float(seconds)
+    match = DURATION_PATTERN.match(timestamp)
+    if match is not None and timestamp not in ('P', 'PT'):
+        days, hours, minutes, seconds = (float(group or 0) for group in match.groups())
+        return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+    if SECONDS_PATTERN.match(timestamp):
+        return float(timestamp)
+    raise ValueError(f'Unrecognized timestamp "{timestamp}"')
+
+
+class TimeRangeSet:
+    """Compiled set of time ranges
+
+    Ranges are open intervals in seconds, sorted and with overlapping ranges merged, so membership
+    is a single bisection.
+    """
+    def __init__(self,
+            time_ranges: Iterable[Tuple[Union[dt.timedelta, float], Union[dt.timedelta, float]]]
+            ) -> None:
+        """Compiles the time ranges
+
+        Args:
+            time_ranges (Iterable[Tuple[Union[dt.timedelta, float], Union[dt.timedelta, float]]]):
+                (start, end) ranges, as timedeltas or seconds
+        """
+        intervals = sorted((to_seconds(start), to_seconds(end)) for start, end in time_ranges)
+        starts: List[float] = []
+        ends: List[float] = []
+        for start, end in intervals:
+            if end <= start:
+                continue
+            if ends and start < ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self.__starts = starts
+        self.__ends = ends
+        self.__start_array = np.array(starts, dtype=np.float64)
+        self.__end_array = np.array(ends, dtype=np.float64)
+
+    @property
+    def intervals(self) -> List[Tuple[float, float]]:
+        """Sorted, disjoint (start, end) ranges in seconds
+
+        Returns:
+            List[Tuple[float, float]]: Ranges
+        """
+        return list(zip(self.__starts, self.__ends))
+
+    @property
+    def total_seconds(self) -> float:
+        """Total duration covered by the ranges
+
+        Returns:
+            float: Duration in seconds
+        """
+        return float(np.sum(self.__end_array - self.__start_array))
+
+    def __len__(self) -> int:
+        return len(self.__starts)
 
-def in_timeranges(timestamp: float, time_ranges: List[Tuple[dt.timedelta, dt.timedelta]]) -> bool:
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        return iter(self.intervals)
+
+    def __contains__(self, timestamp: float) -> bool:
+        idx = bisect_left(self.__starts, timestamp) - 1
+        return idx >= 0 and timestamp < self.__ends[idx]
+
+    def mask(self, timestamps: np.ndarray) -> np.ndarray:
+        """Evaluates membership of an array of timestamps
+
+        Args:
+            timestamps (np.ndarray): Timestamps in seconds
+
+        Returns:
+            np.ndarray: Boolean mask, True where the timestamp is in a range
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        if len(self.__starts) == 0:
+            return np.zeros(timestamps.shape, dtype=bool)
+        idx = np.searchsorted(self.__start_array, timestamps, side='left') - 1
+        return (idx >= 0) & (timestamps < self.__end_array[np.maximum(idx, 0)])
+
+    def clip(self, start: float, end: float) -> 'TimeRangeSet':
+        """Restricts the ranges to the specified interval
+
+        Args:
+            start (float): Start in seconds
+            end (float): End in seconds
+
+        Returns:
+            TimeRangeSet: Clipped ranges
+        """
+        return TimeRangeSet((max(r_start, start), min(r_end, end))
+                            for r_start, r_end in self.intervals)
+
+
+def to_seconds(value: Union[dt.timedelta, float]) -> float:
+    """Converts a time offset to seconds
+
+    Args:
+        value (Union[dt.timedelta, float]): Timedelta or seconds
+
+    Returns:
+        float: Seconds
+    """
+    if isinstance(value, dt.timedelta):
+        return value.total_seconds()
+    return float(value)
+
+def in_timeranges(
+        timestamp: float,
+        time_ranges: Union[TimeRangeSet, List[Tuple[dt.timedelta, dt.timedelta]]]) -> bool:
     """Evaluates whether the specified time is in the specified range
 
+    For repeated lookups, compile the ranges once into a `TimeRangeSet`.
+
     Args:
-        t (float): time
-        ranges (List[Tuple[dt.timedelta, dt.timedelta]]): timerange
+        timestamp (float): time
+        time_ranges (Union[TimeRangeSet, List[Tuple[dt.timedelta, dt.timedelta]]]): timerange
 
     Returns:
         bool: True if time is in timerange, otherwise false
     """
-    tranges = [(trange[0].total_seconds(), trange[1].total_seconds()) for trange in time_ranges]
-    for time_range in tranges:
-        if time_range[0] < timestamp < time_range[1]:
-            return True
-    return False
+    if not isinstance(time_ranges, TimeRangeSet):
+        time_ranges = TimeRangeSet(time_ranges)
+    return timestamp in time_ranges
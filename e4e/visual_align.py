@@ -11,6 +11,8 @@ import yaml
 from matplotlib.backend_bases import PickEvent
 from tqdm import tqdm
 
+from e4e.image_codecs import is_color_still, read_image
+
 
 class Aligner:
     """Alignment tool
@@ -89,14 +91,14 @@ def visual_align_run():
         for frame_dir in frame_dirs:
             if frame_dir.as_posix() in frame_data:
                 continue
-            rgb_paths = list(frame_dir.glob('*.png'))
+            rgb_paths = [path for path in frame_dir.iterdir() if is_color_still(path)]
             depth_paths = list(frame_dir.glob('*.tiff'))
             if len(rgb_paths) != 1:
                 continue
             if len(depth_paths) != 1:
                 continue
 
-            rgb_img = cv.imread(rgb_paths[0].as_posix())
+            rgb_img = read_image(rgb_paths[0])
             depth_img = cv.imread(depth_paths[0].as_posix(), -1)
 
             points = Aligner(rgb_img, depth_img).run()
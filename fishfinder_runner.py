@@ -6,11 +6,15 @@ import argparse
 from dataclasses import dataclass
 from enum import IntEnum, auto
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 import appdirs
 import yaml
 
-from e4e.fishfinder import find_fish, fishfinder_loadweights
+from e4e.detection_code.detect_function import DEFAULT_BATCH_SIZE, DEFAULT_N_LOADERS
+from e4e.detection_code.model import YoloModel, load_model
+from e4e.detection_code.result_cache import DetectionCache
+from e4e.fishfinder import (add_inference_arguments, check_inference_arguments, find_fish,
+                            fishfinder_loadweights)
 
 
 class JobStatus(IntEnum):
@@ -65,10 +69,29 @@ class Job:
             'status': self.status.value,
         }
 
-    def process(self) -> None:
+    def process(
+            self,
+            batch_size: int = DEFAULT_BATCH_SIZE,
+            n_loaders: int = DEFAULT_N_LOADERS,
+            model: Optional[YoloModel] = None,
+            cache: Optional[DetectionCache] = None) -> None:
         """Executes this job
+
+        Args:
+            batch_size (int, optional): Number of images per inference call.  Defaults to
+                `DEFAULT_BATCH_SIZE`.
+            n_loaders (int, optional): Number of image loader threads.  Defaults to
+                `DEFAULT_N_LOADERS`.
+            model (Optional[YoloModel], optional): Detection model.  Defaults to the shared model
+                at `DEFAULT_MODEL_PATH`.
+            cache (Optional[DetectionCache], optional): Cache of the model outputs.  Defaults to
+                None.
         """
-        fish_images = find_fish(folder=self.path)
+        fish_images = find_fish(folder=self.path,
+                                batch_size=batch_size,
+                                n_loaders=n_loaders,
+                                model=model,
+                                cache=cache)
         with open(self.output, 'w', encoding='ascii') as handle:
             for img in fish_images:
                 handle.write(f'{img.relative_to(self.path).as_posix()}\n')
@@ -78,8 +101,15 @@ def main():
     """
     parser = argparse.ArgumentParser()
     parser.add_argument('data_dir', type=Path)
+    add_inference_arguments(parser)
+    parser.add_argument('--cache_path', type=Path, default=None,
+        help='Database of model outputs per image, so reruns only infer new images.  Defaults '
+            'to detections.sqlite in the runner data directory')
+    parser.add_argument('--no_cache', action='store_true',
+        help='Infers every image without caching the model outputs')
 
     args = parser.parse_args()
+    check_inference_arguments(parser, args)
 
     source_data_dir: Path = args.data_dir
 
@@ -102,22 +132,56 @@ def main():
 
     write_jobs(db_name, jobs)
 
-    fishfinder_loadweights()
-    process_jobs(jobs, db_name)
-
-def process_jobs(jobs: Dict[Path, Job], db_name: Path) -> None:
+    fishfinder_loadweights(model_path=args.model_path)
+    model = load_model(args.model_path)
+    cache = None
+    if not args.no_cache:
+        cache_path = args.cache_path
+        if cache_path is None:
+            cache_path = local_data_dir.joinpath('detections.sqlite')
+        cache = DetectionCache(cache_path, model.identity)
+    try:
+        process_jobs(jobs, db_name,
+                     batch_size=args.batch_size,
+                     n_loaders=args.n_loaders,
+                     model=model,
+                     cache=cache)
+    finally:
+        if cache is not None:
+            cache.close()
+
+def process_jobs(
+        jobs: Dict[Path, Job],
+        db_name: Path,
+        *,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        n_loaders: int = DEFAULT_N_LOADERS,
+        model: Optional[YoloModel] = None,
+        cache: Optional[DetectionCache] = None) -> None:
     """Processes all jobs
 
+    The model is loaded once and shared by all jobs.
+
     Args:
         jobs (Dict[Path, Job]): Dictionary of jobs
         db_name (Path): Path to database to keep updated
+        batch_size (int, optional): Number of images per inference call.  Defaults to
+            `DEFAULT_BATCH_SIZE`.
+        n_loaders (int, optional): Number of image loader threads.  Defaults to
+            `DEFAULT_N_LOADERS`.
+        model (Optional[YoloModel], optional): Detection model.  Defaults to the model at
+            `DEFAULT_MODEL_PATH`.
+        cache (Optional[DetectionCache], optional): Cache of the model outputs, shared by all
+            jobs.  Defaults to None.
     """
+    # pylint: disable=too-many-arguments
+    model = model if model is not None else load_model()
     for job in jobs.values():
         if job.status == JobStatus.COMPLETED:
             continue
         try:
             job.status = JobStatus.IN_PROGRESS
-            job.process()
+            job.process(batch_size=batch_size, n_loaders=n_loaders, model=model, cache=cache)
             job.status = JobStatus.COMPLETED
         except Exception: # pylint: disable=broad-except
             job.status = JobStatus.FAILED
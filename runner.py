@@ -1,16 +1,33 @@
 """Extracts all data for labeling
 """
 import os
+import shutil
+import time
 from argparse import ArgumentParser
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor, as_completed,
+                                wait)
+from dataclasses import dataclass, field
+from multiprocessing import get_context
 from pathlib import Path
 from queue import Queue
-from shutil import copy
 from threading import Thread
-from typing import Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-import yaml
+from e4e.bag_cache import (CacheAccount, CacheSpaceError, copy_bag, is_cached, parse_size,
+                           resume_offset)
+from e4e.align import OUTPUT_FORMATS, OutputOptions, t_align, xy_auto_align
+from e4e.checkpoint import Checkpoint, checkpoint_file
+from e4e.depth import DEPTH_UNITS
+from e4e.frame_source import SyntheticConfig, SyntheticSource
+from e4e.image_codecs import ImageCodec
+from e4e.links import LINK_STRATEGIES
+from e4e.metadata import METADATA_FORMATS
+from e4e.profiling import StageProfiler, stage_names
+from e4e.progress import COPY_EVENT, ProgressJournal
+from e4e.timeranges import TimeRangeSet, load_deployment_timeranges
 
-from e4e.align import t_align, xy_auto_align
+# Failed bags are retried by later runs, resuming from their checkpoint
+DEFAULT_MAX_ATTEMPTS = 3
 
 
 class Job:
@@ -81,67 +98,226 @@ class Job:
         """
         return '_'.join(self.bag_file.parts)
 
-def copy_thread_fn(jobs: List[Job], job_queue: "Queue[Job]"):
+    def clear_output(self) -> None:
+        """Removes the frames and label stills written by an earlier attempt
+        """
+        for directory in (self.output_folder, self.label_dir):
+            if directory.exists():
+                shutil.rmtree(directory)
+
+@dataclass
+class ExtractOptions:
+    """Extraction options shared by all jobs
+    """
+    bypass_xy_align_errors: bool = False
+    n_writers: int = 0
+    output: OutputOptions = field(default_factory=OutputOptions)
+    checkpoint_interval_s: float = 60.
+    profile: bool = False
+    # Generates frames instead of reading the bags, for benchmarking
+    synthetic: Optional[SyntheticConfig] = None
+
+def copy_thread_fn(
+        jobs: List[Job],
+        job_queue: "Queue[Optional[Job]]",
+        cache: CacheAccount,
+        progress: ProgressJournal):
     """Copy Thread
 
+    Bags are prefetched in job order while they fit the cache.  When the next bag does not fit,
+    the first later bag that does is prefetched instead, so the workers are kept fed.  A job whose
+    bag fails to copy is recorded as failed here, and None is enqueued in its place so that every
+    job is still accounted for.
+
     Args:
-        bag_files (List[Path]): List of ROSBAG files
-        tmp_paths (List[Path]): List of temporary paths to place the ROSBAGS
-        tmp_path_queue (Queue[Path]): Queue to enqueue ready ROSBAGS
+        jobs (List[Job]): Jobs whose bags to copy, in order of preference
+        job_queue (Queue[Optional[Job]]): Queue to enqueue jobs with ready bags, or None for
+            failed copies
+        cache (CacheAccount): Cache account.  Each bag holds its space until its job is done
+        progress (ProgressJournal): Progress journal to record copy timings and failures in
     """
-    for job in jobs:
-        if job.tmp_path.exists():
-            if job.tmp_path.stat().st_size != job.bag_path.stat().st_size:
-                copy(job.bag_path, job.tmp_path)
-        else:
-            copy(job.bag_path, job.tmp_path)
+    def fail(job: Job, exc: Exception):
+        cache.release(job.reference_name)
+        progress.record_result(job.reference_name,
+                               status=False,
+                               error=str(exc),
+                               error_type=type(exc).__name__)
+        print(f'Failed to copy {job.bag_path}: {exc}')
+        job_queue.put(None)
+
+    pending = [(job, job.bag_path.stat().st_size) for job in jobs]
+    # Only copies left by a previous run can be stale, so verify them once up front
+    cached = {job.reference_name for job, _ in pending if is_cached(job.bag_path, job.tmp_path)}
+    remaining = {job.reference_name: size - resume_offset(job.bag_path, job.tmp_path)
+                 for job, size in pending if job.reference_name not in cached}
+    while pending:
+        try:
+            idx = cache.acquire_any([
+                (job.reference_name, size, remaining.get(job.reference_name, 0))
+                for job, size in pending])
+        except CacheSpaceError as exc:
+            # Nothing is held, so no release can make room for this bag
+            job, _ = pending.pop(exc.index)
+            fail(job, exc)
+            continue
+        job, size = pending.pop(idx)
+        if job.reference_name not in cached:
+            try:
+                stats = copy_bag(job.bag_path, job.tmp_path)
+            except Exception as exc: # pylint: disable=broad-except
+                # The partial copy is kept, so the next run resumes it
+                fail(job, exc)
+                continue
+            progress.record(job.reference_name, COPY_EVENT,
+                            n_bytes=stats.n_bytes,
+                            resumed_from=stats.resumed_from,
+                            elapsed_s=stats.elapsed_s,
+                            method=stats.method)
+            resumed = ''
+            if stats.resumed_from:
+                resumed = f', resumed at {stats.resumed_from / 1e6:.0f} MB'
+            print(f'Copied {job.bag_path} to {job.tmp_path}: {stats.n_bytes / 1e6:.0f} MB at '
+                  f'{stats.throughput_mbps:.1f} MB/s{resumed}')
         job_queue.put(job)
-        print(f'Copied {job.bag_path} to {job.tmp_path}')
+
+def process_job(
+        job: Job,
+        options: ExtractOptions,
+        time_ranges: Optional[TimeRangeSet] = None) -> Dict[str, Any]:
+    """Extracts and aligns a single bag.  Runs in a worker process
+
+    Args:
+        job (Job): Job to process
+        options (ExtractOptions): Extraction options
+        time_ranges (Optional[TimeRangeSet]): Areas of interest of this bag, if restricted
+
+    Returns:
+        Dict[str, Any]: Progress record
+    """
+    print(job.bag_file.as_posix())
+    start = time.monotonic()
+    profiler = StageProfiler(enabled=options.profile)
+    checkpoint_path = None
+    if options.checkpoint_interval_s > 0:
+        checkpoint_path = checkpoint_file(job.output_folder, job.tmp_path)
+    result: Dict[str, Any]
+    try:
+        if checkpoint_path is None or Checkpoint.load(checkpoint_path) is None:
+            # Without a checkpoint, the outputs of a failed attempt are not resumed but rewritten
+            job.clear_output()
+        xy_auto_align(
+            bag_file=job.tmp_path,
+            output_dir=job.output_folder,
+            ignore_errors=options.bypass_xy_align_errors,
+            output=options.output,
+            n_workers=options.n_writers,
+            label_dir=job.label_dir,
+            time_ranges=time_ranges,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval_s=options.checkpoint_interval_s,
+            profiler=profiler,
+            source=SyntheticSource(options.synthetic) if options.synthetic is not None else None
+        )
+        if options.output.output_format == 'files':
+            with profiler.stage('t_align'):
+                t_align(
+                    output_dir=job.output_folder,
+                    input_dir=job.output_folder,
+                    label_dir=job.label_dir,
+                    link_strategy=options.output.link_strategy,
+                    label_codec=options.output.label_codec
+                )
+        result = {
+            'status': True,
+            'elapsed_s': time.monotonic() - start
+        }
+    except Exception as exc: # pylint: disable=broad-except
+        result = {
+            'status': False,
+            'error': str(exc),
+            'error_type': type(exc).__name__,
+            'elapsed_s': time.monotonic() - start
+        }
+    if profiler.enabled:
+        result['profile'] = profiler.summary()
+    return result
+
+def format_profile(profile: Dict[str, Any], n_stages: int = 4) -> str:
+    """Formats the most expensive stages of a profile summary
+
+    Args:
+        profile (Dict[str, Any]): Profile summary
+        n_stages (int, optional): Number of stages to list.  Defaults to 4.
+
+    Returns:
+        str: One line summary
+    """
+    n_frames = max(profile['n_frames'], 1)
+    stages = [f"{name} {profile['stages'][name]['total_s'] / n_frames * 1e3:.1f} ms"
+              for name in stage_names(profile)[:n_stages]]
+    return f"{profile['n_frames']} frames, per frame: " + ', '.join(stages)
 
 def process_thread_fn(
-        job_queue: "Queue[Job]",
-        progress_path: Path,
-        file_progress: Dict[str, Dict],
+        job_queue: "Queue[Optional[Job]]",
+        progress: ProgressJournal,
         num_jobs: int,
-        bypass_xy_align_errors: bool = False):
+        cache: CacheAccount,
+        options: ExtractOptions,
+        *,
+        n_workers: int = 1,
+        time_ranges: Optional[Dict[Path, TimeRangeSet]] = None):
     """Processing thread function
 
+    Jobs are dispatched to a pool of worker processes as their bags become ready.  This thread
+    records the results of the workers in the progress journal and releases their cache space.
+    Jobs whose bags failed to copy were already recorded by the copy thread.
+
     Args:
-        tmp_path_queue (Queue[Path]): Queue of paths to process
-        output_dirs (List[str]): List of output directories
-        label_dirs (List[str]): List of label directories
-        target_path (Path): Target paths
-        progress_path (Path): Progress file path
-        file_progress (Dict[str, Dict]): File progress object
-        bypass_xy_align_errors (bool): xy_align error bypass
+        job_queue (Queue[Optional[Job]]): Queue of jobs with ready bags, or None for jobs that
+            failed to copy
+        progress (ProgressJournal): Progress journal
+        num_jobs (int): Number of jobs to process
+        cache (CacheAccount): Cache account to release bags from
+        options (ExtractOptions): Extraction options
+        n_workers (int): Number of bags processed concurrently
+        time_ranges (Optional[Dict[Path, TimeRangeSet]]): Areas of interest keyed by bag path.
+            Bags with time ranges are only extracted within those ranges
     """
-    for _ in enumerate(range(num_jobs)):
-        job = job_queue.get()
-        print(job.bag_file.as_posix())
-
+    # pylint: disable=too-many-arguments
+    def finish(job: Job, future: Future):
         try:
-            xy_auto_align(
-                bag_file=job.tmp_path,
-                output_dir=job.output_folder,
-                ignore_errors=bypass_xy_align_errors
-            )
-            t_align(
-                output_dir=job.output_folder,
-                input_dir=job.output_folder,
-                label_dir=job.label_dir
-            )
-            file_progress[job.reference_name] = {
-                'status': True
-            }
+            result = future.result()
         except Exception as exc: # pylint: disable=broad-except
-            file_progress[job.reference_name] = {
+            # The worker process died, e.g. in librealsense
+            result = {
                 'status': False,
-                'error': str(exc)
+                'error': repr(exc),
+                'error_type': type(exc).__name__
             }
-        finally:
-            with open(progress_path, 'w', encoding='utf-8') as handle:
-                yaml.safe_dump(file_progress, handle)
-            os.remove(job.tmp_path)
+        progress.record_result(job.reference_name, **result)
+        os.remove(job.tmp_path)
+        cache.release(job.reference_name)
+        print(f'Finished {job.bag_file.as_posix()}, {cache.held_bytes / 1e9:.1f} GB cached')
+        if 'profile' in result:
+            print(format_profile(result['profile']))
+
+    running: Dict[Future, Job] = {}
+    # Forking after the copy thread has started is unsafe, so workers are spawned
+    with ProcessPoolExecutor(max_workers=n_workers,
+                             mp_context=get_context('spawn')) as executor:
+        for _ in range(num_jobs):
+            while len(running) >= n_workers:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(running.pop(future), future)
+            job = job_queue.get()
+            if job is None:
+                continue
+            future = executor.submit(process_job, job, options,
+                                     (time_ranges or {}).get(job.bag_path, None))
+            running[future] = job
+        for future in as_completed(running):
+            finish(running[future], future)
 
 def t_align_pipelined(input_queue: "Queue[Tuple[Path, Path]]", label_dirs: List[str]):
     """Pipelined version of temporal alignment
@@ -160,14 +336,55 @@ def t_align_pipelined(input_queue: "Queue[Tuple[Path, Path]]", label_dirs: List[
 def run():
     """Main tool function
     """
+    # pylint: disable=too-many-locals
     parser = ArgumentParser()
     parser.add_argument('--input_path')
     parser.add_argument('--output_path')
-    parser.add_argument('--progress_db')
+    parser.add_argument('--progress_db',
+        help='Progress journal.  Progress files from earlier versions are converted in place')
     parser.add_argument('--cache_path')
+    parser.add_argument('--cache_bytes', type=parse_size, default=None,
+        help='Maximum size of the bags copied to the cache path, e.g. 500G.  Defaults to the '
+            'free space of the cache path')
     parser.add_argument('--bypass_xy_align_errors', action='store_true')
+    parser.add_argument('--max_attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+        help='Number of times a failed bag is attempted across runs')
+    parser.add_argument('--n_workers', type=int, default=1,
+        help='Number of bags extracted concurrently, each in its own process')
+    parser.add_argument('--n_writers', type=int, default=0,
+        help='Number of frame encoding threads.  0 encodes on the extraction thread')
+    parser.add_argument('--output_format', choices=OUTPUT_FORMATS, default='files',
+        help='files writes stills and pairs them afterwards, paired pairs stills during '
+            'extraction, store writes one frame store per bag')
+    parser.add_argument('--depth_units', choices=DEPTH_UNITS, default='meters',
+        help='meters writes float32 depth, counts writes uint16 depth and the depth scale')
+    parser.add_argument('--metadata_format', choices=METADATA_FORMATS, default='files',
+        help='files writes a metadata file per frame, table writes one metadata table per bag')
+    parser.add_argument('--label_link', choices=LINK_STRATEGIES, default='auto',
+        help='How RGB frames are placed in the label directory.  auto uses the cheapest of '
+            'hardlink, reflink and copy that the output share supports')
+    parser.add_argument('--color_codec', type=ImageCodec.parse, default=ImageCodec(),
+        help='Codec of the RGB stills as name or name:level, e.g. png:1, webp, jpeg:90 or npy.  '
+            'Defaults to png')
+    parser.add_argument('--label_codec', type=ImageCodec.parse, default=None,
+        help='Codec of the RGB stills in the label directory, e.g. jpeg:85.  Defaults to linking '
+            'the RGB stills')
+    parser.add_argument('--restrict_to_timeranges', action='store_true',
+        help='Only extract the areas of interest in each bag\'s .bag.times.txt file, if present')
+    parser.add_argument('--profile', action='store_true',
+        help='Record the wall time of each extraction stage and the bytes written, and add a '
+            'summary to each job\'s progress record')
+    parser.add_argument('--checkpoint_interval_s', type=float, default=60.,
+        help='Playback time between checkpoints from which a failed bag resumes.  0 disables '
+            'checkpoints')
 
     args = parser.parse_args()
+    if args.n_workers < 1:
+        parser.error('--n_workers must be positive')
+    if args.max_attempts < 1:
+        parser.error('--max_attempts must be positive')
+    if args.label_codec is not None and not args.label_codec.viewable:
+        parser.error('--label_codec must be viewable by labeling tools')
     # deployment_root_path = Path(
     #     '/home/ntlhui/google_drive/Test Data/2022-05 Reef Deployment/usa_florida')
     # target_path = Path('/home/ntlhui/fishsense/nas/data/2022-05 Reef Deployment outputs')
@@ -175,44 +392,104 @@ def run():
     # fast_storage = Path('/home/ntlhui/fishsense/fast/fishsense')
     # bypass_xy_align_errors = True
 
-    deployment_root_path = Path(args.input_path)
-    progress_path = Path(args.progress_db)
-    fast_storage = Path(args.cache_path)
-
+    time_ranges = None
+    if args.restrict_to_timeranges:
+        time_ranges = load_deployment_timeranges(Path(args.input_path))
+    extract_deployment(
+        deployment_root_path=Path(args.input_path),
+        target_path=Path(args.output_path),
+        progress_path=Path(args.progress_db),
+        cache_path=Path(args.cache_path),
+        options=ExtractOptions(
+            bypass_xy_align_errors=args.bypass_xy_align_errors,
+            n_writers=args.n_writers,
+            output=OutputOptions(
+                output_format=args.output_format,
+                depth_units=args.depth_units,
+                metadata_format=args.metadata_format,
+                link_strategy=args.label_link,
+                color_codec=args.color_codec,
+                label_codec=args.label_codec
+            ),
+            checkpoint_interval_s=args.checkpoint_interval_s,
+            profile=args.profile
+        ),
+        n_workers=args.n_workers,
+        cache_bytes=args.cache_bytes,
+        max_attempts=args.max_attempts,
+        time_ranges=time_ranges)
+
+def extract_deployment(
+        deployment_root_path: Path,
+        target_path: Path,
+        progress_path: Path,
+        cache_path: Path,
+        options: ExtractOptions,
+        *,
+        n_workers: int = 1,
+        cache_bytes: Optional[int] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        time_ranges: Optional[Dict[Path, TimeRangeSet]] = None) -> int:
+    """Extracts all bags of a deployment that are not yet done
 
-    bag_files = sorted(list(deployment_root_path.glob('**/*.bag')), key=lambda x: x.stat().st_size)
-    progress_path.touch(exist_ok=True)
-    file_progress = {}
-    with open(progress_path, 'r', encoding='utf-8') as handle:
-        recorded = yaml.safe_load(handle)
-        if recorded:
-            file_progress.update(recorded)
+    Args:
+        deployment_root_path (Path): Deployment root, searched for bags recursively
+        target_path (Path): Output root
+        progress_path (Path): Progress journal path
+        cache_path (Path): Directory to copy bags to before extraction
+        options (ExtractOptions): Extraction options
+        n_workers (int, optional): Number of bags extracted concurrently.  Defaults to 1.
+        cache_bytes (Optional[int], optional): Byte budget of the cache.  Defaults to the free
+            space of the cache path.
+        max_attempts (int, optional): Number of times a failed bag is attempted across runs.
+            Defaults to `DEFAULT_MAX_ATTEMPTS`.
+        time_ranges (Optional[Dict[Path, TimeRangeSet]], optional): Areas of interest by bag
+            path, if restricted.  Defaults to None.
+
+    Returns:
+        int: Number of bags processed
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+    # Largest bags first, so the last bags to finish are short ones
+    bag_files = sorted(list(deployment_root_path.glob('**/*.bag')),
+                       key=lambda x: x.stat().st_size,
+                       reverse=True)
+    progress = ProgressJournal(progress_path)
     all_jobs: List[Job] = [Job(bag_file=bag_file,
         data_root=deployment_root_path,
-        target_root=Path(args.output_path),
-        cache_path=fast_storage) for bag_file in bag_files]
+        target_root=target_path,
+        cache_path=cache_path) for bag_file in bag_files]
 
-    jobs = [job for job in all_jobs if job.reference_name not in file_progress]
-    fast_storage.mkdir(parents=True, exist_ok=True)
+    jobs = [job for job in all_jobs
+            if progress.should_run(job.reference_name, max_attempts=max_attempts)]
+    cache_path.mkdir(parents=True, exist_ok=True)
 
-    job_queue: "Queue[Job]" = Queue(maxsize=4)
+    # Prefetching is bounded by the cache account rather than the queue
+    job_queue: "Queue[Optional[Job]]" = Queue()
+    cache = CacheAccount(cache_path, limit_bytes=cache_bytes)
 
     copy_thread = Thread(target=copy_thread_fn,
         kwargs={
             'jobs': jobs,
-            'job_queue': job_queue})
+            'job_queue': job_queue,
+            'cache': cache,
+            'progress': progress})
     process_thread = Thread(target=process_thread_fn,
         kwargs={
             'job_queue': job_queue,
-            'progress_path': progress_path,
-            'file_progress': file_progress,
+            'progress': progress,
             'num_jobs': len(jobs),
-            'bypass_xy_align_errors': args.bypass_xy_align_errors})
+            'cache': cache,
+            'options': options,
+            'n_workers': n_workers,
+            'time_ranges': time_ranges})
     copy_thread.start()
     process_thread.start()
 
     process_thread.join()
     copy_thread.join()
+    progress.close()
+    return len(jobs)
 
 if __name__ == '__main__':
     run()
@@ -35,6 +35,7 @@ setup(
         'pytesseract',
         'smb_unzip @ https://github.com/UCSD-E4E/smb-unzip/archive/refs/heads/main.zip',
         'appdirs',
+        'h5py',
     ],
     extras_require={
         'dev': [
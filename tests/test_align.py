@@ -0,0 +1,154 @@
+"""Extraction and alignment test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from e4e.align import OutputOptions, t_align, xy_auto_align
+from e4e.checkpoint import checkpoint_file
+from e4e.frame_source import SyntheticConfig, SyntheticSource, make_patterns
+from e4e.framestore import FrameStoreReader
+from e4e.image_codecs import ImageCodec, read_image
+from e4e.metadata import MetadataTable
+
+CONFIG = SyntheticConfig(width=16, height=12, fps=10., duration_s=3., n_patterns=2)
+
+
+class FailingSource(SyntheticSource):
+    """Synthetic source that fails after a number of frames
+    """
+    def __init__(self, config: SyntheticConfig, n_frames: int) -> None:
+        super().__init__(config)
+        self.__remaining = n_frames
+
+    def wait_for_frames(self):
+        if self.__remaining == 0:
+            raise RuntimeError('Playback failed')
+        self.__remaining -= 1
+        return super().wait_for_frames()
+
+
+def test_files_and_t_align():
+    """Tests that extracted stills are paired into frame folders
+    """
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir).joinpath('output')
+        output_dir.mkdir()
+        label_dir = Path(tmp_dir).joinpath('label')
+        xy_auto_align(bag_file=Path('synthetic.bag'),
+                      output_dir=output_dir,
+                      source=SyntheticSource(CONFIG))
+        assert len(list(output_dir.glob('*_Color_t*.png'))) == CONFIG.n_frames
+        assert len(list(output_dir.glob('*_Depth_t*.tiff'))) == CONFIG.n_frames
+
+        t_align(input_dir=output_dir, output_dir=output_dir, label_dir=label_dir)
+        assert len(list(output_dir.glob('frame_*'))) == CONFIG.n_frames
+        assert len(list(label_dir.glob('*.png'))) == CONFIG.n_frames
+
+def test_threaded_writers_keep_images():
+    """Tests that pooled image buffers are not reused before their frames are written
+    """
+    config = SyntheticConfig(width=16, height=12, fps=10., duration_s=3., n_patterns=4)
+    color_patterns, _ = make_patterns(config)
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir)
+        xy_auto_align(bag_file=Path('synthetic.bag'),
+                      output_dir=output_dir,
+                      n_workers=4,
+                      source=SyntheticSource(config))
+        color_files = sorted(output_dir.glob('*_Color_t*.png'))
+        assert len(color_files) == config.n_frames
+        for idx, color_file in enumerate(color_files):
+            image = read_image(color_file)
+            assert np.array_equal(image, color_patterns[idx % config.n_patterns])
+
+def test_codecs():
+    """Tests that stills are written and paired in the selected codecs
+    """
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir).joinpath('output')
+        label_dir = Path(tmp_dir).joinpath('label')
+        xy_auto_align(bag_file=Path('synthetic.bag'),
+                      output_dir=output_dir,
+                      output=OutputOptions(color_codec=ImageCodec('npy')),
+                      source=SyntheticSource(CONFIG))
+        assert len(list(output_dir.glob('*_Color_t*.npy'))) == CONFIG.n_frames
+
+        t_align(input_dir=output_dir,
+                output_dir=output_dir,
+                label_dir=label_dir,
+                label_codec=ImageCodec('jpeg', 80))
+        assert len(list(output_dir.glob('frame_*/*.npy'))) == CONFIG.n_frames
+        assert len(list(label_dir.glob('*.jpg'))) == CONFIG.n_frames
+
+        paired_dir = Path(tmp_dir).joinpath('paired')
+        paired_label_dir = Path(tmp_dir).joinpath('paired_label')
+        xy_auto_align(bag_file=Path('synthetic.bag'),
+                      output_dir=paired_dir,
+                      output=OutputOptions(output_format='paired',
+                                           color_codec=ImageCodec('png', 1),
+                                           label_codec=ImageCodec('webp', 90)),
+                      label_dir=paired_label_dir,
+                      source=SyntheticSource(CONFIG))
+        n_pairs = len(list(paired_dir.glob('frame_*/*.png')))
+        assert n_pairs > 0
+        assert len(list(paired_label_dir.glob('*.webp'))) == n_pairs
+
+        with pytest.raises(ValueError):
+            xy_auto_align(bag_file=Path('synthetic.bag'),
+                          output_dir=paired_dir,
+                          output=OutputOptions(output_format='paired',
+                                               label_codec=ImageCodec('npy')),
+                          label_dir=paired_label_dir,
+                          source=SyntheticSource(CONFIG))
+
+def test_store_with_time_ranges():
+    """Tests that only frames within the time ranges are stored, and the checkpoint is removed
+    """
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir)
+        checkpoint_path = checkpoint_file(output_dir, Path('synthetic.bag'))
+        xy_auto_align(bag_file=Path('synthetic.bag'),
+                      output_dir=output_dir,
+                      output=OutputOptions(output_format='store', depth_units='counts'),
+                      time_ranges=[(0.5, 1.0), (2.0, 2.5)],
+                      checkpoint_path=checkpoint_path,
+                      checkpoint_interval_s=0.2,
+                      source=SyntheticSource(CONFIG))
+        assert not checkpoint_path.exists()
+        with FrameStoreReader(output_dir.joinpath('synthetic.h5')) as store:
+            assert store.n_frames('Color') == store.n_frames('Depth')
+            assert 8 <= store.n_frames('Color') <= 12
+
+@pytest.mark.parametrize('output_format', ['store', 'paired'])
+def test_resume_from_checkpoint(output_format: str):
+    """Tests that a failed extraction resumes without losing or duplicating frames
+    """
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir).joinpath('output')
+        label_dir = Path(tmp_dir).joinpath('label')
+        checkpoint_path = checkpoint_file(output_dir, Path('synthetic.bag'))
+        kwargs = {
+            'bag_file': Path('synthetic.bag'),
+            'output_dir': output_dir,
+            'output': OutputOptions(output_format=output_format, metadata_format='table'),
+            'label_dir': label_dir,
+            'checkpoint_path': checkpoint_path,
+            'checkpoint_interval_s': 0.5
+        }
+        with pytest.raises(RuntimeError):
+            xy_auto_align(source=FailingSource(CONFIG, n_frames=17), **kwargs)
+        assert checkpoint_path.exists()
+
+        xy_auto_align(source=SyntheticSource(CONFIG), **kwargs)
+        assert not checkpoint_path.exists()
+        if output_format == 'store':
+            with FrameStoreReader(output_dir.joinpath('synthetic.h5')) as store:
+                assert store.n_frames('Color') == CONFIG.n_frames
+                assert len(set(store.timestamps('Color'))) == CONFIG.n_frames
+        else:
+            assert len(list(output_dir.glob('frame_*'))) == CONFIG.n_frames
+            table = MetadataTable.load(output_dir.joinpath('synthetic_Metadata.csv'))
+            assert len(table) == 2 * CONFIG.n_frames
@@ -0,0 +1,149 @@
+"""Bag cache accounting test module
+"""
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+
+import pytest
+
+from e4e.bag_cache import (CHECKSUM_BLOCK_SIZE, COPY_METHODS, CacheAccount, CacheSpaceError,
+                           copy_bag, is_cached, offset_path, parse_size, resume_offset)
+
+HUGE = 1 << 62
+
+
+def test_first_bag_bypasses_budget_only():
+    """Tests that a bag larger than the budget is admitted when nothing else is held, but a bag
+    larger than the free space is not
+    """
+    with TemporaryDirectory() as tmp_dir:
+        account = CacheAccount(Path(tmp_dir), limit_bytes=10)
+        with pytest.raises(CacheSpaceError) as exc_info:
+            account.acquire('a', HUGE, timeout=0)
+        assert exc_info.value.index == 0
+        assert not account.held
+
+        assert account.acquire('a', 100, timeout=0)
+        assert account.held == {'a': 100}
+
+def test_waits_for_release():
+    """Tests that a bag without room waits until another bag is released
+    """
+    with TemporaryDirectory() as tmp_dir:
+        account = CacheAccount(Path(tmp_dir), limit_bytes=100, poll_interval_s=0.01)
+        assert account.acquire('a', 60)
+        assert not account.acquire('b', 50, timeout=0.05)
+
+        results = []
+        waiter = Thread(target=lambda: results.append(account.acquire('b', 50, timeout=5)))
+        waiter.start()
+        account.release('a')
+        waiter.join()
+        assert results == [True]
+        assert account.held_bytes == 50
+
+def test_partial_copy_requires_remainder():
+    """Tests that only the bytes still to be copied must fit
+    """
+    with TemporaryDirectory() as tmp_dir:
+        account = CacheAccount(Path(tmp_dir))
+        assert account.acquire('a', 10)
+        assert account.acquire('b', HUGE, required=0, timeout=0)
+        assert account.held_bytes == HUGE + 10
+
+def test_budget_backfills_smaller_bag():
+    """Tests that a later bag is admitted when the preferred bag exceeds the budget
+    """
+    with TemporaryDirectory() as tmp_dir:
+        account = CacheAccount(Path(tmp_dir), limit_bytes=100)
+        assert account.acquire('a', 60)
+        assert account.acquire_any([('b', 50, 50), ('c', 40, 40)], timeout=0) == 1
+        assert account.acquire_any([('b', 50, 50)], timeout=0) is None
+        account.release('a')
+        assert account.acquire_any([('b', 50, 50)], timeout=0) == 0
+
+def test_partial_checksum_detects_changes():
+    """Tests that cached copies are verified by content as well as size
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('src.bag')
+        dst = Path(tmp_dir).joinpath('dst.bag')
+        data = bytearray(range(256)) * (3 * CHECKSUM_BLOCK_SIZE // 256)
+        src.write_bytes(data)
+        assert not is_cached(src, dst)
+        dst.write_bytes(data)
+        assert is_cached(src, dst)
+        data[-1] ^= 0xFF
+        dst.write_bytes(data)
+        assert not is_cached(src, dst)
+
+def test_parse_size():
+    """Tests byte counts with unit suffixes
+    """
+    assert parse_size('1024') == 1024
+    assert parse_size('1.5K') == 1536
+    assert parse_size('500G') == 500 << 30
+    assert parse_size('2TiB') == 2 << 40
+    with pytest.raises(ValueError):
+        parse_size('lots')
+
+@pytest.mark.parametrize('method', COPY_METHODS)
+def test_copy_bag(method: str):
+    """Tests chunked copies with each copy method
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('src.bag')
+        dst = Path(tmp_dir).joinpath('dst.bag')
+        data = os.urandom(10_000)
+        src.write_bytes(data)
+        stats = copy_bag(src, dst, chunk_size=4096, method=method)
+        assert dst.read_bytes() == data
+        assert stats.n_bytes == len(data)
+        assert stats.resumed_from == 0
+        assert not offset_path(dst).exists()
+        assert is_cached(src, dst)
+
+def test_copy_bag_resumes():
+    """Tests that an interrupted copy resumes from its last checkpoint
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('src.bag')
+        dst = Path(tmp_dir).joinpath('dst.bag')
+        data = os.urandom(10_000)
+        src.write_bytes(data)
+        stat = src.stat()
+        # Interrupted after the first chunk, with part of the second written
+        dst.write_bytes(data[:5000])
+        offset_path(dst).write_text(f'4096 {stat.st_size} {stat.st_mtime_ns}\n', encoding='utf-8')
+        assert not is_cached(src, dst)
+        assert resume_offset(src, dst, chunk_size=4096) == 4096
+
+        stats = copy_bag(src, dst, chunk_size=4096)
+        assert stats.resumed_from == 4096
+        assert dst.read_bytes() == data
+
+def test_copy_bag_restarts_for_changed_source():
+    """Tests that a checkpoint of a different source is not resumed
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('src.bag')
+        dst = Path(tmp_dir).joinpath('dst.bag')
+        data = os.urandom(10_000)
+        src.write_bytes(data)
+        dst.write_bytes(bytes(5000))
+        offset_path(dst).write_text(f'4096 {len(data)} 0\n', encoding='utf-8')
+        assert copy_bag(src, dst, chunk_size=4096).resumed_from == 0
+        assert dst.read_bytes() == data
+
+def test_copy_empty_bag():
+    """Tests that an empty bag copies without a checkpoint
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('src.bag')
+        dst = Path(tmp_dir).joinpath('dst.bag')
+        src.write_bytes(b'')
+        stats = copy_bag(src, dst)
+        assert stats.n_bytes == 0
+        assert dst.read_bytes() == b''
+        assert not offset_path(dst).exists()
@@ -0,0 +1,75 @@
+"""Extraction checkpoint test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Dict, List
+
+import numpy as np
+
+from e4e.checkpoint import Checkpoint, CheckpointedSink, checkpoint_file
+from e4e.sinks import FrameSink, StreamFrame
+
+
+class ListFrameSink(FrameSink):
+    """Records the timestamps of all written frames
+    """
+    def __init__(self) -> None:
+        self.written: List[float] = []
+        self.latest: Dict[str, float] = {}
+
+    def write_frame(self, frame: StreamFrame) -> None:
+        self.written.append(frame.timestamp_s)
+        self.latest[frame.stream] = frame.timestamp_s
+
+    def checkpoint(self) -> Dict[str, Any]:
+        return {'timestamps': dict(self.latest), 'n_written': len(self.written)}
+
+
+def make_frame(stream: str, timestamp: float) -> StreamFrame:
+    """Creates a small synthetic frame
+
+    Args:
+        stream (str): Stream name
+        timestamp (float): Timestamp in seconds
+
+    Returns:
+        StreamFrame: Frame
+    """
+    return StreamFrame(stream, np.zeros((2, 2), dtype=np.uint8), timestamp, int(timestamp * 30))
+
+def test_save_and_resume():
+    """Tests that a resumed sink skips frames written before the checkpoint
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = checkpoint_file(Path(tmp_dir), Path('deployment_bag.bag'))
+        assert path.name == 'deployment_bag_Checkpoint.json'
+        assert Checkpoint.load(path) is None
+
+        first = ListFrameSink()
+        with CheckpointedSink(first, path, 'files') as sink:
+            for timestamp in (1.0, 2.0, 3.0):
+                sink.write_frame(make_frame('Color', timestamp))
+            sink.write_frame(make_frame('Depth', 1.5))
+            sink.save(position_s=10.)
+
+        resume = Checkpoint.load(path)
+        assert resume.output_format == 'files'
+        assert resume.position_s == 10.
+        assert resume.resume_position_s < 10.
+        assert resume.timestamps == {'Color': 3.0, 'Depth': 1.5}
+        assert resume.sink == {'n_written': 4}
+
+        second = ListFrameSink()
+        with CheckpointedSink(second, path, 'files', resume=resume) as sink:
+            for timestamp in (2.0, 3.0, 4.0):
+                sink.write_frame(make_frame('Color', timestamp))
+            sink.write_frame(make_frame('Depth', 1.5))
+            sink.write_frame(make_frame('Depth', 2.5))
+            assert sink.n_skipped == 3
+            assert sink.checkpoint() == {'timestamps': {'Color': 4.0, 'Depth': 2.5},
+                                         'n_written': 2}
+            sink.save(position_s=20.)
+        assert second.written == [4.0, 2.5]
+
+        # Streams without new frames keep their resumed timestamps
+        assert Checkpoint.load(path).timestamps == {'Color': 4.0, 'Depth': 2.5}
@@ -0,0 +1,25 @@
+"""Class name registry test module
+"""
+import os
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from e4e.detection_code.class_names import read_class_names
+
+
+def test_cached_until_modified():
+    """Tests that class names are cached, and read again once the file changes
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('classes.names')
+        path.write_text('Fish\nDiver\n', encoding='utf-8')
+        assert read_class_names(path) == {0: 'Fish', 1: 'Diver'}
+
+        names = read_class_names(path.as_posix())
+        names[2] = 'Mutated'
+        assert read_class_names(path) == {0: 'Fish', 1: 'Diver'}
+
+        stat = path.stat()
+        path.write_text('Fish\nCoral\n', encoding='utf-8')
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        assert read_class_names(path) == {0: 'Fish', 1: 'Coral'}
@@ -0,0 +1,61 @@
+"""Depth storage test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import cv2 as cv
+import numpy as np
+import pytest
+
+from e4e.depth import (DepthImage, SCALE_FILE_SUFFIX, find_depth_scale, load_depth,
+                       write_depth_scale)
+
+
+def test_meters_is_zero_copy():
+    """Tests that depth stored in meters is returned without copying
+    """
+    data = np.ones((2, 2), dtype=np.float32)
+    assert DepthImage(data).meters() is data
+
+def test_counts_require_scale():
+    """Tests that depth counts cannot be interpreted without a depth scale
+    """
+    with pytest.raises(ValueError):
+        DepthImage(np.ones((2, 2), dtype=np.uint16))
+
+def test_load_counts_from_frame_folder():
+    """Tests that a uint16 depth still in a frame folder finds the bag's depth scale
+    """
+    counts = np.arange(12, dtype=np.uint16).reshape(3, 4)
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir)
+        write_depth_scale(output_dir.joinpath(f'bag{SCALE_FILE_SUFFIX}'), 0.001)
+        frame_dir = output_dir.joinpath('frame_000000')
+        frame_dir.mkdir()
+        image_path = frame_dir.joinpath('bag_Depth_t1.000000000.tiff')
+        cv.imwrite(image_path.as_posix(), counts)
+
+        depth = load_depth(image_path)
+        assert depth.is_counts
+        np.testing.assert_array_equal(depth.data, counts)
+        np.testing.assert_allclose(depth.meters(), counts * 0.001, rtol=1e-6)
+        assert depth.meters().dtype == np.float32
+
+def test_scale_of_own_bag():
+    """Tests that stills of several bags in one folder each use their own bag's depth scale
+    """
+    counts = np.full((2, 2), 100, dtype=np.uint16)
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir)
+        write_depth_scale(output_dir.joinpath(f'a_bag{SCALE_FILE_SUFFIX}'), 0.001)
+        write_depth_scale(output_dir.joinpath(f'b_bag{SCALE_FILE_SUFFIX}'), 0.002)
+        for bag_stem, depth_scale in (('a_bag', 0.001), ('b_bag', 0.002)):
+            image_path = output_dir.joinpath(f'{bag_stem}_Depth_t1.000000000.tiff')
+            cv.imwrite(image_path.as_posix(), counts)
+            assert find_depth_scale(image_path).name == f'{bag_stem}{SCALE_FILE_SUFFIX}'
+            assert load_depth(image_path).depth_scale == depth_scale
+
+        image_path = output_dir.joinpath('c_bag_Depth_t1.000000000.tiff')
+        cv.imwrite(image_path.as_posix(), counts)
+        with pytest.raises(RuntimeError):
+            load_depth(image_path)
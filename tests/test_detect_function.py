@@ -0,0 +1,115 @@
+"""Fish detection test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List, Tuple
+
+import cv2
+import numpy as np
+import pytest
+import tensorflow as tf
+
+from e4e.detection_code.detect_function import detect, detect_objects, fish_scores
+
+# Fish confidence of each test image, also its brightness over 255
+CONFIDENCES = (0.9, 0.1, 0.6, 0.0, 0.8, 0.3, 0.7)
+
+
+class FakeModel:
+    """Detection model with a single full image box per image, whose fish confidence is the
+    brightness of the image
+    """
+    # pylint: disable=too-few-public-methods
+    def __init__(self, filters_in_graph: bool = False) -> None:
+        self.path = Path('fake')
+        self.identity = 'fake'
+        self.filters_in_graph = filters_in_graph
+        self.batch_sizes: List[int] = []
+
+    def infer(self, batch: np.ndarray) -> tf.Tensor:
+        """Infers a batch of preprocessed images
+
+        Args:
+            batch (np.ndarray): Preprocessed images
+
+        Returns:
+            tf.Tensor: One box per image, followed by its fish confidence
+        """
+        self.batch_sizes.append(len(batch))
+        boxes = np.tile(np.array([0., 0., 1., 1.], dtype=np.float32), (len(batch), 1))
+        confidences = batch[:, :1, 0, 0]
+        return tf.constant(np.concatenate([boxes, confidences], axis=1)[:, np.newaxis, :])
+
+def make_images(root: Path) -> Tuple[List[Path], List[Tuple[int, int]]]:
+    """Writes a uniform image of a different size for each of `CONFIDENCES`
+
+    Args:
+        root (Path): Output directory
+
+    Returns:
+        Tuple[List[Path], List[Tuple[int, int]]]: Image paths, and the width and height of each
+    """
+    images = []
+    sizes = []
+    for idx, confidence in enumerate(CONFIDENCES):
+        width, height = 8 + idx, 6 + 2 * idx
+        path = root.joinpath(f'image_{idx}.png')
+        cv2.imwrite(path.as_posix(), np.full((height, width, 3), round(confidence * 255),
+                                             dtype=np.uint8))
+        images.append(path)
+        sizes.append((width, height))
+    return images, sizes
+
+@pytest.mark.parametrize('batch_size', [1, 3, 8])
+@pytest.mark.parametrize('n_loaders', [0, 4])
+def test_batches_map_to_images(batch_size: int, n_loaders: int):
+    """Tests that the outputs of each batch are returned for the images they were inferred from
+    """
+    with TemporaryDirectory() as tmp_dir:
+        images, sizes = make_images(Path(tmp_dir))
+        model = FakeModel()
+        scores = fish_scores(images, batch_size=batch_size, n_loaders=n_loaders, model=model)
+        np.testing.assert_allclose(scores, CONFIDENCES, atol=0.01)
+        assert max(model.batch_sizes) == min(batch_size, len(images))
+
+        detections = list(detect_objects(0.5, 0.05, images,
+                                         batch_size=batch_size,
+                                         n_loaders=n_loaders,
+                                         model=model))
+        assert [path for path, _ in detections] == images
+        for (_, (bboxes, scores, _, n_valid)), (width, height), confidence in zip(
+                detections, sizes, CONFIDENCES):
+            if confidence < 0.05:
+                assert n_valid == 0
+                continue
+            assert n_valid == 1
+            assert scores[0] == pytest.approx(confidence, abs=0.01)
+            assert list(bboxes[0]) == [0, 0, width, height]
+
+def test_in_graph_filtering_needs_single_images():
+    """Tests that batches are rejected for models that mix the boxes of a batch
+    """
+    with TemporaryDirectory() as tmp_dir:
+        images, _ = make_images(Path(tmp_dir))
+        model = FakeModel(filters_in_graph=True)
+        with pytest.raises(ValueError):
+            fish_scores(images, batch_size=2, model=model)
+        assert not model.batch_sizes
+
+        scores = fish_scores(images, batch_size=1, model=model)
+        np.testing.assert_allclose(scores, CONFIDENCES, atol=0.01)
+
+@pytest.mark.parametrize('score', [0.05, 0.45, 0.65, 0.85])
+def test_presence_matches_boxes(score: float):
+    """Tests that presence mode finds fish in the same images as counting boxes
+
+    Images whose fish boxes are all below the score threshold have no fish in either mode.
+    """
+    with TemporaryDirectory() as tmp_dir:
+        images, _ = make_images(Path(tmp_dir))
+        model = FakeModel()
+        present = detect(0.3, score, images, batch_size=3, model=model, mode='presence')
+        boxes = detect(0.3, score, images, batch_size=3, model=model, mode='boxes')
+        assert present == boxes
+        assert present == [path for path, confidence in zip(images, CONFIDENCES)
+                           if confidence > score]
@@ -0,0 +1,42 @@
+"""Frame pool test module
+"""
+import pickle
+
+import numpy as np
+
+from e4e.frame_pool import FramePool
+from e4e.sinks import StreamFrame
+
+
+def test_buffers_reused():
+    """Tests that released buffers are leased again for the same shape and dtype only
+    """
+    pool = FramePool(max_free=1)
+    first = pool.copy(np.arange(12, dtype=np.uint16).reshape(3, 4))
+    assert np.array_equal(first, np.arange(12).reshape(3, 4))
+    pool.release(first)
+    assert pool.acquire((3, 4), np.uint16) is first
+    assert pool.acquire((3, 4), np.uint16) is not first
+    assert pool.acquire((3, 4), np.float32).dtype == np.float32
+    assert pool.n_allocated == 3
+    assert pool.n_reused == 1
+
+    pool.release(np.empty((2, 2)))
+    pool.release(np.empty((2, 2)))
+    assert pool.n_free == 1
+
+def test_frame_release():
+    """Tests that a frame returns its image once, and copies sent to processes own their image
+    """
+    pool = FramePool()
+    frame = StreamFrame(stream='Depth',
+                        image=pool.acquire((3, 4), np.float32),
+                        timestamp_s=1.,
+                        frame_number=1,
+                        pool=pool)
+    copy = pickle.loads(pickle.dumps(frame))
+    assert copy.pool is None
+    assert frame.pool is pool
+    frame.release()
+    frame.release()
+    assert pool.n_free == 1
@@ -0,0 +1,61 @@
+"""Synthetic frame source test module
+"""
+import numpy as np
+
+from e4e.frame_source import SyntheticConfig, SyntheticSource
+
+
+def small_config(**kwargs) -> SyntheticConfig:
+    """Creates a small synthetic recording
+
+    Returns:
+        SyntheticConfig: Recording parameters
+    """
+    params = {'width': 8, 'height': 6, 'fps': 10., 'duration_s': 2., 'n_patterns': 2}
+    params.update(kwargs)
+    return SyntheticConfig(**params)
+
+def test_playback_restarts():
+    """Tests that frames are generated in order and the playback restarts at the end
+    """
+    source = SyntheticSource(small_config())
+    assert source.n_frames == 20
+    positions = []
+    for _ in range(source.n_frames + 1):
+        frames = source.wait_for_frames()
+        positions.append(source.position_s)
+    assert positions[:3] == [0., 0.1, 0.2]
+    assert positions[-1] < positions[-2]
+
+    color = frames.get_color_frame()
+    depth = frames.get_depth_frame()
+    assert color.get_profile().stream_type().name == 'color'
+    assert color.get_data().shape == (6, 8, 3)
+    assert color.get_data().dtype == np.uint8
+    assert depth.get_data().shape == (6, 8)
+    assert depth.get_data().dtype == np.uint16
+    assert color.get_timestamp() == depth.get_timestamp()
+
+def test_seek():
+    """Tests that seeking continues at the first frame at or after the position
+    """
+    source = SyntheticSource(small_config())
+    source.seek(1.05)
+    assert source.position_s == 1.05
+    source.wait_for_frames()
+    assert source.position_s == 1.1
+
+def test_jitter_and_drops():
+    """Tests that timestamps are jittered within bounds and frames are dropped at the rate
+    """
+    source = SyntheticSource(small_config(duration_s=100., jitter_s=0.01, drop_rate=0.25))
+    n_dropped = 0
+    for _ in range(source.n_frames):
+        frames = source.wait_for_frames()
+        for frame in (frames.get_color_frame(), frames.get_depth_frame()):
+            if frame is None:
+                n_dropped += 1
+                continue
+            offset_s = frame.get_timestamp() / 1e3 - 1.65e9 - source.position_s
+            assert abs(offset_s) <= 0.01 + 1e-6
+    assert 0.2 < n_dropped / (2 * source.n_frames) < 0.3
@@ -0,0 +1,77 @@
+"""Frame writer pool test module
+"""
+import threading
+import time
+from typing import List
+
+import pytest
+
+from e4e.frame_writer import FrameWriterPool
+from e4e.profiling import StageProfiler
+
+
+def test_synchronous_writes():
+    """Tests that a pool with no workers writes in the calling thread
+    """
+    calls: List[int] = []
+    with FrameWriterPool(n_workers=0) as writer:
+        writer.submit(calls.append, 1)
+        assert calls == [1]
+        assert writer.n_pending == 0
+
+def test_threaded_writes_complete():
+    """Tests that all threaded writes are completed on exit
+    """
+    calls: List[int] = []
+    lock = threading.Lock()
+
+    def append(value: int):
+        time.sleep(0.001)
+        with lock:
+            calls.append(value)
+
+    with FrameWriterPool(n_workers=4, max_pending=3) as writer:
+        for idx in range(50):
+            writer.submit(append, idx)
+            assert writer.n_pending <= 3
+    assert sorted(calls) == list(range(50))
+
+def test_earliest_error_reported():
+    """Tests that the earliest failing write is the error raised
+    """
+    def fail(value: int):
+        if value >= 5:
+            time.sleep(0.01 * (10 - value))
+            raise RuntimeError(value)
+
+    with pytest.raises(RuntimeError) as exc_info:
+        with FrameWriterPool(n_workers=4, max_pending=8) as writer:
+            for idx in range(10):
+                writer.submit(fail, idx)
+    assert exc_info.value.args == (5,)
+
+def test_ignore_errors():
+    """Tests that errors are collected but not raised when ignored
+    """
+    def fail():
+        raise RuntimeError()
+
+    with FrameWriterPool(n_workers=2, ignore_errors=True) as writer:
+        for _ in range(4):
+            writer.submit(fail)
+    assert len(writer.errors) == 4
+
+def test_profiled_writes():
+    """Tests that writes are timed and their bytes counted under the write function name
+    """
+    def write_bytes(n_bytes: int) -> int:
+        return n_bytes
+
+    for n_workers in (0, 2):
+        profiler = StageProfiler()
+        with FrameWriterPool(n_workers=n_workers, profiler=profiler) as writer:
+            for n_bytes in range(10):
+                writer.submit(write_bytes, n_bytes)
+        stats = profiler.summary()['stages']['write_bytes']
+        assert stats['count'] == 10
+        assert stats['n_bytes'] == 45
@@ -0,0 +1,45 @@
+"""Frame store test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from e4e.framestore import FrameStoreReader, FrameStoreWriter
+from e4e.sinks import StreamFrame
+
+
+def test_round_trip():
+    """Tests that frames written to the store are read back by index
+    """
+    rng = np.random.default_rng(0)
+    colors = [rng.integers(0, 255, (4, 6, 3), dtype=np.uint8) for _ in range(10)]
+    depths = [rng.random((4, 6), dtype=np.float32) for _ in range(7)]
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('test.h5')
+        with FrameStoreWriter(path, batch_size=3, attrs={'depth_scale': 0.001}) as writer:
+            for idx, color in enumerate(colors):
+                metadata = {'Stream': 'color', 'frame_number': idx}
+                if idx >= 5:
+                    metadata['SENSOR_TIMESTAMP'] = 1000 + idx
+                writer.write_frame(StreamFrame('Color', color, idx / 30, idx, metadata))
+            for idx, depth in enumerate(depths):
+                writer.write_frame(StreamFrame('Depth', depth, idx / 30, idx))
+
+        with FrameStoreReader(path) as reader:
+            assert sorted(reader.streams) == ['Color', 'Depth']
+            assert reader.attrs['depth_scale'] == 0.001
+            assert reader.n_frames('Color') == 10
+            assert reader.n_frames('Depth') == 7
+            np.testing.assert_array_equal(reader.image('Color', 8), colors[8])
+            np.testing.assert_array_equal(reader.image('Depth', 6), depths[6])
+            np.testing.assert_allclose(reader.timestamps('Color'), np.arange(10) / 30)
+
+            frame = reader.frame('Color', 7)
+            assert frame.frame_number == 7
+            assert frame.metadata == {
+                'Stream': 'color',
+                'frame_number': 7,
+                'SENSOR_TIMESTAMP': 1007
+            }
+            assert reader.metadata('Color', 2)['SENSOR_TIMESTAMP'] == -1
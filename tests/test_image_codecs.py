@@ -0,0 +1,49 @@
+"""Image codec test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from e4e.image_codecs import ImageCodec, is_color_still, read_image
+
+
+def test_parse():
+    """Tests parsing codec specifications
+    """
+    assert ImageCodec.parse('png') == ImageCodec()
+    assert ImageCodec.parse('PNG:1') == ImageCodec('png', 1)
+    assert ImageCodec.parse('jpg:90') == ImageCodec('jpeg', 90)
+    assert ImageCodec.parse('webp').extension == '.webp'
+    assert not ImageCodec.parse('npy').viewable
+    for spec in ['gif', 'png:10', 'jpeg:-1', 'npy:1', 'webp:high']:
+        with pytest.raises(ValueError):
+            ImageCodec.parse(spec)
+
+@pytest.mark.parametrize('spec,lossless', [
+    ('png', True), ('png:0', True), ('webp', True), ('webp:80', False), ('jpeg:90', False),
+    ('npy', True)])
+def test_round_trip(spec: str, lossless: bool):
+    """Tests that stills are written and read back in every codec
+    """
+    codec = ImageCodec.parse(spec)
+    rng = np.random.default_rng(0)
+    image = rng.integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath(f'still{codec.extension}')
+        assert codec.write(image, path) == path.stat().st_size
+        assert is_color_still(path)
+        result = read_image(path)
+        assert result.shape == image.shape
+        if lossless:
+            assert np.array_equal(result, image)
+
+def test_unreadable():
+    """Tests that unreadable stills read as None
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('still.npy')
+        path.write_bytes(b'not an array')
+        assert read_image(path) is None
+        assert not is_color_still(Path(tmp_dir).joinpath('depth.tiff'))
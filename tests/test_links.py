@@ -0,0 +1,61 @@
+"""Label link test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import pytest
+
+from e4e.links import AUTO_STRATEGIES, detect_link_strategy, link_file
+
+
+@pytest.mark.parametrize('strategy', ['hardlink', 'symlink', 'copy'])
+def test_link_file(strategy: str):
+    """Tests that linked files have the source contents and replace existing files
+
+    Args:
+        strategy (str): Link strategy
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('frame_000000', 'image.png')
+        src.parent.mkdir()
+        src.write_bytes(b'image')
+        dst = Path(tmp_dir).joinpath('label', 'image.png')
+        dst.parent.mkdir()
+        dst.write_bytes(b'stale')
+
+        link_file(src, dst, strategy)
+        assert dst.read_bytes() == b'image'
+        assert dst.is_symlink() == (strategy == 'symlink')
+        if strategy == 'hardlink':
+            assert dst.stat().st_ino == src.stat().st_ino
+
+@pytest.mark.parametrize('first', ['hardlink', 'symlink', 'copy'])
+@pytest.mark.parametrize('strategy', ['hardlink', 'symlink', 'copy'])
+def test_relink(first: str, strategy: str):
+    """Tests that rerunning with any strategy replaces the destination of an earlier run
+
+    Args:
+        first (str): Link strategy of the earlier run
+        strategy (str): Link strategy of the rerun
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src = Path(tmp_dir).joinpath('image.png')
+        src.write_bytes(b'image')
+        dst = Path(tmp_dir).joinpath('label', 'image.png')
+        dst.parent.mkdir()
+
+        link_file(src, dst, first)
+        link_file(src, dst, strategy)
+        assert dst.read_bytes() == b'image'
+        assert src.read_bytes() == b'image'
+        assert dst.is_symlink() == (strategy == 'symlink')
+
+def test_detect_link_strategy():
+    """Tests that detection leaves no probe files behind
+    """
+    with TemporaryDirectory() as tmp_dir:
+        src_dir = Path(tmp_dir).joinpath('out')
+        dst_dir = Path(tmp_dir).joinpath('label')
+        assert detect_link_strategy(src_dir, dst_dir) in AUTO_STRATEGIES
+        assert not list(src_dir.iterdir())
+        assert not list(dst_dir.iterdir())
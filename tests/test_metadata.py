@@ -0,0 +1,68 @@
+"""Metadata table test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+from e4e.metadata import MetadataTable, MetadataTableWriter
+
+
+def test_round_trip():
+    """Tests that a written metadata table can be loaded and queried
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('bag_Metadata.csv')
+        with MetadataTableWriter(path, columns=['FRAME_COUNTER', 'ACTUAL_EXPOSURE'],
+                                 batch_size=4) as writer:
+            for idx in range(10):
+                writer.append({
+                    'Stream': 'color',
+                    'frame_number': idx,
+                    'frame_timestamp': 100 + (9 - idx) / 8,
+                    'FRAME_COUNTER': idx
+                })
+                writer.append({
+                    'Stream': 'depth',
+                    'frame_number': idx,
+                    'frame_timestamp': 100 + idx / 8,
+                    'FRAME_COUNTER': idx,
+                    'ACTUAL_EXPOSURE': 500
+                })
+
+        table = MetadataTable.load(path)
+        assert len(table) == 20
+        assert table.columns == ['Stream', 'frame_number', 'frame_timestamp',
+                                 'FRAME_COUNTER', 'ACTUAL_EXPOSURE']
+
+        color = table.stream('color')
+        assert len(color) == 10
+        assert list(color['frame_number']) == list(range(9, -1, -1))
+        idx = color.nearest(100 + 2.1 / 8, tolerance=0.02)
+        assert color.row(idx) == {
+            'Stream': 'color',
+            'frame_number': 7,
+            'frame_timestamp': 100 + 2 / 8,
+            'FRAME_COUNTER': 7
+        }
+        assert color.nearest(102, tolerance=0.01) is None
+        assert table.stream('depth').row(0)['ACTUAL_EXPOSURE'] == 500
+
+def test_continue_table():
+    """Tests that a continued table discards rows written after the offset
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('bag_Metadata.csv')
+        with MetadataTableWriter(path, columns=['FRAME_COUNTER']) as writer:
+            for idx in range(3):
+                writer.append({'Stream': 'color', 'frame_number': idx,
+                               'frame_timestamp': 100 + idx, 'FRAME_COUNTER': idx})
+            writer.flush()
+            offset = writer.offset
+            writer.append({'Stream': 'color', 'frame_number': 3,
+                           'frame_timestamp': 103, 'FRAME_COUNTER': 3})
+
+        with MetadataTableWriter(path, columns=['FRAME_COUNTER'], offset=offset) as writer:
+            writer.append({'Stream': 'color', 'frame_number': 4,
+                           'frame_timestamp': 104, 'FRAME_COUNTER': 4})
+
+        table = MetadataTable.load(path)
+        assert list(table['frame_number']) == [0, 1, 2, 4]
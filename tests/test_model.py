@@ -0,0 +1,58 @@
+"""Detection model registry test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+
+import pytest
+
+from e4e.detection_code import model as model_module
+from e4e.detection_code.model import load_model, model_identity
+
+
+def write_model(path: Path, weights: bytes) -> None:
+    """Writes the files that identify a saved model
+
+    Args:
+        path (Path): Saved model directory
+        weights (bytes): Variables index contents
+    """
+    path.joinpath('variables').mkdir(parents=True, exist_ok=True)
+    path.joinpath('saved_model.pb').write_bytes(b'graph')
+    path.joinpath('variables', 'variables.index').write_bytes(weights)
+
+def test_load_once_per_identity(monkeypatch: pytest.MonkeyPatch):
+    """Tests that models are loaded once per identity, and again when the weights change
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Fixture to stub the model loader
+    """
+    loaded: List[Path] = []
+
+    class StubModel:
+        """Model handle that records its loads
+        """
+        # pylint: disable=too-few-public-methods
+        def __init__(self, path: Path) -> None:
+            loaded.append(path)
+            self.path = path
+            self.identity = model_identity(path)
+
+    monkeypatch.setattr(model_module, 'YoloModel', StubModel)
+    monkeypatch.setattr(model_module, '_MODELS', {})
+    with TemporaryDirectory() as tmp_dir:
+        model_path = Path(tmp_dir).joinpath('yolov4-416')
+        write_model(model_path, b'weights')
+        model = load_model(model_path)
+        assert load_model(model_path) is model
+        copy_path = Path(tmp_dir).joinpath('copy')
+        write_model(copy_path, b'weights')
+        assert load_model(copy_path) is model
+        assert len(loaded) == 1
+
+        write_model(model_path, b'new weights')
+        reloaded = load_model(model_path)
+        assert reloaded is not model
+        assert reloaded.identity != model.identity
+        assert load_model(model_path) is reloaded
+        assert len(loaded) == 2
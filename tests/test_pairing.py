@@ -0,0 +1,73 @@
+"""Streaming temporal alignment test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import List
+
+import numpy as np
+
+from e4e.pairing import PairedFrameSink, StreamMatcher
+from e4e.sinks import StreamFrame
+
+
+def make_frame(stream: str, timestamp: float) -> StreamFrame:
+    """Creates a small synthetic frame
+
+    Args:
+        stream (str): Stream name
+        timestamp (float): Timestamp in seconds
+
+    Returns:
+        StreamFrame: Frame
+    """
+    if stream == 'Color':
+        image = np.zeros((4, 4, 3), dtype=np.uint8)
+    else:
+        image = np.zeros((4, 4), dtype=np.float32)
+    return StreamFrame(stream, image, timestamp, int(timestamp * 30),
+                       {'Stream': stream.lower(), 'frame_timestamp': timestamp})
+
+def test_matcher_pairs_nearest():
+    """Tests that the matcher pairs nearest frames and discards unmatched frames
+    """
+    matcher = StreamMatcher(max_permissible_difference_s=0.02)
+    frames: List[StreamFrame] = []
+    for idx in range(10):
+        frames.append(make_frame('Color', idx / 30))
+        if idx != 4:
+            frames.append(make_frame('Depth', idx / 30 + 0.005))
+    # Deliver slightly out of order
+    frames[3], frames[4] = frames[4], frames[3]
+
+    pairs = []
+    for frame in frames:
+        pairs.extend(matcher.push(frame))
+    pairs.extend(matcher.flush())
+
+    assert [(color.frame_number, depth.frame_number) for color, depth in pairs] == \
+        [(idx, idx) for idx in range(10) if idx != 4]
+    assert matcher.n_dropped == 1
+
+def test_paired_sink_writes_frame_folders():
+    """Tests that matched frames are written into frame folders and the label directory
+    """
+    with TemporaryDirectory() as tmp_dir:
+        output_dir = Path(tmp_dir).joinpath('out')
+        label_dir = Path(tmp_dir).joinpath('label')
+        with PairedFrameSink(Path('bag.bag'), output_dir, label_dir) as sink:
+            for idx in range(3):
+                sink.write_frame(make_frame('Depth', idx + 0.01))
+                sink.write_frame(make_frame('Color', idx))
+            sink.write_frame(make_frame('Color', 10))
+        assert sink.n_pairs == 3
+        assert sink.n_dropped == 1
+
+        frame_folder = output_dir.joinpath('frame_000002')
+        assert sorted(path.name for path in frame_folder.iterdir()) == [
+            'bag_Color_Metadata_t2.000000000.txt',
+            'bag_Color_t2.000000000.png',
+            'bag_Depth_Metadata_t2.010000000.txt',
+            'bag_Depth_t2.010000000.tiff',
+        ]
+        assert len(list(label_dir.glob('*.png'))) == 3
+        assert not output_dir.joinpath('frame_000003').exists()
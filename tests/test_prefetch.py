@@ -0,0 +1,52 @@
+"""Prefetching map test module
+"""
+import threading
+import time
+from typing import List
+
+import pytest
+
+from e4e.prefetch import prefetch
+
+
+def test_results_in_order():
+    """Tests that results are yielded in item order regardless of completion order
+    """
+    def slow_square(value: int) -> int:
+        time.sleep(0.001 * (10 - value % 10))
+        return value * value
+
+    assert list(prefetch(slow_square, range(30), n_workers=4)) == [i * i for i in range(30)]
+    assert list(prefetch(slow_square, range(5), n_workers=0)) == [i * i for i in range(5)]
+
+def test_bounded_depth():
+    """Tests that no more than `depth` items are taken ahead of the consumer
+    """
+    taken: List[int] = []
+    lock = threading.Lock()
+
+    def items():
+        for idx in range(20):
+            with lock:
+                taken.append(idx)
+            yield idx
+
+    results = prefetch(lambda value: value, items(), n_workers=2, depth=3)
+    assert next(results) == 0
+    time.sleep(0.01)
+    with lock:
+        assert len(taken) <= 4
+    assert list(results) == list(range(1, 20))
+
+def test_error_raised_in_order():
+    """Tests that a failed call raises when its result is reached
+    """
+    def fail_at_three(value: int) -> int:
+        if value == 3:
+            raise RuntimeError(value)
+        return value
+
+    results = prefetch(fail_at_three, range(10), n_workers=4)
+    assert [next(results) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(RuntimeError):
+        next(results)
@@ -0,0 +1,40 @@
+"""Stage profiler test module
+"""
+import json
+
+from e4e.profiling import NULL_PROFILER, StageProfiler, stage_names
+
+
+def test_stage_summary():
+    """Tests that stage measurements are aggregated into a JSON serializable summary
+    """
+    profiler = StageProfiler()
+    for _ in range(3):
+        with profiler.stage('align'):
+            pass
+        profiler.add_frames()
+    for elapsed_s in (0.001, 0.002, 0.004, 0.1):
+        profiler.record('write_image', elapsed_s, n_bytes=1000)
+
+    summary = json.loads(json.dumps(profiler.summary()))
+    assert summary['n_frames'] == 3
+    assert stage_names(summary) == ['write_image', 'align']
+    write = summary['stages']['write_image']
+    assert write['count'] == 4
+    assert write['n_bytes'] == 4000
+    assert write['max_s'] == 0.1
+    assert 0.002 <= write['p50_s'] <= 0.004
+    assert write['p99_s'] == 0.1
+    assert sum(count for _, count in write['histogram']) == 4
+    assert write['bytes_per_frame'] == 4000 / 3
+
+def test_disabled_profiler():
+    """Tests that a disabled profiler records nothing
+    """
+    with NULL_PROFILER.stage('align'):
+        pass
+    NULL_PROFILER.record('write_image', 1.0)
+    NULL_PROFILER.add_frames()
+    summary = NULL_PROFILER.summary()
+    assert summary['n_frames'] == 0
+    assert summary['stages'] == {}
@@ -0,0 +1,66 @@
+"""Progress journal test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import yaml
+
+from e4e.progress import COPY_EVENT, ProgressJournal
+
+
+def test_records_persist():
+    """Tests that results are reloaded with their attempts and errors
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('progress.jsonl')
+        with ProgressJournal(path) as progress:
+            assert progress.should_run('a')
+            progress.record('a', COPY_EVENT, elapsed_s=1.0)
+            progress.record_result('a', False, error='boom', elapsed_s=2.0)
+            progress.record_result('b', True, elapsed_s=3.0)
+
+        with ProgressJournal(path) as progress:
+            assert progress.jobs['a'].status is False
+            assert progress.jobs['a'].error == 'boom'
+            assert progress.jobs['a'].attempts == 1
+            assert progress.jobs['b'].elapsed_s == 3.0
+            assert not progress.should_run('a')
+            assert progress.should_run('a', max_attempts=2)
+            assert not progress.should_run('b', max_attempts=2)
+            progress.record_result('a', True)
+            assert progress.jobs['a'].attempts == 2
+            assert progress.jobs['a'].error is None
+
+def test_torn_record_skipped():
+    """Tests that a record torn by a crash is skipped and does not corrupt later records
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('progress.jsonl')
+        with ProgressJournal(path) as progress:
+            progress.record_result('a', True)
+        with open(path, 'a', encoding='utf-8') as handle:
+            handle.write('{"job": "b", "ev')
+
+        with ProgressJournal(path) as progress:
+            assert progress.n_skipped == 1
+            assert set(progress.jobs) == {'a'}
+            progress.record_result('c', True)
+        with ProgressJournal(path) as progress:
+            assert progress.n_skipped == 1
+            assert set(progress.jobs) == {'a', 'c'}
+
+def test_legacy_progress_converted():
+    """Tests that YAML progress files of earlier versions are converted
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('progress.yaml')
+        with open(path, 'w', encoding='utf-8') as handle:
+            yaml.safe_dump({'a': {'status': True}, 'b': {'status': False, 'error': 'boom'}},
+                           handle)
+
+        with ProgressJournal(path) as progress:
+            assert progress.jobs['a'].status
+            assert progress.jobs['b'].error == 'boom'
+            progress.record_result('c', True)
+        with ProgressJournal(path) as progress:
+            assert set(progress.jobs) == {'a', 'b', 'c'}
@@ -0,0 +1,76 @@
+"""Detection result cache test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from e4e.detection_code.result_cache import (DetectionCache, content_digest, select_candidates,
+                                             stack_outputs)
+
+
+def make_outputs() -> np.ndarray:
+    """Creates model outputs of one image with two classes
+
+    Returns:
+        np.ndarray: Three boxes, with max class confidences of 0.9, 0.01 and 0.3
+    """
+    return np.array([
+        [0.1, 0.1, 0.2, 0.2, 0.9, 0.0],
+        [0.3, 0.3, 0.4, 0.4, 0.01, 0.0],
+        [0.5, 0.5, 0.6, 0.6, 0.0, 0.3],
+    ], dtype=np.float32)
+
+def test_round_trip():
+    """Tests that stored candidates are returned across connections
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('cache', 'detections.sqlite')
+        digest = content_digest(b'image')
+        with DetectionCache(path, 'model') as cache:
+            assert cache.get(digest) is None
+            stored = cache.put(digest, 480, 640, make_outputs())
+        assert stored.outputs.shape == (2, 6)
+
+        with DetectionCache(path, 'model') as cache:
+            cached = cache.get(digest)
+            assert cached is not None
+            assert (cached.height, cached.width) == (480, 640)
+            np.testing.assert_array_equal(cached.outputs, make_outputs()[[0, 2]])
+            assert cache.n_hits == 1
+            assert cache.n_misses == 0
+
+        with DetectionCache(path, 'other model') as cache:
+            assert cache.get(digest) is None
+
+def test_min_confidence():
+    """Tests that outputs cached with a higher minimum confidence are not reused
+    """
+    with TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir).joinpath('detections.sqlite')
+        digest = content_digest(b'image')
+        with DetectionCache(path, 'model', min_confidence=0.05) as cache:
+            cache.put(digest, 1, 1, make_outputs())
+        with DetectionCache(path, 'model', min_confidence=0.5) as cache:
+            assert cache.get(digest) is not None
+        with DetectionCache(path, 'model', min_confidence=0.001) as cache:
+            assert cache.get(digest) is None
+
+def test_select_and_stack():
+    """Tests candidate selection and zero padding of batches
+    """
+    assert select_candidates(make_outputs(), 0.5).shape == (1, 6)
+    assert select_candidates(make_outputs(), 0.95).shape == (0, 6)
+
+    batch = stack_outputs([select_candidates(make_outputs(), 0.05),
+                           select_candidates(make_outputs(), 0.95)])
+    assert batch.shape == (2, 2, 6)
+    assert not batch[1].any()
+
+    assert stack_outputs([np.zeros((0, 6), dtype=np.float32)]).shape == (1, 1, 6)
+
+def test_content_digest():
+    """Tests that digests depend only on the contents
+    """
+    assert content_digest(b'image') == content_digest(bytes(b'image'))
+    assert content_digest(b'image') != content_digest(b'other image')
@@ -0,0 +1,148 @@
+"""Deployment runner test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from threading import Thread
+from typing import List
+
+import pytest
+
+import runner
+from e4e.frame_source import SyntheticConfig
+from e4e.progress import ProgressJournal
+from runner import ExtractOptions, Job, extract_deployment, process_job
+
+PLACEHOLDER_BAG_BYTES = 1 << 10
+
+
+def make_deployment(root: Path, n_bags: int) -> Path:
+    """Creates a deployment of placeholder bags
+
+    Args:
+        root (Path): Scratch directory
+        n_bags (int): Number of bags
+
+    Returns:
+        Path: Deployment root
+    """
+    deployment = root.joinpath('deployment')
+    deployment.mkdir()
+    for idx in range(n_bags):
+        deployment.joinpath(f'{idx}.bag').write_bytes(bytes(PLACEHOLDER_BAG_BYTES))
+    return deployment
+
+def list_outputs(job: Job) -> List[str]:
+    """Lists the files written for a job
+
+    Args:
+        job (Job): Job
+
+    Returns:
+        List[str]: Sorted paths relative to the job's output and label directories
+    """
+    return sorted(f'{directory.name}/{path.relative_to(directory).as_posix()}'
+                  for directory in (job.output_folder, job.label_dir)
+                  for path in directory.rglob('*'))
+
+def run_deployment(root: Path, deployment: Path, **kwargs) -> int:
+    """Extracts the deployment with synthetic frames, failing instead of hanging
+
+    Args:
+        root (Path): Scratch directory
+        deployment (Path): Deployment root
+
+    Returns:
+        int: Number of bags processed
+    """
+    results = []
+    thread = Thread(target=lambda: results.append(extract_deployment(
+        deployment_root_path=deployment,
+        target_path=root.joinpath('output'),
+        progress_path=root.joinpath('progress.jsonl'),
+        cache_path=root.joinpath('cache'),
+        options=ExtractOptions(synthetic=SyntheticConfig(width=8, height=6, duration_s=0.2),
+                               checkpoint_interval_s=0.),
+        **kwargs)), daemon=True)
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive(), 'extract_deployment hung'
+    return results[0]
+
+def test_copy_failure_is_recorded(monkeypatch: pytest.MonkeyPatch):
+    """Tests that a bag failing to copy is recorded as failed without stalling the other bags
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Fixture to make the first bag's copy fail
+    """
+    copy_bag = runner.copy_bag
+
+    def flaky_copy_bag(src: Path, dst: Path, **kwargs):
+        if src.name == '0.bag':
+            raise OSError(5, 'Input/output error')
+        return copy_bag(src, dst, **kwargs)
+
+    monkeypatch.setattr(runner, 'copy_bag', flaky_copy_bag)
+    with TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        deployment = make_deployment(root, n_bags=2)
+        assert run_deployment(root, deployment) == 2
+
+        with ProgressJournal(root.joinpath('progress.jsonl')) as progress:
+            assert not progress.jobs['0.bag'].status
+            assert 'Input/output error' in progress.jobs['0.bag'].error
+            assert progress.jobs['1.bag'].status
+
+def test_oversized_bag_is_skipped(monkeypatch: pytest.MonkeyPatch):
+    """Tests that a bag larger than the free cache space fails without being copied
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Fixture to shrink the free cache space
+    """
+    monkeypatch.setattr(runner.CacheAccount, 'free_bytes',
+                        property(lambda _: PLACEHOLDER_BAG_BYTES // 2))
+    with TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        deployment = make_deployment(root, n_bags=1)
+        assert run_deployment(root, deployment) == 1
+
+        with ProgressJournal(root.joinpath('progress.jsonl')) as progress:
+            assert not progress.jobs['0.bag'].status
+        assert not list(root.joinpath('cache').iterdir())
+
+def test_retry_rewrites_failed_attempt(monkeypatch: pytest.MonkeyPatch):
+    """Tests that retrying a job without a checkpoint discards the outputs of the failed attempt
+
+    Args:
+        monkeypatch (pytest.MonkeyPatch): Fixture to fail temporal alignment part way through
+    """
+    options = ExtractOptions(synthetic=SyntheticConfig(width=8, height=6, duration_s=0.2),
+                             checkpoint_interval_s=1.)
+    with TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        deployment = make_deployment(root, n_bags=1)
+
+        def make_job(name: str) -> Job:
+            return Job(bag_file=deployment.joinpath('0.bag'),
+                       data_root=deployment,
+                       target_root=root.joinpath(name),
+                       cache_path=deployment)
+
+        clean = make_job('clean')
+        assert process_job(clean, options)['status']
+
+        def failing_t_align(input_dir: Path, **_):
+            frame_dir = input_dir.joinpath('frame_000000')
+            frame_dir.mkdir()
+            for still in sorted(input_dir.glob('*_Color_*'))[:2]:
+                still.rename(frame_dir.joinpath(still.name))
+            raise RuntimeError('Interrupted')
+
+        retried = make_job('retried')
+        with monkeypatch.context() as patch:
+            patch.setattr(runner, 't_align', failing_t_align)
+            assert not process_job(retried, options)['status']
+        retried.label_dir.mkdir(parents=True, exist_ok=True)
+        retried.label_dir.joinpath('stale.png').write_bytes(b'stale')
+
+        assert process_job(retried, options)['status']
+        assert list_outputs(retried) == list_outputs(clean)
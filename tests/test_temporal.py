@@ -0,0 +1,56 @@
+"""Temporal matching test module
+"""
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+
+from e4e.temporal import match_timestamps, pair_frame_files
+
+
+def test_match_nearest_within_tolerance():
+    """Tests that depth frames pair with their nearest color frame within tolerance
+    """
+    color_times = np.array([0.00, 0.10, 0.20, 0.30, 1.00])
+    depth_times = np.array([0.01, 0.09, 0.22, 0.50, 1.02])
+    color_idx, depth_idx = match_timestamps(color_times, depth_times, 0.05)
+    # 0.50 has no color frame within tolerance
+    assert list(color_idx) == [0, 1, 2, 4]
+    assert list(depth_idx) == [0, 1, 2, 4]
+
+def test_match_is_one_to_one():
+    """Tests that a color frame is only used by the closest depth frame
+    """
+    color_times = np.array([0.0, 1.0])
+    depth_times = np.array([0.04, 0.05, 0.95])
+    color_idx, depth_idx = match_timestamps(color_times, depth_times, 0.1)
+    assert list(color_idx) == [0, 1]
+    assert list(depth_idx) == [0, 2]
+
+def test_match_empty():
+    """Tests matching with a missing stream
+    """
+    color_idx, depth_idx = match_timestamps(np.array([]), np.array([1.0]), 0.1)
+    assert len(color_idx) == 0
+    assert len(depth_idx) == 0
+
+def test_pair_frame_files():
+    """Tests that stills and metadata files are paired from a single directory scan
+    """
+    with TemporaryDirectory() as tmp_dir:
+        input_dir = Path(tmp_dir)
+        for timestamp in (3.0, 1.0, 2.0):
+            for name in (f'bag_Color_t{timestamp:.9f}.png',
+                         f'bag_Color_Metadata_t{timestamp:.9f}.txt',
+                         f'bag_Depth_t{timestamp + 0.01:.9f}.tiff',
+                         f'bag_Depth_Metadata_t{timestamp + 0.01:.9f}.txt'):
+                input_dir.joinpath(name).touch()
+        input_dir.joinpath('bag_Metadata.csv').touch()
+
+        pairs = pair_frame_files(input_dir)
+        assert [pair.color_timestamp for pair in pairs] == [1.0, 2.0, 3.0]
+        assert [file.name for file in pairs[0].color_files] == [
+            'bag_Color_Metadata_t1.000000000.txt',
+            'bag_Color_t1.000000000.png'
+        ]
+        assert [file.suffix for file in pairs[2].depth_files] == ['.txt', '.tiff']
@@ -0,0 +1,87 @@
+"""Time range test module
+"""
+import datetime as dt
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import numpy as np
+import pytest
+
+from e4e.timeranges import (TimeRangeSet, in_timeranges, load_deployment_timeranges,
+                            parse_timeranges, read_timeranges)
+
+
+def test_ranges_merged_and_clipped():
+    """Tests that ranges are sorted, merged and clipped to the bag duration
+    """
+    time_ranges = [
+        (dt.timedelta(seconds=50), dt.timedelta(seconds=70)),
+        (dt.timedelta(seconds=10), dt.timedelta(seconds=20)),
+        (dt.timedelta(seconds=15), dt.timedelta(seconds=30)),
+        (dt.timedelta(seconds=90), dt.timedelta(seconds=120)),
+        (dt.timedelta(seconds=130), dt.timedelta(seconds=140)),
+    ]
+    ranges = TimeRangeSet(time_ranges).clip(0, 100)
+    assert ranges.intervals == [(10, 30), (50, 70), (90, 100)]
+    assert ranges.total_seconds == 50
+
+def test_membership():
+    """Tests that scalar and vectorized membership agree with the open interval semantics
+    """
+    time_ranges = [(dt.timedelta(seconds=1), dt.timedelta(seconds=2)),
+                   (dt.timedelta(seconds=2), dt.timedelta(seconds=3))]
+    ranges = TimeRangeSet(time_ranges)
+    timestamps = np.array([0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 4.0])
+    expected = [False, False, True, False, True, False, False]
+    assert [timestamp in ranges for timestamp in timestamps] == expected
+    assert [in_timeranges(timestamp, time_ranges) for timestamp in timestamps] == expected
+    assert list(ranges.mask(timestamps)) == expected
+    assert not TimeRangeSet([]).mask(timestamps).any()
+
+def test_parse_formats():
+    """Tests the accepted timestamp formats, blank lines and comments
+    """
+    lines = [
+        '00:13:11.012-00:15:11.016\n',
+        '\n',
+        '# comment\n',
+        '17:12-19:32.5\n',
+        '  PT1H2M3.5S/PT1H3M  \n',
+        '10-20.25\n',
+    ]
+    assert list(parse_timeranges(lines)) == [
+        (791.012, 911.016),
+        (1032, 1172.5),
+        (3723.5, 3780),
+        (10, 20.25),
+    ]
+
+@pytest.mark.parametrize('line', ['00:00:01', '00:61:00-00:62:00', '2-1', 'a-b'])
+def test_parse_errors_report_line(line: str):
+    """Tests that malformed ranges are reported with their line number
+
+    Args:
+        line (str): Malformed range
+    """
+    with pytest.raises(RuntimeError, match='test.times.txt:2:'):
+        list(parse_timeranges(['00:00:01-00:00:02', line], source='test.times.txt'))
+
+def test_read_and_bulk_load():
+    """Tests reading a single file and loading all files under a deployment
+    """
+    with TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        root.joinpath('site_a').mkdir()
+        root.joinpath('site_a', '160.bag.times.txt').write_text(
+            '00:13:11.012-00:15:11.016\n00:17:12.561-00:19:32.781\n', encoding='utf-8')
+        root.joinpath('161.bag.times.txt').write_text('', encoding='utf-8')
+
+        assert read_timeranges(root.joinpath('site_a', '160.bag.times.txt'))[1] == (
+            dt.timedelta(minutes=17, seconds=12, milliseconds=561),
+            dt.timedelta(minutes=19, seconds=32, milliseconds=781))
+
+        time_ranges = load_deployment_timeranges(root)
+        assert set(time_ranges) == {root.joinpath('site_a', '160.bag').resolve(),
+                                    root.joinpath('161.bag').resolve()}
+        assert len(time_ranges[root.joinpath('site_a', '160.bag').resolve()]) == 2
+        assert len(time_ranges[root.joinpath('161.bag').resolve()]) == 0